@@ -1,3 +1,4 @@
+import re
 import copy
 import gzip
 import warnings
@@ -306,6 +307,24 @@ def eit_dataset():
         return f.tree["dataset"]
 
 
+@pytest.fixture
+def eit_server(httpserver):
+    """
+    Serve the EIT test files, supporting HTTP range requests.
+    """
+    from werkzeug import Response  # noqa: PLC0415
+
+    def handler(request):
+        path = Path(rootdir) / "EIT" / request.path.lstrip("/")
+        if not path.is_file():
+            return Response(status=404)
+        data = path.read_bytes()
+        return Response(data).make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    httpserver.expect_request(re.compile("/.*")).respond_with_handler(handler)
+    return httpserver
+
+
 @pytest.fixture(params=[False,
                         [[False, False],
                          [True, False]]],
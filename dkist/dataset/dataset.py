@@ -9,6 +9,7 @@ from ndcube.ndcube import NDCube, NDCubeLinkedDescriptor
 
 from dkist.io.dask.striped_array import FileManager
 from dkist.io.file_manager import DKISTFileManager
+from dkist.io.statistics import data_limits
 from dkist.utils.decorators import deprecated
 
 from .utils import dataset_info_str
@@ -189,6 +190,24 @@ class Dataset(NDCube):
         """
         return self.meta["inventory"]
 
+    def plot(self, *args, **kwargs):
+        """
+        Plot the data of this dataset, see `ndcube.NDCube.plot`.
+
+        If the statistics of all the files of this dataset have been saved by
+        `.DKISTFileManager.compute_statistics`, and the colour scale is not
+        specified, the colour scale of images and animations is set to the
+        range of the data in the files, without reading any frames.
+        """
+        plot_axes = kwargs.get("plot_axes", args[1] if len(args) > 1 else None)
+        is_image = self.data.ndim > 1 and (plot_axes is None or "y" in plot_axes)
+        scale_kwargs = {"vmin", "vmax", "norm", "clip_interval", "data_unit"}
+        if self.files is not None and is_image and not scale_kwargs.intersection(kwargs):
+            limits = data_limits([self.files])
+            if limits is not None:
+                kwargs["vmin"], kwargs["vmax"] = limits
+        return super().plot(*args, **kwargs)
+
     """
     Dataset loading and saving routines.
     """
@@ -4,12 +4,17 @@ from pathlib import Path
 from functools import cache, singledispatch
 from collections import defaultdict
 
+import numpy as np
 from packaging.version import Version
 from parfive import Results
 
 import asdf
 
+from ndcube import NDCollection
+
 import dkist
+from dkist.io.dask.loaders import get_fits_loader
+from dkist.io.utils import is_url
 from dkist.io.asdf.entry_points import get_extensions as get_dkist_extensions
 from dkist.utils.exceptions import DKISTOutOfDateError, DKISTUserWarning
 
@@ -20,7 +25,7 @@ DKIST_EXTENSION_REGEX = re.compile(r"asdf:\/\/dkist\.nso\.edu\/dkist\/extensions
 
 
 @singledispatch
-def load_dataset(target, *, ignore_version_mismatch=False):
+def load_dataset(target, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
     Load a DKIST dataset from a variety of inputs.
 
@@ -36,6 +41,28 @@ def load_dataset(target, *, ignore_version_mismatch=False):
 
         {types_list}
 
+    ignore_version_mismatch : `bool`, optional
+        If `True` load files written by a newer version of the ``dkist``
+        package than the one installed.
+
+    dtype : `numpy.dtype`, optional
+        The floating point or complex dtype to convert the data to as it is
+        read from the FITS files, for example ``"float32"`` to halve the memory used by ``float64``
+        data. The data are converted to native byte order. Defaults to
+        ``dkist.io.conf.output_dtype``, if that is not set the data keep the
+        dtype they are stored with in the files.
+
+    loader : `str` or `type`, optional
+        The loader used to read the data from the FITS files, either the name
+        of one registered in `dkist.io.dask.loaders.fits_loaders`
+        (``"astropy"``, ``"raw"``, ``"fitsio"``, ``"tar"`` for files in a
+        tar archive or ``"remote"`` for files on a remote server) or a
+        `~dkist.io.dask.loaders.BaseFITSLoader` subclass. It is used for all
+        the datasets in the file, including the tiles of a
+        `~dkist.TiledDataset` and the datasets of an `~dkist.Inversion`.
+        Defaults to ``dkist.io.conf.preferred_fits_library``. The loader of a
+        loaded dataset can be changed with `dkist.io.DKISTFileManager.loader`.
+
     Returns
     -------
     datasets
@@ -63,7 +90,7 @@ def load_dataset(target, *, ignore_version_mismatch=False):
     This Dataset has 4 pixel and 5 world dimensions.
     <BLANKLINE>
     The data are represented by a <class 'dask.array.core.Array'> object:
-    dask.array<reshape, shape=(4, 425, 980, 2554), dtype=float64, chunksize=(1, 1, 980, 2554), chunktype=numpy.ndarray>
+    dask.array<load_files, shape=(4, 425, 980, 2554), dtype=float64, chunksize=(1, 6, 980, 2554), chunktype=numpy.ndarray>
     <BLANKLINE>
     Array Dim  Axis Name                Data size  Bounds
             0  polarization state               4  None
@@ -95,20 +122,20 @@ def load_dataset(target, *, ignore_version_mismatch=False):
 
 
 @load_dataset.register
-def _load_from_results(results: Results, *, ignore_version_mismatch=False):
+def _load_from_results(results: Results, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
     The results from a call to ``Fido.fetch``, all results must be valid DKIST ASDF files.
     """
-    return _load_from_iterable(results, ignore_version_mismatch=ignore_version_mismatch)
+    return _load_from_iterable(results, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
 
 @load_dataset.register
-def _load_from_iterable(iterable: tuple | list, *, ignore_version_mismatch=False):
+def _load_from_iterable(iterable: tuple | list, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
     A list or tuple of valid inputs to ``load_dataset``.
     """
     datasets = [
-        load_dataset(item, ignore_version_mismatch=ignore_version_mismatch) for item in iterable
+        load_dataset(item, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader) for item in iterable
     ]
     if len(datasets) == 1:
         return datasets[0]
@@ -116,16 +143,17 @@ def _load_from_iterable(iterable: tuple | list, *, ignore_version_mismatch=False
 
 
 @load_dataset.register
-def _load_from_string(path: str, *, ignore_version_mismatch=False):
+def _load_from_string(path: str, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
-    A string representing a directory or an ASDF file.
+    A string representing a directory, an ASDF file or the URL of an ASDF file.
     """
-    # TODO Adjust this to accept URLs as well
-    return _load_from_path(Path(path), ignore_version_mismatch=ignore_version_mismatch)
+    if is_url(path):
+        return _load_from_asdf(path, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
+    return _load_from_path(Path(path), ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
 
 @load_dataset.register
-def _load_from_path(path: Path, *, ignore_version_mismatch=False):
+def _load_from_path(path: Path, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
     A path object representing a directory or an ASDF file.
     """
@@ -133,12 +161,12 @@ def _load_from_path(path: Path, *, ignore_version_mismatch=False):
     if not path.is_dir():
         if not path.exists():
             raise ValueError(f"{path} does not exist.")
-        return _load_from_asdf(path, ignore_version_mismatch=ignore_version_mismatch)
+        return _load_from_asdf(path, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
-    return _load_from_directory(path, ignore_version_mismatch=ignore_version_mismatch)
+    return _load_from_directory(path, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
 
-def _load_from_directory(directory, *, ignore_version_mismatch=False):
+def _load_from_directory(directory, *, ignore_version_mismatch=False, dtype=None, loader=None):
     """
     Construct a `~dkist.dataset.Dataset` from a directory containing one (or
     more) ASDF files and a collection of FITS files.
@@ -172,7 +200,7 @@ def _load_from_directory(directory, *, ignore_version_mismatch=False):
         raise ValueError(f"No asdf file found in directory {base_path}.")
 
     if len(asdf_files) == 1:
-        return _load_from_asdf(asdf_files[0], ignore_version_mismatch=ignore_version_mismatch)
+        return _load_from_asdf(asdf_files[0], ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
     candidates = []
     asdfs_to_load = []
@@ -220,14 +248,16 @@ def _load_from_directory(directory, *, ignore_version_mismatch=False):
         )
 
     if len(asdfs_to_load) == 1:
-        return _load_from_asdf(asdfs_to_load[0], ignore_version_mismatch=ignore_version_mismatch)
+        return _load_from_asdf(asdfs_to_load[0], ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
-    return _load_from_iterable(asdfs_to_load, ignore_version_mismatch=ignore_version_mismatch)
+    return _load_from_iterable(asdfs_to_load, ignore_version_mismatch=ignore_version_mismatch, dtype=dtype, loader=loader)
 
 
-def _load_from_asdf(filepath, *, ignore_version_mismatch=False):
+def _load_from_asdf(filepath, *, ignore_version_mismatch=False, dtype=None, loader=None):
     from dkist.dataset import Dataset, Inversion, TiledDataset  # noqa: PLC0415
 
+    if loader is not None:
+        loader = get_fits_loader(loader)
     # Load the file without a custom schema so that we can validate it against multiple schemas
     with asdf.open(filepath, lazy_load=False, memmap=False) as ff:
         if not ignore_version_mismatch:
@@ -235,15 +265,65 @@ def _load_from_asdf(filepath, *, ignore_version_mismatch=False):
 
         # First validate against level 1
         if "dataset" in ff.tree and isinstance(ff.tree["dataset"], (Dataset, TiledDataset)):
-            return _load_l1_from_asdf(ff, filepath)
+            loaded = _load_l1_from_asdf(ff, filepath)
         # If l1 validation fails, assume l2
-        if "inversion" in ff.tree and isinstance(ff.tree["inversion"], Inversion):
-            return _load_l2_from_asdf(ff, filepath)
+        elif "inversion" in ff.tree and isinstance(ff.tree["inversion"], Inversion):
+            loaded = _load_l2_from_asdf(ff, filepath)
+        else:
+            # If you get here, it's neither level 1 nor 2
+            raise TypeError(
+                f"File {filepath} is not a valid level 1 or level 2 DKIST file. Expected a `dataset` or `inversion` key with the correct types."
+            )
 
-        # If you get here, it's neither level 1 nor 2
-        raise TypeError(
-            f"File {filepath} is not a valid level 1 or level 2 DKIST file. Expected a `dataset` or `inversion` key with the correct types."
-        )
+    if loader is not None:
+        _set_loader(loaded, loader)
+    if dtype is not None:
+        _set_output_dtype(loaded, np.dtype(dtype))
+    return loaded
+
+
+def _iter_datasets(obj):
+    """
+    Iterate over the datasets in a loaded object.
+
+    This includes the tiles of a `~dkist.TiledDataset`, and the datasets of
+    an `~dkist.Inversion` and its profiles.
+    """
+    from dkist.dataset import Dataset, TiledDataset  # noqa: PLC0415
+
+    if isinstance(obj, Dataset):
+        yield obj
+    elif isinstance(obj, TiledDataset):
+        for tile in obj.flat:
+            yield from _iter_datasets(tile)
+    elif isinstance(obj, NDCollection):
+        for value in obj.values():
+            yield from _iter_datasets(value)
+        if (profiles := getattr(obj, "profiles", None)) is not None:
+            yield from _iter_datasets(profiles)
+
+
+def _set_output_dtype(obj, dtype):
+    """
+    Convert the data of all the datasets in a loaded object to ``dtype`` as it is read.
+
+    The dask arrays of the datasets are generated when the file is opened,
+    so they are generated again, from the cached array of their file
+    manager, once the dtype is set.
+    """
+    for ds in _iter_datasets(obj):
+        if ds.files is not None:
+            ds.files._fm.output_dtype = dtype
+            ds.files._regenerate_data()
+
+
+def _set_loader(obj, loader):
+    """
+    Set the loader of all the datasets in a loaded object.
+    """
+    for ds in _iter_datasets(obj):
+        if ds.files is not None:
+            ds.files.loader = loader
 
 
 def _load_l1_from_asdf(asdf_file, filepath):
@@ -252,7 +332,8 @@ def _load_l1_from_asdf(asdf_file, filepath):
     """
     from dkist.dataset import TiledDataset  # noqa: PLC0415
 
-    base_path = filepath.parent
+    # The FITS files of a remote ASDF file are read from the same location
+    base_path = filepath.rsplit("/", 1)[0] if is_url(filepath) else filepath.parent
     ds = asdf_file.tree["dataset"]
     ds.meta["history"] = asdf_file.tree["history"]
     if isinstance(ds, TiledDataset):
@@ -267,7 +348,7 @@ def _load_l2_from_asdf(asdf_file, filepath):
     """
     Construct a level 2 inversion object from a filepath of a suitable asdf file.
     """
-    base_path = filepath.parent
+    base_path = filepath.rsplit("/", 1)[0] if is_url(filepath) else filepath.parent
     inv = asdf_file.tree["inversion"]
     inv.meta["history"] = asdf_file.tree["history"]
     return inv
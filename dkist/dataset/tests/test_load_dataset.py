@@ -1,9 +1,12 @@
 import re
+import gzip
 import shutil
 import numbers
 import contextlib
 
+import numpy as np
 import pytest
+from numpy.testing import assert_allclose
 from parfive import Results
 
 import asdf
@@ -12,6 +15,8 @@ from asdf.tags.core import ExtensionMetadata, Software
 from dkist import Dataset, TiledDataset, load_dataset
 from dkist.data.test import rootdir
 from dkist.dataset.loader import ASDF_FILENAME_PATTERN, DKIST_EXTENSION_REGEX
+from dkist.io import conf
+from dkist.io.dask.loaders import AstropyFITSLoader, RawFITSLoader, RemoteFITSLoader
 from dkist.utils.exceptions import DKISTOutOfDateError, DKISTUserWarning
 
 
@@ -196,7 +201,7 @@ def test_select_asdf(tmp_path, asdf_path, filenames, indices, mocker):
             datasets = load_dataset(asdf_folder)
 
     if isinstance(indices, numbers.Integral):
-        load_from_asdf.assert_called_once_with(asdf_file_paths[indices], ignore_version_mismatch=False)
+        load_from_asdf.assert_called_once_with(asdf_file_paths[indices], ignore_version_mismatch=False, dtype=None, loader=None)
     else:
         calls = load_from_iterable.mock_calls
         # We need to assert that _load_from_iterable is called with the right
@@ -306,3 +311,73 @@ def test_version_error_string_and_iterable(asdf_extensions):
 
     ds = load_dataset([test_file], ignore_version_mismatch=True)
     assert isinstance(ds, Dataset)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_load_dataset_dtype(dtype):
+    expected = load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf").data.compute()
+    ds = load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf", dtype=dtype)
+    assert ds.data.dtype == np.dtype(dtype)
+    # The data is the array cached by the file manager
+    assert ds.data is ds.files.dask_array
+    assert ds.files._fm.output_dtype == np.dtype(dtype)
+
+    data = ds.data.compute()
+    assert data.dtype == np.dtype(dtype)
+    assert_allclose(data, expected, rtol=1e-6)
+
+
+def test_load_dataset_dtype_tiled(asdf_tileddataset_path):
+    ds = load_dataset(asdf_tileddataset_path, dtype="float32")
+    assert all(tile.data.dtype == np.float32 for tile in ds.flat)
+
+
+def test_load_inversion_dtype(tmp_path):
+    with gzip.open(rootdir / "test_L2_inversion.asdf.gz", mode="rb") as gfo:
+        (tmp_path / "test_L2_inversion.asdf").write_bytes(gfo.read())
+    inv = load_dataset(tmp_path / "test_L2_inversion.asdf", dtype="float32")
+    assert all(ds.data.dtype == np.float32 for ds in inv.values())
+    assert all(ds.data.dtype == np.float32 for ds in inv.profiles.values())
+    # The dtype is not left in the configuration for other datasets
+    assert conf.output_dtype == ""
+    assert load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf").data.dtype == np.float64
+
+
+@pytest.mark.parametrize("loader", ["raw", RawFITSLoader])
+def test_load_dataset_loader(loader):
+    ds = load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf", loader=loader)
+    assert ds.files.loader is RawFITSLoader
+    assert_allclose(ds.data.compute(), load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf").data.compute())
+
+
+def test_load_dataset_loader_conf():
+    with conf.set_temp("preferred_fits_library", "raw"):
+        ds = load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf")
+    assert ds.files.loader is RawFITSLoader
+    assert load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf").files.loader is AstropyFITSLoader
+
+
+def test_load_dataset_unknown_loader():
+    with pytest.raises(ValueError, match="Unknown FITS loader 'spam'"):
+        load_dataset(rootdir / "EIT" / "eit_test_dataset.asdf", loader="spam")
+
+
+def test_load_tiled_dataset_loader(asdf_tileddataset_path):
+    ds = load_dataset(asdf_tileddataset_path, loader="raw")
+    assert ds.files.loader is RawFITSLoader
+    assert all(tile.files.loader is RawFITSLoader for tile in ds.flat)
+
+
+def test_load_inversion_loader(tmp_path):
+    with gzip.open(rootdir / "test_L2_inversion.asdf.gz", mode="rb") as gfo:
+        (tmp_path / "test_L2_inversion.asdf").write_bytes(gfo.read())
+    inv = load_dataset(tmp_path / "test_L2_inversion.asdf", loader="raw")
+    assert all(ds.files.loader is RawFITSLoader for ds in inv.values())
+    assert all(ds.files.loader is RawFITSLoader for ds in inv.profiles.values())
+
+
+def test_load_dataset_from_url(eit_server, eit_dataset):
+    ds = load_dataset(eit_server.url_for("/eit_test_dataset.asdf"))
+    assert ds.files.basepath == eit_server.url_for("/").rstrip("/")
+    assert ds.files.loader is RemoteFITSLoader
+    assert_allclose(ds.data.compute(), eit_dataset.data.compute())
@@ -31,3 +31,23 @@ def test_2d_plot2(dataset_3d):
     fig = plt.figure()
     dataset_3d[:, :, 0].plot(axes_units=["Angstrom", "deg", "deg"])
     return fig
+
+
+def test_plot_statistics(eit_dataset, tmp_path):
+    eitdir = eit_dataset.files.basepath
+    for fileuri in eit_dataset.files.filenames:
+        (tmp_path / fileuri).write_bytes((eitdir / fileuri).read_bytes())
+    eit_dataset.files.basepath = tmp_path
+    stats = eit_dataset.files.compute_statistics()
+
+    # Animations of a slice are scaled to the range of the data in its files
+    data = eit_dataset.data[0:2].compute()
+    fig = plt.figure()
+    animation = eit_dataset[0:2].plot()
+    assert animation.axes.get_images()[0].get_clim() == (np.nanmin(data), np.nanmax(data))
+    plt.close(fig)
+
+    fig = plt.figure()
+    assert eit_dataset[0].plot().get_images()[0].get_clim() == (stats["min"][0], stats["max"][0])
+    assert eit_dataset[0].plot(vmin=0, vmax=1).get_images()[-1].get_clim() == (0, 1)
+    plt.close(fig)
@@ -10,6 +10,7 @@ import asdf
 from astropy.table import Table
 
 from dkist import Dataset, TiledDataset, load_dataset
+from dkist.dataset import tiled_dataset
 from dkist.tests.helpers import figure_test
 from dkist.utils.exceptions import DKISTUserWarning
 
@@ -133,6 +134,27 @@ def test_tileddataset_plot(share_zscale, hide_labels):
     return plt.gcf()
 
 
+def test_tileddataset_plot_statistics(eit_dataset, tmp_path, mocker):
+    eitdir = eit_dataset.files.basepath
+    for fileuri in eit_dataset.files.filenames:
+        (tmp_path / fileuri).write_bytes((eitdir / fileuri).read_bytes())
+    eit_dataset.files.basepath = tmp_path
+    eit_dataset.meta["inventory"] = {**eit_dataset.inventory, "instrumentName": "EIT", "datasetId": "EIT"}
+    tiles = [eit_dataset[i:i + 2] for i in range(0, 8, 2)]
+    meta = {"inventory": eit_dataset.inventory, "history": {"entries": ["entry"]}}
+    ds = TiledDataset(np.array(tiles, dtype=object).reshape((2, 2)), meta=meta)
+    eit_dataset.files.compute_statistics()
+
+    data_limits = mocker.spy(tiled_dataset, "data_limits")
+    fig = plt.figure()
+    ds.plot(0, share_zscale=True, figure=fig)
+    data = eit_dataset.data[0:8:2].compute()
+    assert data_limits.spy_return == (np.nanmin(data), np.nanmax(data))
+    for ax in fig.get_axes():
+        assert ax.get_images()[0].get_clim() == data_limits.spy_return
+    plt.close(fig)
+
+
 @figure_test
 @pytest.mark.remote_data
 def test_masked_tileddataset_plot():
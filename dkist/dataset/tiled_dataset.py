@@ -24,6 +24,7 @@ import astropy
 from astropy.table import Table, vstack
 
 from dkist.io.file_manager import DKISTFileManager
+from dkist.io.statistics import data_limits
 from dkist.utils.exceptions import DKISTDeprecationWarning, DKISTUserWarning
 
 from .dataset import Dataset
@@ -58,6 +59,24 @@ class TiledDatasetFileManager:
         for tile in self._parent.flat:
             tile.files.basepath = basepath
 
+    @property
+    def loader(self) -> type:
+        """
+        The class used to read the data from the FITS files of all tiles.
+        """
+        loader = self._parent.flat[0].files.loader
+        for tile in self._parent.flat:
+            if loader is not tile.files.loader:
+                raise ValueError(
+                    "Not all tiles use the same loader. Use 'TiledDataset.files.loader = <loader>' to set the loader on all tiles."
+                )
+        return loader
+
+    @loader.setter
+    def loader(self, loader: type | str):
+        for tile in self._parent.flat:
+            tile.files.loader = loader
+
     @property
     def filenames(self) -> list[str]:
         return np.array([tile.files.filenames for tile in self._parent.flat]).flatten().tolist()
@@ -69,6 +88,10 @@ class TiledDatasetFileManager:
     def shape(self):
         return self._parent.flat[0].files.shape
 
+    @property
+    def target(self):
+        return self._parent.flat[0].files._fm.target
+
     @property
     def fileuri_array(self):
         # Can't use self._parent.flat here because it would remove the masked elements
@@ -307,7 +330,9 @@ class TiledDataset(Collection):
         share_zscale
             Determines whether the color scale of the plots should be calculated
             independently (``False``) or shared across all plots (``True``).
-            Defaults to False
+            Defaults to False. If the statistics of all the files of the tiles
+            have been saved by `.DKISTFileManager.compute_statistics` the
+            shared scale is the range of the data in those files.
         figure
             A figure to use for the plot. If not specified the current pyplot
             figure will be used, or a new one created.
@@ -343,6 +368,12 @@ class TiledDataset(Collection):
                 "dimensional dataset, you should pass a slice which results in a 2D dataset for each tile."
             )
         dataset_ncols, dataset_nrows = sliced_dataset.shape
+        limits = None
+        if share_zscale and not {"vmin", "vmax", "norm", "data_unit"}.intersection(kwargs):
+            # Use the saved statistics of the files rather than the range of each image
+            limits = data_limits(tile.files for tile in sliced_dataset.flat)
+            if limits is not None:
+                kwargs = {**kwargs, "vmin": limits[0], "vmax": limits[1]}
         gridspec = GridSpec(nrows=dataset_nrows, ncols=dataset_ncols, figure=figure)
         for col in range(dataset_ncols):
             for row in range(dataset_nrows):
@@ -379,7 +410,7 @@ class TiledDataset(Collection):
                 vmin = axmin if axmin < vmin else vmin
                 vmax = axmax if axmax > vmax else vmax
 
-        if share_zscale:
+        if share_zscale and limits is None:
             for ax in figure.get_axes():
                 ax.get_images()[0].set_clim(vmin, vmax)
 
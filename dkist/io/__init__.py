@@ -1,7 +1,162 @@
 """
 Functionality for loading many DKIST FITS files into a single Dask array.
 """
+import dkist.config as _config
+
+__all__ = ["DKISTFileManager", "cached_compute", "conf"]
+
+
+class Conf(_config.ConfigNamespace):
+    """
+    Configuration Parameters for the `dkist.io` Package.
+    """
+    rootname = "dkist"
+
+    preferred_fits_library = _config.ConfigItem(
+        "astropy",
+        "The name of the FITS loader used to read data from the FITS files, "
+        "one of the loaders in dkist.io.dask.loaders.fits_loaders: 'astropy', "
+        "'raw' (which reads uncompressed data directly, without parsing the "
+        "headers), 'tar' (which reads files out of an uncompressed tar "
+        "archive), 'fitsio' (which requires the fitsio package) or 'remote' "
+        "(which reads files from a URL).",
+    )
+    max_open_files = _config.ConfigItem(
+        64,
+        "The maximum number of FITS files kept open by the FITS loaders. "
+        "Open files are reused between reads to avoid re-parsing headers, "
+        "set this to 0 to close every file after it is read.",
+    )
+    chunk_size = _config.ConfigItem(
+        "auto",
+        "The target size of each chunk of the dask array of a dataset, either a "
+        "number of bytes or a string such as '64 MiB'. Consecutive files are "
+        "read together in one chunk up to this size. 'auto' uses dask's "
+        "'array.chunk-size' setting, set this to 0 to read each file as a separate chunk.",
+    )
+    remote_block_size = _config.ConfigItem(
+        "1 MiB",
+        "The size of the blocks remote FITS files are read in by the 'remote' "
+        "loader, either a number of bytes or a string such as '4 MiB'.",
+    )
+    remote_cache_blocks = _config.ConfigItem(
+        16,
+        "The number of the most recently read blocks of each open remote FITS "
+        "file which are kept in memory by the 'remote' loader.",
+    )
+    output_dtype = _config.ConfigItem(
+        "",
+        "The floating point or complex dtype the data of a dataset is "
+        "converted to as it is read from the files, for example 'float32' to "
+        "halve the memory used by float64 data. Data are converted to native "
+        "byte order. An empty string keeps the dtype (and byte order) the data "
+        "are stored with in the files.",
+    )
+    tile_cache_size = _config.ConfigItem(
+        "256 MiB",
+        "The maximum size of the cache of decompressed tiles of tile "
+        "compressed FITS files, either a number of bytes or a string such as "
+        "'1 GiB'. Set this to 0 to disable the cache.",
+    )
+    file_cache_size = _config.ConfigItem(
+        "0",
+        "The maximum size of the in memory cache of the data of whole FITS "
+        "files, shared by all the datasets in a process, so that slices of a "
+        "dataset do not read files which have just been read again. Either a "
+        "number of bytes or a string such as '1 GiB'. Set this to 0 to disable "
+        "the cache.",
+    )
+    split_large_files = _config.ConfigItem(
+        False,
+        "If True, files larger than 'chunk_size' are split into several chunks "
+        "along their spatial axes, which are read independently. This lets "
+        "more than one thread work on each file and reduces the memory used by "
+        "each task for datasets with very large frames.",
+    )
+    prefetch_files = _config.ConfigItem(
+        0,
+        "The number of files after the ones read by each task which are read "
+        "into the page cache in the background, so that reading the next files "
+        "overlaps with computing on the current ones when a dataset is "
+        "processed in order. Set this to 0 to disable prefetching.",
+    )
+    prefetch_memory = _config.ConfigItem(
+        "512 MiB",
+        "The maximum total size of the files which have been prefetched but "
+        "not yet read, either a number of bytes or a string such as '1 GiB'.",
+    )
+    prefetch_expiry = _config.ConfigItem(
+        30.0,
+        "The number of seconds after which files which have been prefetched "
+        "but not read are assumed to have been skipped, releasing their share "
+        "of 'prefetch_memory' when it is needed to prefetch other files.",
+    )
+    prefetch_method = _config.ConfigItem(
+        "fadvise",
+        "How files are prefetched, either 'fadvise' (which asks the operating "
+        "system to read them with posix_fadvise, where it is available) or "
+        "'thread' (which reads them in a pool of background threads).",
+    )
+    shared_cache_size = _config.ConfigItem(
+        "0",
+        "The maximum total size of the cache of decoded frames in shared "
+        "memory, which is shared by all the processes on a node so that each "
+        "frame is only decoded and held in memory once. Either a number of "
+        "bytes or a string such as '1 GiB'. Set this to 0 to disable the cache.",
+    )
+    shared_cache_dir = _config.ConfigItem(
+        "",
+        "The directory, on a memory backed file system, where the shared "
+        "cache of decoded frames is kept. Leave this empty to use a directory "
+        "for the current user in /dev/shm, or in the temporary directory on "
+        "platforms without /dev/shm.",
+    )
+    disk_cache_dir = _config.ConfigItem(
+        "",
+        "A directory on fast local storage where the data read from FITS "
+        "files is saved, so that reading the same data again, in this or a "
+        "later session, does not read the FITS files. Leave this empty to "
+        "disable the cache.",
+    )
+    disk_cache_size = _config.ConfigItem(
+        "10 GiB",
+        "The maximum total size of the files in disk_cache_dir, either a "
+        "number of bytes or a string such as '1 GiB'. The least recently used "
+        "data is deleted to keep the cache below this size.",
+    )
+    result_cache_dir = _config.ConfigItem(
+        "",
+        "The directory where the results of dkist.io.cached_compute are "
+        "saved. Leave this empty to use a directory in the user cache "
+        "directory.",
+    )
+    result_cache_size = _config.ConfigItem(
+        "1 GiB",
+        "The maximum total size of the results saved by "
+        "dkist.io.cached_compute, either a number of bytes or a string such as "
+        "'10 GiB'. The least recently used results are deleted to keep the "
+        "cache below this size.",
+    )
+    io_order = _config.ConfigItem(
+        False,
+        "If True, the tasks which read files are annotated with a priority "
+        "which makes the distributed scheduler read the files in the order "
+        "they are laid out on disk. Use dkist.io.dask.IOOrder to do the same "
+        "with dask's local schedulers.",
+    )
+    decode_processes = _config.ConfigItem(
+        0,
+        "The number of processes used to read and decode FITS files, which "
+        "return the data to the tasks of the dask array through shared memory. "
+        "This avoids the GIL limiting the number of files which can be decoded "
+        "at once by the threaded scheduler. Set this to 0 to read files in the "
+        "tasks themselves.",
+    )
+
+
+conf = Conf()
+
+# Put imports after conf so that conf is initialized before import
+from .memoize import cached_compute
 from .file_manager import DKISTFileManager
 from .utils import filemanager_info_str, save_dataset
-
-__all__ = ["DKISTFileManager"]
@@ -27,9 +27,7 @@ class DatasetConverter(Converter):
         tag_version = tuple(map(int, tag.split("-")[1].split(".")))
         from dkist.dataset import Dataset
 
-        data = node["data"]._striped_external_array._generate_array()
-        if subslice := node["data"]._subslice:
-            data = data[*subslice]
+        data = node["data"]._apply_subslice(node["data"]._striped_external_array._generate_array())
         wcs = node["wcs"]
         meta = node.get("meta", {})
         unit = node.get("unit")
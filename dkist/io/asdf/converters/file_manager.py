@@ -13,25 +13,26 @@ class FileManagerConverter(Converter):
     types = ["dkist.io.dask.striped_array.FileManager"]
 
     def from_yaml_tree(self, node, tag, ctx):
-        import numpy as np
-
-        from dkist.io.dask.loaders import AstropyFITSLoader
+        from dkist.io import conf
+        from dkist.io.dask.loaders import get_fits_loader
         from dkist.io.dask.striped_array import FileManager
-
-        url = urlparse(ctx.url or ".")
-        if url.scheme not in ("file", ""):
-            raise ValueError("Currently only loading local asdf files is supported.")
-        filepath = Path(url.path)
-        if isinstance(filepath, PureWindowsPath):
-            # If we are on windows we need to strip the leading /
-            filepath = Path(url.path.strip("/"))
-        base_path = filepath.parent
+        from dkist.io.utils import is_url
+
+        if is_url(ctx.url):
+            # Read the FITS files from the same location as a remote asdf file
+            base_path = ctx.url.rsplit("/", 1)[0]
+            loader = get_fits_loader("remote")
+        else:
+            url = urlparse(ctx.url or ".")
+            filepath = Path(url.path)
+            if isinstance(filepath, PureWindowsPath):
+                # If we are on windows we need to strip the leading /
+                filepath = Path(url.path.strip("/"))
+            base_path = filepath.parent
+            loader = get_fits_loader()
+        # The subslice applies to the dimensions of the files
         if subslice := node.get("subslice"):
-            slice_ = []
-            for s in subslice:
-                slice_.append(slice(*s) if isinstance(s, list) else s)
-            idx = len(np.shape(node["fileuris"]))
-            subslice = [np.s_[:]] * idx + slice_
+            subslice = tuple(slice(*s) if isinstance(s, list) else s for s in subslice)
 
         return FileManager.from_parts(
             node["fileuris"],
@@ -39,9 +40,10 @@ class FileManagerConverter(Converter):
             node["datatype"],
             node["shape"],
             chunksize=node.get("chunksize", None),
-            loader=AstropyFITSLoader,
+            loader=loader,
             basepath=base_path,
             subslice=subslice,
+            output_dtype=conf.output_dtype or None,
         )
 
     def to_yaml_tree(self, obj, tag, ctx):
@@ -0,0 +1,156 @@
+"""
+Verification of the integrity of FITS files with their checksums.
+
+DKIST FITS files record the ``CHECKSUM`` and ``DATASUM`` of each HDU in its
+header. Checking them means reading every byte of every file, so the result
+for each file is saved in a sidecar file next to the FITS files, along with
+the size and modification time of the file, so files which have not changed
+are never checked again.
+"""
+import os
+import json
+import warnings
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from astropy.io import fits
+
+from dkist import log
+
+__all__ = ["ChecksumCache", "verify_file"]
+
+
+def verify_file(path):
+    """
+    Verify the ``CHECKSUM`` and ``DATASUM`` keywords of every HDU in a FITS file.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`
+        The FITS file to verify.
+
+    Returns
+    -------
+    `bool` or `None`
+        `True` if all the checksums in the file match, `False` if any do not
+        or the file can not be read, and `None` if the file does not have any
+        checksums.
+    """
+    found = False
+    with warnings.catch_warnings():
+        # astropy warns about truncated files as well as raising
+        warnings.simplefilter("ignore")
+        try:
+            with fits.open(path, memmap=False, do_not_scale_image_data=True, mode="denywrite") as hdul:
+                for hdu in hdul:
+                    # These return 1 if the sum matches, 0 if it does not and 2 if it is missing
+                    for result in (hdu.verify_datasum(), hdu.verify_checksum()):
+                        if result == 0:
+                            log.debug("Checksum of HDU %s of %s does not match", hdu.name, path)
+                            return False
+                        found |= result == 1
+        except (OSError, ValueError, TypeError) as e:
+            log.debug("Could not verify %s: %s", path, e)
+            return False
+    return True if found else None
+
+
+class ChecksumCache:
+    """
+    The results of verifying the checksums of the FITS files in a directory.
+
+    Parameters
+    ----------
+    basepath : `pathlib.Path`
+        The directory containing the FITS files, where the cache is saved.
+    """
+    filename = "dkist_checksums.json"
+
+    def __init__(self, basepath):
+        self.basepath = Path(basepath)
+        self._lock = threading.Lock()
+        self._results = {}
+        self._dirty = False
+        if self.path.exists():
+            self._load()
+
+    @property
+    def path(self):
+        """
+        The path of the sidecar file this cache is saved to.
+        """
+        return self.basepath / self.filename
+
+    def __len__(self):
+        return len(self._results)
+
+    def _load(self):
+        try:
+            with open(self.path) as fobj:
+                contents = json.load(fobj)
+        except (OSError, ValueError) as e:
+            log.warning("Could not read the checksum cache %s: %s", self.path, e)
+            return
+        self._results = {fileuri: tuple(result) for fileuri, result in contents["results"].items()}
+
+    def save(self):
+        """
+        Write the cache to its sidecar file, if it has changed.
+        """
+        if not self._dirty:
+            return
+        with self._lock:
+            contents = {"results": {fileuri: list(result) for fileuri, result in self._results.items()}}
+            self._dirty = False
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as fobj:
+            json.dump(contents, fobj)
+        tmp_path.replace(self.path)
+
+    def lookup(self, fileuri, stat):
+        """
+        Return the cached result for a file, if it has not changed since it was verified.
+
+        Returns
+        -------
+        `tuple`
+            ``(found, result)``, where ``found`` is `False` if the file has not
+            been verified or has changed since, and ``result`` is the return
+            value of `verify_file`.
+        """
+        cached = self._results.get(str(fileuri))
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            return False, None
+        return True, cached[2]
+
+    def record(self, fileuri, stat, result):
+        """
+        Record the result of verifying a file with the given `os.stat_result`.
+        """
+        with self._lock:
+            self._results[str(fileuri)] = (stat.st_size, stat.st_mtime_ns, result)
+            self._dirty = True
+
+    def corrupt(self, fileuri_array):
+        """
+        Return a boolean array which is `True` for the files which were found to be corrupt.
+
+        Only files which have not changed since they were verified are
+        considered corrupt.
+        """
+        fileuris = np.asarray(fileuri_array)
+        corrupt = np.zeros(fileuris.shape, dtype=bool)
+        if not any(result[2] is False for result in self._results.values()):
+            return corrupt
+        for index in np.ndindex(fileuris.shape):
+            cached = self._results.get(str(fileuris[index]))
+            if cached is None or cached[2] is not False:
+                continue
+            try:
+                stat = (self.basepath / fileuris[index]).stat()
+            except FileNotFoundError:
+                continue
+            corrupt[index] = self.lookup(fileuris[index], stat) == (True, False)
+        return corrupt
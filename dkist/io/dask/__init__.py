@@ -1,3 +1,26 @@
-from .loaders import AstropyFITSLoader, BaseFITSLoader
+from .loaders import (
+    AstropyFITSLoader,
+    BaseFITSLoader,
+    FITSFilePool,
+    FileCache,
+    FitsioFITSLoader,
+    RawFITSLoader,
+    RemoteFITSFilePool,
+    RemoteFITSLoader,
+    TarFITSLoader,
+    TileCache,
+    file_cache,
+    fits_file_pool,
+    fits_loaders,
+    get_fits_loader,
+    register_fits_loader,
+    remote_file_pool,
+    tile_cache,
+)
+from .decode import DecodePool, decode_pool
+from .disk_cache import DiskChunkCache, disk_cache
+from .ordering import IOOrder
+from .prefetch import Prefetcher, prefetcher
+from .shared_cache import SharedFrameCache, shared_frame_cache
 from .striped_array import FileManager, StripedExternalArray
-from .utils import stack_loader_array
+from .utils import FileTransform, stack_loader_array
@@ -0,0 +1,158 @@
+"""
+Generic caching primitives shared by the FITS loading machinery.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+__all__ = ["CacheInfo", "LRUCache"]
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+CacheInfo.__doc__ = """
+Statistics about a `LRUCache`, modelled on the return value of ``functools.lru_cache().cache_info()``.
+"""
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded, least recently used cache.
+
+    Parameters
+    ----------
+    maxsize : `int`
+        The maximum total size of the items in the cache. When adding an item
+        would exceed this size, the least recently used items are evicted
+        until it fits.
+    sizeof : callable, optional
+        A function returning the size of a value, used to measure the cache
+        against ``maxsize``. If not specified every item has a size of one, so
+        ``maxsize`` is the maximum number of items.
+    on_evict : callable, optional
+        A function called as ``on_evict(key, value)`` for every item which is
+        removed from the cache. It is called without the cache lock held, so
+        it is safe for it to block.
+    """
+
+    def __init__(self, maxsize, *, sizeof=None, on_evict=None):
+        self._maxsize = maxsize
+        self._sizeof = sizeof or (lambda value: 1)
+        self._on_evict = on_evict
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._currsize = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def maxsize(self):
+        """
+        The maximum total size of the items in the cache.
+        """
+        return self._maxsize
+
+    @property
+    def currsize(self):
+        """
+        The current total size of the items in the cache.
+        """
+        return self._currsize
+
+    def get(self, key, default=None):
+        """
+        Return the value for ``key`` marking it as recently used, or ``default`` if it is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Add ``value`` to the cache, evicting the least recently used items if needed.
+
+        Values larger than ``maxsize`` are not stored.
+        """
+        size = self._sizeof(value)
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                evicted.append(self._remove(key))
+            if size <= self.maxsize:
+                self._data[key] = value
+                self._sizes[key] = size
+                self._currsize += size
+            evicted += self._shrink(self.maxsize)
+        self._evicted(evicted)
+
+    def pop(self, key, default=None):
+        """
+        Remove ``key`` from the cache, returning its value or ``default``.
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            item = self._remove(key)
+        self._evicted([item])
+        return item[1]
+
+    def evict(self, predicate):
+        """
+        Remove all items for which ``predicate(key)`` is true.
+        """
+        with self._lock:
+            evicted = [self._remove(key) for key in list(self._data) if predicate(key)]
+        self._evicted(evicted)
+
+    def clear(self):
+        """
+        Remove all items from the cache and reset the statistics.
+        """
+        with self._lock:
+            evicted = [self._remove(key) for key in list(self._data)]
+            self._hits = self._misses = 0
+        self._evicted(evicted)
+
+    def resize(self, maxsize):
+        """
+        Change the maximum size of the cache, evicting items if it has shrunk.
+        """
+        with self._lock:
+            self._maxsize = maxsize
+            evicted = self._shrink(self.maxsize)
+        self._evicted(evicted)
+
+    def cache_info(self):
+        """
+        Return a `CacheInfo` describing the hits, misses and size of the cache.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, self._currsize)
+
+    def _remove(self, key):
+        value = self._data.pop(key)
+        self._currsize -= self._sizes.pop(key)
+        return key, value
+
+    def _shrink(self, maxsize):
+        evicted = []
+        while self._data and self._currsize > maxsize:
+            evicted.append(self._remove(next(iter(self._data))))
+        return evicted
+
+    def _evicted(self, items):
+        if self._on_evict is None:
+            return
+        for key, value in items:
+            self._on_evict(key, value)
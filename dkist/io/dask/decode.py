@@ -0,0 +1,250 @@
+"""
+Read files in a pool of processes, returning their data through shared memory.
+
+Parsing FITS files and byte swapping their data holds the GIL for much of the
+time, so reading files in the threads of dask's default scheduler does not
+use more than a few cores. Dask's multiprocessing scheduler avoids the GIL,
+but pickles the data of every task to return it to the parent process.
+
+When ``dkist.io.conf.decode_processes`` is set, the loader tasks of a dataset
+read their files in the worker processes of the `DecodePool`, which write the
+data into `multiprocessing.shared_memory` blocks. The tasks then wrap the
+blocks as numpy arrays without copying the data, so only the name of each
+block is sent between processes.
+"""
+import weakref
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from dkist import log
+from dkist.io import conf
+
+__all__ = ["DecodePool", "decode_pool"]
+
+
+class DecodePool:
+    """
+    A pool of processes which call functions returning arrays, and return the arrays through shared memory.
+
+    The pool is started the first time it is used, with
+    ``dkist.io.conf.decode_processes`` worker processes, and started again
+    if that option changes.
+
+    Parameters
+    ----------
+    start_method : `str`, optional
+        The `multiprocessing` start method of the worker processes. The
+        default is ``"forkserver"`` where it is available and ``"spawn"``
+        otherwise, as forking a process which is running dask's threads is
+        not safe.
+    """
+
+    def __init__(self, start_method=None):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.start_method = start_method
+        self._executor = None
+        self._max_workers = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self):
+        """
+        The number of worker processes, or `None` if the pool has not been started.
+        """
+        return self._max_workers
+
+    def _get_executor(self):
+        max_workers = int(conf.decode_processes)
+        if max_workers <= 0:
+            raise ValueError("dkist.io.conf.decode_processes must be greater than zero to decode files in processes.")
+        with self._lock:
+            if self._executor is None or self._max_workers != max_workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                log.debug("Starting %s processes to decode files", max_workers)
+                self._executor = ProcessPoolExecutor(max_workers,
+                                                     mp_context=multiprocessing.get_context(self.start_method))
+                self._max_workers = max_workers
+            return self._executor
+
+    def map(self, func, args):
+        """
+        Call ``func`` with each tuple of arguments in ``args`` in the worker processes.
+
+        Parameters
+        ----------
+        func : callable
+            A function returning an array. It, and its arguments, must be
+            picklable.
+        args : iterable[tuple]
+            The arguments of each call.
+
+        Returns
+        -------
+        list[`numpy.ndarray`]
+            The result of each call, backed by a shared memory block which is
+            released when the array and all views of it are deleted.
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(_call_to_shared_memory, func, *a) for a in args]
+        results = []
+        try:
+            for future in futures:
+                results.append(_from_shared_memory(*future.result()))
+        except BaseException:
+            # Release the blocks written by calls which have not been collected
+            for future in futures[len(results):]:
+                if not future.cancel() and future.exception() is None:
+                    _from_shared_memory(*future.result())
+            raise
+        return results
+
+    def map_into(self, func, args, shape, dtype):
+        """
+        Call ``func`` with each tuple of arguments in ``args`` in the worker processes, stacking the results.
+
+        The result is allocated in one shared memory block, which each worker
+        process writes the array returned by its call into, so the results
+        are not copied again to stack them.
+
+        Parameters
+        ----------
+        func : callable
+            A function returning an array. It, and its arguments, must be
+            picklable.
+        args : sequence[tuple]
+            The arguments of each call.
+        shape : tuple[int]
+            The shape of the array returned by each call.
+        dtype : `numpy.dtype`
+            The dtype of the result.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            The results stacked along a new first axis, backed by a shared
+            memory block which is released when the array and all views of
+            it are deleted. If every call returns a view of the same single
+            value, such as a broadcast scalar, this is a view of that value
+            instead.
+        """
+        executor = self._get_executor()
+        dtype = np.dtype(dtype)
+        shape = (len(args), *shape)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if not nbytes:
+            # There is nothing to write, so each call returns nothing, and only the errors matter
+            for future in [executor.submit(_call_into_shared_memory, None, shape, dtype, i, func, *a)
+                           for i, a in enumerate(args)]:
+                future.result()
+            return np.empty(shape, dtype=dtype)
+
+        shm = SharedMemory(create=True, size=nbytes)
+        try:
+            futures = [executor.submit(_call_into_shared_memory, shm.name, shape, dtype, i, func, *a)
+                       for i, a in enumerate(args)]
+            # Wait for all the calls, so none are still writing to the block if one fails
+            fills = [future.exception() or future.result() for future in futures]
+        finally:
+            shm.unlink()
+        for fill in fills:
+            if isinstance(fill, BaseException):
+                shm.close()
+                raise fill
+
+        missing = [i for i, fill in enumerate(fills) if fill is not None]
+        if len(missing) == len(fills) and len({repr(fill) for fill in fills}) == 1:
+            shm.close()
+            return np.broadcast_to(np.array(fills[0][0], dtype=dtype), shape)
+        data = np.ndarray(shape, dtype, buffer=shm.buf)
+        for i in missing:
+            data[i] = fills[i][0]
+        # Views of data keep it alive, so the block is only closed once none remain
+        weakref.finalize(data, shm.close)
+        return data
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker processes.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._max_workers = None
+
+
+def _call_to_shared_memory(func, *args):
+    """
+    Call ``func`` and copy the array it returns into a new shared memory block.
+
+    Returns
+    -------
+    `tuple`
+        ``(name, shape, dtype, fill)``, where ``name`` is the name of the
+        block, or `None` if the array is a view of the single value ``fill``
+        (such as a broadcast scalar) which is sent without a block.
+    """
+    data = np.asarray(func(*args))
+    if data.nbytes == 0 or not any(data.strides):
+        return None, data.shape, data.dtype, data.flat[0] if data.size else None
+    shm = SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, data.dtype, buffer=shm.buf)[...] = data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, data.shape, data.dtype, None
+
+
+def _call_into_shared_memory(name, shape, dtype, index, func, *args):
+    """
+    Call ``func`` and write the array it returns into ``index`` of the array in the shared memory block ``name``.
+
+    Returns
+    -------
+    `tuple` or `None`
+        `None` if the array was written, or ``(fill,)`` if the array is a view
+        of the single value ``fill`` (such as a broadcast scalar),
+        which is not written.
+    """
+    data = np.asarray(func(*args))
+    if data.size and not any(data.strides):
+        return (data.flat[0],)
+    if name is None:
+        return None
+    shm = SharedMemory(name)
+    try:
+        np.ndarray(shape, dtype, buffer=shm.buf)[index] = data
+    finally:
+        shm.close()
+    return None
+
+
+def _from_shared_memory(name, shape, dtype, fill):
+    """
+    Wrap a shared memory block written by `_call_to_shared_memory` as an array, without copying it.
+    """
+    if name is None:
+        return np.broadcast_to(np.array(0 if fill is None else fill, dtype=dtype), shape)
+    shm = SharedMemory(name)
+    # The block stays mapped until it is closed, so it can be unlinked now to
+    # ensure it is freed even if this process exits without closing it.
+    shm.unlink()
+    data = np.ndarray(shape, dtype, buffer=shm.buf)
+    # Views of data keep it alive, so the block is only closed once none remain
+    weakref.finalize(data, shm.close)
+    return data
+
+
+decode_pool = DecodePool()
+"""
+The process-wide `DecodePool` used by the dask arrays of datasets.
+"""
@@ -0,0 +1,244 @@
+"""
+A persistent cache of the data read from FITS files, on fast local storage.
+
+Reading a FITS file from a network file system and decoding its data is
+repeated every time a dataset is opened in a new session. When
+``dkist.io.conf.disk_cache_dir`` is set, the data read by each loader is
+saved there as a ``.npy`` file, and later reads of the same part of the same
+file memory map it instead.
+
+Entries are identified by the absolute path of the file, its size and
+modification time, the HDU and the slice which was read, so changing the
+``basepath`` of a dataset, or replacing its files, never returns stale data.
+The total size of the cache is limited to ``dkist.io.conf.disk_cache_size``,
+by deleting the least recently used entries.
+"""
+import os
+import hashlib
+import threading
+from numbers import Integral
+from pathlib import Path
+
+import numpy as np
+from dask.utils import parse_bytes
+
+from dkist import log
+from dkist.io import conf
+from dkist.io.dask.cache import LRUCache
+from dkist.io.dask.loaders import _is_missing
+
+__all__ = ["DiskChunkCache", "disk_cache"]
+
+
+class DiskChunkCache:
+    """
+    A size-bounded, least recently used cache of loaded data, saved as ``.npy`` files in a directory.
+
+    The directory may be shared by several processes, and persists between
+    sessions. When the cache is first used in a process the entries already
+    in the directory are found, and their modification times (which are
+    updated every time an entry is used) give their order of use.
+
+    Parameters
+    ----------
+    directory : `pathlib.Path`, optional
+        The directory the cache is saved in. Defaults to
+        ``dkist.io.conf.disk_cache_dir``, in which case the cache is disabled
+        if that option is empty.
+    maxsize : `int`, optional
+        The maximum total size of the cache, in bytes. Defaults to
+        ``dkist.io.conf.disk_cache_size``, which is read every time an entry
+        is added to the cache.
+    """
+    suffix = ".npy"
+
+    def __init__(self, directory=None, maxsize=None):
+        self._directory = directory
+        self._maxsize = maxsize
+        self._entries = None
+        self._entries_directory = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """
+        The directory the cache is saved in, or `None` if the cache is disabled.
+        """
+        directory = self._directory if self._directory is not None else str(conf.disk_cache_dir)
+        return Path(directory).expanduser() if directory else None
+
+    @property
+    def maxsize(self):
+        """
+        The maximum total size of the cache, in bytes.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return parse_bytes(str(conf.disk_cache_size))
+
+    def _lru(self, directory):
+        """
+        The `~dkist.io.dask.cache.LRUCache` of the sizes of the entries in ``directory``.
+        """
+        with self._lock:
+            if self._entries is None or self._entries_directory != directory:
+                directory.mkdir(parents=True, exist_ok=True)
+                self._entries = LRUCache(self.maxsize, sizeof=lambda size: size, on_evict=self._delete)
+                self._entries_directory = directory
+                existing = []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(self.suffix) and entry.is_file():
+                            stat = entry.stat()
+                            existing.append((stat.st_mtime_ns, entry.name, stat.st_size))
+                for _, name, size in sorted(existing):
+                    self._entries.put(name, size)
+                log.debug("Found %s entries in the disk cache %s", len(existing), directory)
+            return self._entries
+
+    def _delete(self, name, size):
+        try:
+            (self._entries_directory / name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # On Windows files which are memory mapped can not be deleted
+            log.debug("Could not delete %s from the disk cache: %s", name, e)
+
+    @staticmethod
+    def key(loader, item):
+        """
+        The name of the cache entry for ``loader[item]``, or `None` if it can not be cached.
+
+        Only data read from local files can be cached, as the modification
+        time of remote files is not known without asking the server.
+        """
+        byte_range = loader.byte_range()
+        if byte_range is None:
+            return None
+        path, offset, length = byte_range
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return None
+        dtype = loader.output_dtype if loader.output_dtype is not None else np.dtype(loader.dtype)
+        key = (os.path.realpath(path), offset, length, stat.st_mtime_ns, loader.target,
+               _normalize_index(item, loader.shape), dtype.str)
+        return hashlib.sha256(repr(key).encode()).hexdigest() + DiskChunkCache.suffix
+
+    def read(self, loader, item):
+        """
+        Return ``loader[item]``, from the cache if it is there and adding it to the cache if not.
+
+        Data from the cache is a read only memory mapped array.
+        """
+        if self.directory is None:
+            return loader[item]
+        name = self.key(loader, item)
+        if name is None:
+            return loader[item]
+
+        data = self.get(name)
+        if data is not None:
+            log.debug("Read %s of %s from the disk cache", item, loader.fileuri)
+            return data
+        data = loader[item]
+        # The data of a missing file is not saved, so it is read once the file exists
+        if not _is_missing(np.asarray(data)):
+            self.put(name, data)
+        return data
+
+    def get(self, name):
+        """
+        Return the array saved in the cache as ``name``, memory mapped read only, or `None`.
+        """
+        directory = self.directory
+        if directory is None:
+            return None
+        entries = self._lru(directory)
+        path = directory / name
+        if entries.get(name) is None and not path.exists():
+            return None
+        try:
+            data = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            # The entry was evicted by another process, or is incomplete
+            log.debug("Could not read %s from the disk cache: %s", path, e)
+            entries.pop(name)
+            return None
+        if name not in entries:
+            entries.put(name, path.stat().st_size)
+        return data
+
+    def put(self, name, data):
+        """
+        Save an array in the cache as ``name``, evicting the least recently used entries if needed.
+
+        Arrays larger than the maximum size of the cache are not saved.
+        """
+        directory = self.directory
+        data = np.asarray(data)
+        if directory is None or data.nbytes + 128 > self.maxsize:
+            return
+        entries = self._lru(directory)
+        path = directory / name
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as fobj:
+                np.save(fobj, data, allow_pickle=False)
+            tmp_path.replace(path)
+        except OSError as e:
+            log.warning("Could not write to the disk cache %s: %s", directory, e)
+            tmp_path.unlink(missing_ok=True)
+            return
+        entries.resize(self.maxsize)
+        entries.put(name, path.stat().st_size)
+
+    def clear(self):
+        """
+        Delete all the entries in the cache directory.
+        """
+        directory = self.directory
+        if directory is None or not directory.exists():
+            return
+        self._lru(directory).clear()
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses in this process, and the current and maximum size in bytes.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        directory = self.directory
+        if directory is None:
+            return LRUCache(0).cache_info()
+        return self._lru(directory).cache_info()
+
+
+def _normalize_index(item, shape):
+    """
+    Convert an index into an array of ``shape`` to a canonical form, so equivalent indexes share a cache entry.
+    """
+    item = item if isinstance(item, tuple) else (item,)
+    if len(item) > len(shape) or not all(isinstance(i, (slice, Integral)) for i in item):
+        return repr(item)
+    item = item + (slice(None),) * (len(shape) - len(item))
+    normalized = []
+    for i, n in zip(item, shape):
+        if isinstance(i, slice):
+            normalized.append(i.indices(n))
+        elif -n <= i < n:
+            normalized.append(int(i) % n)
+        else:
+            # Out of range, so reading it fails, and it must not share an entry with a valid index
+            return repr(item)
+    return tuple(normalized)
+
+
+disk_cache = DiskChunkCache()
+"""
+The `DiskChunkCache` used by the dask arrays of datasets.
+"""
@@ -3,18 +3,550 @@ This file contains code to lazy-load arrays from FITS files. It is designed to
 minimise (virtual) memory usage and the number of open files.
 """
 
+import os
 import abc
+import itertools
+import threading
+import contextlib
+from numbers import Integral
 from pathlib import Path
 
 import numpy as np
+from dask.utils import parse_bytes
 
 from astropy.io import fits
+from astropy.io.fits.hdu.base import BITPIX2DTYPE
 
 from sunpy.util.decorators import add_common_docstring
 
 from dkist import log
+from dkist.io import conf
+from dkist.io.dask.cache import LRUCache
+from dkist.io.dask.offsets import DataOffsetIndex, TarDataOffsetIndex
+from dkist.io.utils import is_url, join_url
 
-__all__ = ["AstropyFITSLoader", "BaseFITSLoader"]
+__all__ = [
+    "AstropyFITSLoader",
+    "BaseFITSLoader",
+    "FITSFilePool",
+    "FileCache",
+    "FitsioFITSLoader",
+    "RawFITSLoader",
+    "RemoteFITSFilePool",
+    "RemoteFITSLoader",
+    "TarFITSLoader",
+    "TileCache",
+    "file_cache",
+    "fits_file_pool",
+    "fits_loaders",
+    "get_fits_loader",
+    "register_fits_loader",
+    "remote_file_pool",
+    "tile_cache",
+]
+
+
+class _PooledFile:
+    """
+    An open `~astropy.io.fits.HDUList` and the lock serialising access to it.
+
+    ``fileobj`` is the file object the HDUList was opened from, if any, which
+    is closed with it.
+    """
+    __slots__ = ["closed", "fileobj", "hdul", "lock"]
+
+    def __init__(self, hdul, fileobj=None):
+        self.hdul = hdul
+        self.fileobj = fileobj
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _close(self):
+        self.closed = True
+        self.hdul.close()
+        if self.fileobj is not None:
+            self.fileobj.close()
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+class FITSFilePool:
+    """
+    A process-wide pool of open FITS files.
+
+    Opening a FITS file and parsing its headers is often more expensive than
+    reading a small section of its data, so this pool keeps recently used
+    files open for reuse. Files are evicted in least recently used order once
+    more than ``maxsize`` are open.
+
+    Files are identified by their path, modification time and size, so a file
+    which is replaced on disk will be reopened.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        The maximum number of files to keep open. Defaults to
+        ``dkist.io.conf.max_open_files``, which is read every time a file is
+        added to the pool.
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._files = LRUCache(self.maxsize, on_evict=self._close)
+
+    @property
+    def maxsize(self):
+        """
+        The maximum number of files which are kept open.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return int(conf.max_open_files)
+
+    @staticmethod
+    def _close(key, pooled_file):
+        log.debug("Closing pooled file %s", key[0])
+        pooled_file.close()
+
+    @staticmethod
+    def _key(path):
+        stat = Path(path).stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _open(path):
+        return _PooledFile(fits.open(path,
+                                     memmap=False,  # memmap is redundant with dask and delayed loading
+                                     do_not_scale_image_data=True,  # don't scale as we shouldn't need to
+                                     mode="denywrite"))
+
+    @staticmethod
+    def _in_basepath(key, basepath):
+        return Path(key[0]).is_relative_to(basepath)
+
+    @contextlib.contextmanager
+    def open(self, path):
+        """
+        Yield an open `~astropy.io.fits.HDUList` for ``path``.
+
+        The file is locked for the duration of the context, so that only one
+        thread reads from each open file at a time.
+        """
+        key = self._key(path)
+        while True:
+            pooled_file = self._files.get(key)
+            if pooled_file is None:
+                pooled_file = self._open(path)
+                self._files.resize(self.maxsize)
+                self._files.put(key, pooled_file)
+            with pooled_file.lock:
+                # The file might have been evicted and closed by another
+                # thread between getting it from the pool and locking it.
+                if pooled_file.closed:
+                    continue
+                try:
+                    yield pooled_file.hdul
+                finally:
+                    # If the pool is full (or has a size of zero) the file
+                    # might not have been kept, so close it now.
+                    if key not in self._files:
+                        pooled_file._close()
+                return
+
+    def invalidate(self, basepath=None):
+        """
+        Close all pooled files, or only those inside the ``basepath`` directory.
+        """
+        if basepath is None:
+            self._files.clear()
+            return
+        self._files.evict(lambda key: self._in_basepath(key, basepath))
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses and the current and maximum number of open files.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        return self._files.cache_info()
+
+
+fits_file_pool = FITSFilePool()
+"""
+The `FITSFilePool` used by `AstropyFITSLoader`.
+"""
+
+
+class RemoteFITSFilePool(FITSFilePool):
+    """
+    A process-wide pool of open remote FITS files.
+
+    Files are opened with `fsspec`, which reuses connections to the same
+    server, and read in blocks of ``dkist.io.conf.remote_block_size`` bytes
+    with a cache of the ``dkist.io.conf.remote_cache_blocks`` most recently
+    read blocks of each file. Files are identified by their URL only, so files
+    which change on the server while they are open are not detected.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        The maximum number of files to keep open. Defaults to
+        ``dkist.io.conf.max_open_files``, which is read every time a file is
+        added to the pool.
+    """
+
+    @staticmethod
+    def _key(url):
+        return (str(url),)
+
+    @staticmethod
+    def _open(url):
+        try:
+            import fsspec  # noqa: PLC0415
+        except ImportError as e:
+            raise ImportError("Reading FITS files from a URL requires fsspec, "
+                              "install it with: pip install 'dkist[remote]'") from e
+
+        fs, path = fsspec.core.url_to_fs(url)
+        fileobj = fs.open(path,
+                          mode="rb",
+                          block_size=parse_bytes(str(conf.remote_block_size)),
+                          cache_type="blockcache",
+                          cache_options={"maxblocks": int(conf.remote_cache_blocks)})
+        try:
+            hdul = fits.open(fileobj, memmap=False, do_not_scale_image_data=True)
+        except Exception:
+            fileobj.close()
+            raise
+        return _PooledFile(hdul, fileobj)
+
+    @staticmethod
+    def _in_basepath(key, basepath):
+        return key[0].startswith(join_url(str(basepath), ""))
+
+
+remote_file_pool = RemoteFITSFilePool()
+"""
+The `RemoteFITSFilePool` used by `RemoteFITSLoader`.
+"""
+
+
+class TileCache:
+    """
+    A process-wide cache of decompressed tiles of tile compressed FITS images.
+
+    Reading part of a tile compressed image requires decompressing every tile
+    it overlaps, so this cache keeps recently decompressed tiles to be reused
+    by later reads. Tiles are evicted in least recently used order once their
+    total size exceeds ``maxsize`` bytes.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        The maximum number of bytes of tiles to keep. Defaults to
+        ``dkist.io.conf.tile_cache_size``, which is read every time a tile is
+        added to the cache.
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._tiles = LRUCache(self.maxsize, sizeof=lambda tile: tile.nbytes)
+
+    @property
+    def maxsize(self):
+        """
+        The maximum number of bytes of tiles which are kept.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return parse_bytes(str(conf.tile_cache_size))
+
+    def get(self, key):
+        """
+        Return the tile stored under ``key``, or `None`.
+        """
+        return self._tiles.get(key)
+
+    def put(self, key, tile):
+        """
+        Store a decompressed tile, which is made read only.
+
+        The key should start with the path of the file the tile is from.
+        """
+        tile.flags.writeable = False
+        self._tiles.resize(self.maxsize)
+        self._tiles.put(key, tile)
+
+    def invalidate(self, basepath=None):
+        """
+        Drop all tiles, or only those of files inside the ``basepath`` directory.
+        """
+        if basepath is None:
+            self._tiles.clear()
+            return
+        basepath = Path(basepath)
+        self._tiles.evict(lambda key: Path(key[0]).is_relative_to(basepath))
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses and the current and maximum size in bytes.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        return self._tiles.cache_info()
+
+
+tile_cache = TileCache()
+"""
+The `TileCache` used by `AstropyFITSLoader`.
+"""
+
+
+class FileCache:
+    """
+    A process-wide cache of the data of whole FITS files.
+
+    Every slice of a `~dkist.Dataset` generates a new dask graph, which reads
+    its files again even if another slice has just read them. When this
+    cache is enabled, the dask arrays of all datasets read whole files
+    through it, so files which have been read recently are not read again.
+    Files are evicted in least recently used order once their total size
+    exceeds ``maxsize`` bytes.
+
+    The cached arrays are made read only, so the arrays computed from them
+    may be read only.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        The maximum number of bytes of data to keep. Defaults to
+        ``dkist.io.conf.file_cache_size``, which is read every time a file is
+        added to the cache. The cache is disabled if this is zero.
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._files = LRUCache(self.maxsize, sizeof=lambda data: data.nbytes)
+
+    @property
+    def maxsize(self):
+        """
+        The maximum number of bytes of data which are kept.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return parse_bytes(str(conf.file_cache_size))
+
+    @staticmethod
+    def key(loader):
+        """
+        The key of the data of ``loader`` in the cache, or `None` if it can not be cached.
+
+        The key starts with the path of the file, and includes its size and
+        modification time so that the data of a file which has changed is
+        not used.
+        """
+        dtype = loader.output_dtype if loader.output_dtype is not None else np.dtype(loader.dtype)
+        if is_url(loader.basepath):
+            return (str(loader.absolute_uri), None, None, loader.target, dtype.str)
+        byte_range = loader.byte_range()
+        if byte_range is None:
+            return None
+        path, offset, _ = byte_range
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return None
+        return (str(path), offset, (stat.st_size, stat.st_mtime_ns), loader.target, dtype.str)
+
+    def read(self, loader, item, read=None):
+        """
+        Return ``loader[item]``, reading the whole file into the cache if it is not already there.
+
+        Parameters
+        ----------
+        loader : `BaseFITSLoader`
+            The loader of the file.
+        item : `tuple`
+            The index into the data of the file.
+        read : callable, optional
+            The function called as ``read(loader, item)`` to read data,
+            defaulting to indexing the loader.
+        """
+        read = read or (lambda loader, item: loader[item])
+        maxsize = self.maxsize
+        key = self.key(loader) if maxsize > 0 else None
+        if key is None:
+            return read(loader, item)
+        data = self._files.get(key)
+        if data is None:
+            data = read(loader, (slice(None),) * len(loader.shape))
+            if _is_missing(data):
+                # The data of a missing file, which is not cached so it is read once the file exists
+                return data[item]
+            if data.flags.writeable:
+                data = data.view()
+                data.flags.writeable = False
+            self._files.resize(maxsize)
+            self._files.put(key, data)
+        return data[item]
+
+    def invalidate(self, basepath=None):
+        """
+        Drop all files, or only those inside ``basepath``.
+        """
+        if basepath is None:
+            self._files.clear()
+            return
+        if is_url(basepath):
+            self._files.evict(lambda key: key[0].startswith(str(basepath).rstrip("/") + "/"))
+            return
+        basepath = Path(basepath)
+        self._files.evict(lambda key: not is_url(key[0]) and Path(key[0]).is_relative_to(basepath))
+
+    def clear(self):
+        """
+        Drop all files and reset the statistics.
+        """
+        self._files.clear()
+
+    def resize(self, maxsize):
+        """
+        Change the maximum number of bytes kept, evicting files if it has shrunk.
+
+        Passing `None` uses ``dkist.io.conf.file_cache_size`` again.
+        """
+        self._maxsize = maxsize
+        self._files.resize(self.maxsize)
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses and the current and maximum size in bytes.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        self._files.resize(self.maxsize)
+        return self._files.cache_info()
+
+
+file_cache = FileCache()
+"""
+The `FileCache` used by the dask arrays of datasets.
+"""
+
+
+def _tile_ranges(index, shape, tile_shape):
+    """
+    For a basic index into an image, work out which tiles it overlaps.
+
+    Returns, for each dimension, the range of tiles the index overlaps, the
+    first pixel of the first of those tiles and the index relative to that
+    pixel; or `None` if the index selects no data.
+    """
+    tiles, starts, relative_index = [], [], []
+    for idx, size, tile_size in zip(index, shape, tile_shape):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(size)
+            pixels = range(start, stop, step)
+            if not pixels:
+                return None
+            first, last = min(pixels) // tile_size, max(pixels) // tile_size
+            offset = first * tile_size
+            # A negative step which includes the first pixel stops before it
+            rel_stop = stop - offset
+            relative_index.append(slice(start - offset, rel_stop if rel_stop >= 0 else None, step))
+        else:
+            if not -size <= idx < size:
+                raise IndexError(f"index {idx} is out of bounds for axis with size {size}")
+            first = last = (idx % size) // tile_size
+            offset = first * tile_size
+            relative_index.append(idx % size - offset)
+        tiles.append(range(first, last + 1))
+        starts.append(offset)
+    return tiles, starts, tuple(relative_index)
+
+
+def _selects_all(index, shape):
+    """
+    Whether a basic index into an array of ``shape`` selects all of it.
+    """
+    index = index if isinstance(index, tuple) else (index,)
+    return len(index) <= len(shape) and all(isinstance(idx, slice) and idx.indices(size) == (0, size, 1)
+                                            for idx, size in zip(index, shape))
+
+
+fits_loaders = {}
+"""
+The registered `BaseFITSLoader` classes, by name.
+"""
+
+
+def _as_output_dtype(value):
+    """
+    Convert ``value`` to the dtype loaders convert data to, or `None`.
+
+    Only floating point and complex dtypes can represent the NaN which
+    missing files are filled with, so other dtypes raise a `ValueError`.
+    """
+    if value is None:
+        return None
+    dtype = np.dtype(value)
+    if dtype.kind not in "fc":
+        raise ValueError(f"The output dtype must be a floating point or complex dtype, not {dtype}.")
+    return dtype
+
+
+def _is_missing(data):
+    """
+    Whether ``data`` is all NaN, as the data which loaders return for missing files is.
+
+    Only the first element is checked unless it is NaN, so this is cheap for
+    almost all the data of files which exist.
+    """
+    return (data.size > 0 and data.dtype.kind in "fc" and bool(np.isnan(data.flat[0]))
+            and bool(np.isnan(data).all()))
+
+
+def register_fits_loader(name):
+    """
+    A class decorator which registers a `BaseFITSLoader` subclass under ``name``.
+
+    Registered loaders can be selected with ``dkist.io.conf.preferred_fits_library``,
+    the ``loader`` argument to `dkist.load_dataset` or by setting
+    `dkist.io.DKISTFileManager.loader`.
+    """
+    def decorator(cls):
+        fits_loaders[name] = cls
+        return cls
+    return decorator
+
+
+def get_fits_loader(loader=None):
+    """
+    Return the `BaseFITSLoader` class for ``loader``.
+
+    Parameters
+    ----------
+    loader : `str` or `type`, optional
+        The name a loader is registered with, or a `BaseFITSLoader` subclass
+        which is returned unchanged. Defaults to
+        ``dkist.io.conf.preferred_fits_library``.
+    """
+    if loader is None:
+        loader = conf.preferred_fits_library
+    if isinstance(loader, type) and issubclass(loader, BaseFITSLoader):
+        return loader
+    if loader not in fits_loaders:
+        raise ValueError(f"Unknown FITS loader {loader!r}, it must be one of {', '.join(fits_loaders)}.")
+    return fits_loaders[loader]
 
 
 common_parameters = """
@@ -29,9 +561,12 @@ dtype: `numpy.dtype`
     The dtype of the resulting array
 target: `int`
     The HDU number to load the array from.
-array_container: `BaseStripedExternalArray`
-    The parent object of this class, which builds the array from a sequence
-    of these loaders.
+basepath: `pathlib.Path`
+    The directory relative file names are resolved in.
+output_dtype: `numpy.dtype`, optional
+    The floating point or complex dtype to convert the data to when it is
+    read. If not specified the data are returned as they are stored in the
+    file.
 """
 
 
@@ -45,12 +580,13 @@ class BaseFITSLoader(metaclass=abc.ABCMeta):
     time.
     """
 
-    def __init__(self, fileuri, shape, dtype, target, basepath):
+    def __init__(self, fileuri, shape, dtype, target, basepath, *, output_dtype=None):
         self.fileuri = fileuri
         self.shape = shape
         self.dtype = dtype
         self.target = target
         self.basepath = basepath
+        self.output_dtype = _as_output_dtype(output_dtype)
         self.ndim = len(self.shape)
         self.size = np.prod(self.shape)
 
@@ -68,17 +604,69 @@ class BaseFITSLoader(metaclass=abc.ABCMeta):
     def __getitem__(self, slc):
         pass
 
+    def _missing_data(self, slc):
+        """
+        The NaN array returned for the slice ``slc`` when the file does not exist.
+        """
+        shape = np.broadcast_to(np.empty((), dtype=bool), self.shape)[slc].shape
+        dtype = self.output_dtype if self.output_dtype is not None else np.dtype(float)
+        return np.full(shape, np.nan, dtype=dtype)
+
+    def _convert(self, data):
+        """
+        Convert data read from the file to ``output_dtype``.
+
+        Arrays which own their memory and only need their byte order changing
+        are byte swapped in place, rather than copied.
+        """
+        if self.output_dtype is None or data.dtype == self.output_dtype:
+            return data
+        if (data.flags.owndata and data.flags.writeable
+                and data.dtype.newbyteorder() == self.output_dtype):
+            return data.byteswap(inplace=True).view(self.output_dtype)
+        return data.astype(self.output_dtype)
+
     @property
     def absolute_uri(self):
         """
         Construct a non-relative path to the file, using ``basepath`` if provided.
+
+        If ``basepath`` is a URL, this is the URL of the file.
         """
+        if is_url(self.basepath):
+            return join_url(self.basepath, self.fileuri)
         if self.basepath:
             return self.basepath / self.fileuri
 
         return Path(self.fileuri)
 
+    def byte_range(self):
+        """
+        The path, offset and length of the bytes this loader reads from a local file.
+
+        Returns `None` if the file is not a local file, or does not exist.
+        """
+        if is_url(self.basepath):
+            return None
+        try:
+            return self.absolute_uri, 0, self.absolute_uri.stat().st_size
+        except OSError:
+            return None
+
+    def prefetch_range(self, item=None):
+        """
+        The path, offset and length of the bytes needed to read ``item`` of the data from a local file.
+
+        Only the bytes needed by reads of the whole array are known, so this
+        is `None` if ``item`` selects part of the array, as well as if the
+        file is not a local file or does not exist.
+        """
+        if item is not None and not _selects_all(item, self.shape):
+            return None
+        return self.byte_range()
+
 
+@register_fits_loader("astropy")
 @add_common_docstring(append=common_parameters)
 class AstropyFITSLoader(BaseFITSLoader):
     """
@@ -86,17 +674,316 @@ class AstropyFITSLoader(BaseFITSLoader):
     """
 
     def __getitem__(self, slc):
-        if not self.absolute_uri.exists():
-            log.debug("File %s does not exist.", self.absolute_uri)
-            # Use np.broadcast_to to generate an array of the correct size, but
-            # which only uses memory for one value.
-            return np.broadcast_to((np.nan,), self.shape) * np.nan
-
-        with fits.open(self.absolute_uri,
-                       memmap=False,  # memmap is redundant with dask and delayed loading
-                       do_not_scale_image_data=True,  # don't scale as we shouldn't need to
-                       mode="denywrite") as hdul:
+        with contextlib.ExitStack() as stack:
+            # Opening the file checks it exists, so there is no need to check first
+            try:
+                hdul = stack.enter_context(fits_file_pool.open(self.absolute_uri))
+            except FileNotFoundError:
+                log.debug("File %s does not exist.", self.absolute_uri)
+                return self._missing_data(slc)
+
             log.debug("Accessing slice %s from file %s", slc, self.absolute_uri)
 
             hdu = hdul[self.target]
-            return hdu.section[slc]
+            if isinstance(hdu, fits.CompImageHDU):
+                stat = self.absolute_uri.stat()
+                file_key = (str(self.absolute_uri), stat.st_mtime_ns, stat.st_size, self.target)
+                return self._convert(self._read_tiles(hdu, slc, file_key))
+            return self._convert(hdu.section[slc])
+
+    def _read_tiles(self, hdu, slc, file_key):
+        """
+        Read a slice of a tile compressed image, decompressing only the tiles
+        it overlaps which are not in `tile_cache`.
+
+        ``file_key`` identifies the file and HDU in the keys of the cache, and
+        must start with the path of the file.
+        """
+        shape, tile_shape = hdu.shape, hdu.tile_shape
+        slc = slc if isinstance(slc, tuple) else (slc,)
+        if len(slc) > len(shape) or not all(isinstance(i, (slice, Integral)) for i in slc):
+            # Anything other than basic indexing is applied to the whole image
+            return self._read_tiles(hdu, (), file_key)[slc]
+        slc = slc + (slice(None),) * (len(shape) - len(slc))
+
+        ranges = _tile_ranges(slc, shape, tile_shape)
+        if ranges is None:
+            return np.empty(shape, dtype=hdu.section.dtype)[slc]
+        tiles, starts, relative_index = ranges
+
+        data = None
+        for tile_index in itertools.product(*tiles):
+            tile_slice = tuple(slice(i * size, min((i + 1) * size, n))
+                               for i, size, n in zip(tile_index, tile_shape, shape))
+            key = (*file_key, tile_index)
+            tile = tile_cache.get(key)
+            if tile is None:
+                tile = hdu.section[tile_slice]
+                tile_cache.put(key, tile)
+            if data is None:
+                data_shape = tuple(min((t[-1] + 1) * size, n) - start
+                                   for t, size, n, start in zip(tiles, tile_shape, shape, starts))
+                data = np.empty(data_shape, dtype=tile.dtype)
+            data[tuple(slice(s.start - start, s.stop - start) for s, start in zip(tile_slice, starts))] = tile
+        return data[relative_index]
+
+
+@register_fits_loader("raw")
+@add_common_docstring(append=common_parameters)
+class RawFITSLoader(AstropyFITSLoader):
+    """
+    Read uncompressed FITS image data directly from disk, without parsing the headers.
+
+    The location of the data in each file is looked up in the
+    `~dkist.io.dask.offsets.DataOffsetIndex` for ``basepath``, which is saved
+    next to the ASDF file by `dkist.io.DKISTFileManager.build_offset_index`.
+    Files which are not in the index have their headers read once, and files
+    which can not be read directly (for example tile compressed data) are read
+    with `astropy.io.fits`.
+    """
+
+    @property
+    def _offset_index(self):
+        return DataOffsetIndex.for_basepath(self.basepath)
+
+    def _open_raw(self):
+        """
+        Open the file containing the data for unbuffered reading.
+        """
+        return open(self.absolute_uri, mode="rb", buffering=0)
+
+    def _read_hdu(self, slc):
+        """
+        Read data which can not be read directly by parsing the headers.
+        """
+        return super().__getitem__(slc)
+
+    def __getitem__(self, slc):
+        index = self._offset_index
+        try:
+            fobj = self._open_raw()
+        except FileNotFoundError:
+            log.debug("File %s does not exist.", self.absolute_uri)
+            return self._missing_data(slc)
+
+        with fobj:
+            location = index.get(self.fileuri, self.target)
+            stat = os.fstat(fobj.fileno())
+            if location is not None and location[3:] != (stat.st_size, stat.st_mtime_ns):
+                # The file has changed since it was indexed
+                location = index.scan(self.fileuri, self.target)
+            if location is None:
+                return self._read_hdu(slc)
+
+            log.debug("Reading slice %s from file %s at offset %s", slc, self.absolute_uri, location.offset)
+            return self._read(fobj, location, slc)
+
+    def prefetch_range(self, item=None):
+        """
+        The path, offset and length of the bytes needed to read ``item`` of the data from a local file.
+
+        If the location of the data in the file is in the offset index, this
+        is the rows of the data selected by the first element of ``item``.
+        """
+        location = self._offset_index.lookup(self.fileuri, self.target)
+        if location is None or item is None:
+            return super().prefetch_range(item)
+        byte_range = self.byte_range()
+        if byte_range is None:
+            return None
+        nrows = location.shape[0]
+        first = item[0] if item else slice(None)
+        if isinstance(first, slice) and first.step in (None, 1):
+            start, stop, _ = first.indices(nrows)
+            stop = max(start, stop)
+        elif isinstance(first, Integral) and -nrows <= first < nrows:
+            start = first % nrows
+            stop = start + 1
+        else:
+            start, stop = 0, nrows
+        row_size = np.dtype(location.dtype).itemsize * int(np.prod(location.shape[1:]))
+        return byte_range[0], location.offset + start * row_size, (stop - start) * row_size
+
+    def _read(self, fobj, location, slc):
+        """
+        Read the rows of the array selected by the first element of ``slc``
+        straight into a new array, and apply the rest of the slice in memory.
+        """
+        dtype = np.dtype(location.dtype)
+        shape = location.shape
+        slc = slc if isinstance(slc, tuple) else (slc,)
+        first, rest = (slc[0], slc[1:]) if slc else (slice(None), ())
+        if isinstance(first, slice) and first.step in (None, 1):
+            start, stop, _ = first.indices(shape[0])
+            stop = max(start, stop)
+            rest = (slice(None), *rest)
+        elif isinstance(first, (int, np.integer)):
+            if not -shape[0] <= first < shape[0]:
+                raise IndexError(f"index {first} is out of bounds for axis 0 with size {shape[0]}")
+            start = first % shape[0]
+            stop = start + 1
+            rest = (0, *rest)
+        else:
+            start, stop = 0, shape[0]
+            rest = slc
+
+        row_size = dtype.itemsize * int(np.prod(shape[1:]))
+        out = np.empty((stop - start, *shape[1:]), dtype=dtype)
+        if out.size:
+            fobj.seek(location.offset + start * row_size)
+            nbytes = fobj.readinto(memoryview(out).cast("B"))
+            if nbytes != out.nbytes:
+                raise OSError(f"Expected to read {out.nbytes} bytes from {fobj.name} but only read {nbytes}.")
+        return self._convert(out)[rest]
+
+
+@register_fits_loader("tar")
+@add_common_docstring(append=common_parameters)
+class TarFITSLoader(RawFITSLoader):
+    """
+    Read FITS files directly out of an uncompressed tar archive, without extracting it.
+
+    ``basepath`` is the path of the tar archive and ``fileuri`` the name of
+    the file in it. The offset of each file in the archive and of the data in
+    each file are looked up in the
+    `~dkist.io.dask.offsets.TarDataOffsetIndex` for the archive, which is
+    saved next to it by `dkist.io.DKISTFileManager.build_offset_index`. Data
+    which can not be read directly (for example tile compressed data) are read
+    from the archive with `astropy.io.fits`.
+    """
+
+    @property
+    def _offset_index(self):
+        return TarDataOffsetIndex.for_basepath(self.basepath)
+
+    def byte_range(self):
+        member = self._offset_index.member(self.fileuri)
+        if member is None:
+            return None
+        return self.basepath, *member
+
+    def _open_raw(self):
+        fobj = open(self.basepath, mode="rb", buffering=0)
+        if self._offset_index.member(self.fileuri) is None:
+            fobj.close()
+            raise FileNotFoundError(f"{self.fileuri} is not in the archive {self.basepath}")
+        return fobj
+
+    def _read_hdu(self, slc):
+        stat = Path(self.basepath).stat()
+        with (self._offset_index.open_member(self.fileuri) as fobj,
+              fits.open(fobj, memmap=False, do_not_scale_image_data=True) as hdul):
+            hdu = hdul[self.target]
+            if isinstance(hdu, fits.CompImageHDU):
+                file_key = (str(self.absolute_uri), stat.st_mtime_ns, stat.st_size, self.target)
+                return self._convert(self._read_tiles(hdu, slc, file_key))
+            return self._convert(hdu.section[slc])
+
+
+@register_fits_loader("remote")
+@add_common_docstring(append=common_parameters)
+class RemoteFITSLoader(AstropyFITSLoader):
+    """
+    Read FITS files from a remote server, such as over HTTP, with `fsspec`.
+
+    This requires the ``fsspec`` package, which is installed with the
+    ``remote`` extra of ``dkist``.
+
+    ``basepath`` is the URL of the directory containing the files, for
+    example ``https://example.com/data/ABCDE/``. Only the blocks of each file
+    containing its headers and the requested slice of data are downloaded,
+    using the open files in `remote_file_pool`.
+    """
+
+    def __getitem__(self, slc):
+        url = self.absolute_uri
+        try:
+            with remote_file_pool.open(url) as hdul:
+                log.debug("Accessing slice %s from file %s", slc, url)
+
+                hdu = hdul[self.target]
+                if isinstance(hdu, fits.CompImageHDU):
+                    return self._convert(self._read_tiles(hdu, slc, (str(url), self.target)))
+                return self._convert(hdu.section[slc])
+        except FileNotFoundError:
+            log.debug("File %s does not exist.", url)
+            return self._missing_data(slc)
+
+
+@register_fits_loader("fitsio")
+@add_common_docstring(append=common_parameters)
+class FitsioFITSLoader(BaseFITSLoader):
+    """
+    Read FITS files with `fitsio <https://github.com/esheldon/fitsio>`__.
+
+    This requires the ``fitsio`` package to be installed. ``fitsio`` reads
+    both uncompressed and tile compressed images with ``cfitsio``, only
+    decompressing the tiles needed. The ``BSCALE`` and ``BZERO`` scaling
+    ``fitsio`` applies is undone, so the data is the same as that read by the
+    other loaders.
+    """
+
+    def __getitem__(self, slc):
+        if is_url(self.basepath):
+            raise ValueError(f"The fitsio loader can not read {self.absolute_uri}, "
+                             "use the 'remote' loader to read files from a URL.")
+        import fitsio  # noqa: PLC0415
+
+        if not self.absolute_uri.exists():
+            log.debug("File %s does not exist.", self.absolute_uri)
+            return self._missing_data(slc)
+
+        slc = slc if isinstance(slc, tuple) else (slc,)
+        if len(slc) > len(self.shape) or not all(isinstance(i, (slice, Integral)) for i in slc):
+            # Anything other than basic indexing is applied to the whole array
+            return self[()][slc]
+        slc = slc + (slice(None),) * (len(self.shape) - len(slc))
+
+        # Read the smallest box containing the slice, and apply the slice to that
+        box, relative_index = [], []
+        for idx, size in zip(slc, self.shape):
+            if isinstance(idx, slice):
+                start, stop, step = idx.indices(size)
+                pixels = range(start, stop, step)
+                if not pixels:
+                    return self._convert(np.empty(self.shape, dtype=self.dtype)[slc])
+                first = min(pixels)
+                box.append(slice(first, max(pixels) + 1))
+                rel_stop = stop - first
+                relative_index.append(slice(start - first, rel_stop if rel_stop >= 0 else None, step))
+            else:
+                if not -size <= idx < size:
+                    raise IndexError(f"index {idx} is out of bounds for axis with size {size}")
+                box.append(slice(idx % size, idx % size + 1))
+                relative_index.append(0)
+
+        log.debug("Reading slice %s from file %s with fitsio", slc, self.absolute_uri)
+        with fitsio.FITS(str(self.absolute_uri)) as fits_file:
+            hdu = fits_file[self.target]
+            data = _unscale(np.asarray(hdu[tuple(box)]), hdu.read_header())
+        return self._convert(data.reshape([s.stop - s.start for s in box])[tuple(relative_index)])
+
+
+def _unscale(data, header):
+    """
+    Undo the ``BSCALE`` and ``BZERO`` scaling of data read by ``fitsio``.
+
+    The data is returned as it is stored in the file, with the big endian
+    dtype given by ``BITPIX``, as it is read by `AstropyFITSLoader`.
+    """
+    bscale, bzero = header.get("BSCALE", 1), header.get("BZERO", 0)
+    # The header of a tile compressed image describes the compressed table
+    stored_dtype = np.dtype(BITPIX2DTYPE[header.get("ZBITPIX", header["BITPIX"])]).newbyteorder(">")
+    nbits = 8 * stored_dtype.itemsize
+    if bscale == 1 and bzero == 0:
+        return data.astype(stored_dtype, copy=False)
+    if (bscale == 1 and abs(bzero) == 2 ** (nbits - 1)
+            and data.dtype.kind in "iu" and data.dtype.itemsize == stored_dtype.itemsize):
+        # Integers with the other signedness are stored by flipping the sign bit
+        unsigned = data.view(f"u{stored_dtype.itemsize}")
+        flipped = unsigned ^ np.array(1 << (nbits - 1), dtype=unsigned.dtype)
+        return flipped.view(stored_dtype.newbyteorder("=")).astype(stored_dtype)
+    stored = (data - bzero) / bscale
+    if stored_dtype.kind in "iu":
+        stored = np.rint(stored)
+    return stored.astype(stored_dtype)
@@ -0,0 +1,358 @@
+"""
+An index of where the data for each FITS file is stored on disk.
+
+Uncompressed FITS image data are stored as a contiguous, big-endian block of
+bytes after the headers. Once the location of that block has been found, it
+can be read without parsing any of the headers again. The
+`DataOffsetIndex` records these locations, and can persist them in a sidecar
+file next to the ASDF file so they only ever need to be found once.
+
+FITS files stored in an uncompressed tar archive are also contiguous blocks of
+bytes in the archive, so the `TarDataOffsetIndex` records the location of the
+data from the start of the archive, allowing it to be read in the same way
+without extracting the archive.
+"""
+import os
+import json
+import tarfile
+import posixpath
+import threading
+import contextlib
+from pathlib import Path
+from collections import namedtuple
+
+from astropy.io import fits
+
+from dkist import log
+
+__all__ = ["DataLocation", "DataOffsetIndex", "TarDataOffsetIndex"]
+
+
+DataLocation = namedtuple("DataLocation", ["offset", "dtype", "shape", "size", "mtime_ns"])
+DataLocation.__doc__ = """
+The location of the data array of one HDU inside a FITS file.
+
+``offset``, ``dtype`` and ``shape`` describe the bytes on disk, ``size`` and
+``mtime_ns`` are those of the file when it was scanned, and are used to detect
+if the file has changed since.
+"""
+
+BITPIX_DTYPES = {
+    8: "u1",
+    16: ">i2",
+    32: ">i4",
+    64: ">i8",
+    -32: ">f4",
+    -64: ">f8",
+}
+
+
+def scan_data_location(path, target):
+    """
+    Find the location of the data for HDU ``target`` in the FITS file at ``path``.
+
+    Returns `None` if the HDU's data can not be read directly from disk, for
+    instance if it is tile compressed.
+    """
+    stat = Path(path).stat()
+    with fits.open(path, memmap=False, do_not_scale_image_data=True, mode="denywrite") as hdul:
+        return _hdu_data_location(hdul, target, stat, path)
+
+
+def _hdu_data_location(hdul, target, stat, name, offset=0):
+    """
+    The `DataLocation` of HDU ``target`` in ``hdul``, starting ``offset`` bytes into a file described by ``stat``.
+    """
+    hdu = hdul[target]
+    # CompImageHDU is a subclass of ImageHDU in newer versions of astropy
+    if not isinstance(hdu, (fits.PrimaryHDU, fits.ImageHDU)) or isinstance(hdu, fits.CompImageHDU):
+        log.debug("HDU %s of %s is a %s which can not be read directly.", target, name, type(hdu).__name__)
+        return None
+    header = hdu.header
+    shape = tuple(header[f"NAXIS{i}"] for i in range(header["NAXIS"], 0, -1))
+    return DataLocation(
+        offset + hdu.fileinfo()["datLoc"],
+        BITPIX_DTYPES[header["BITPIX"]],
+        shape,
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+
+
+class DataOffsetIndex:
+    """
+    The locations of the data in a directory of FITS files.
+
+    Parameters
+    ----------
+    basepath : `pathlib.Path`, optional
+        The directory containing the FITS files, and where the index file is
+        saved. If `None` the index only exists in memory.
+    """
+    filename = "dkist_data_offsets.json"
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, basepath=None):
+        self.basepath = Path(basepath) if basepath is not None else None
+        self._lock = threading.Lock()
+        self._locations = {}
+        self._dirty = False
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    @classmethod
+    def for_basepath(cls, basepath):
+        """
+        Return the process-wide index for ``basepath``, loading it from disk the first time.
+        """
+        key = (cls, str(basepath) if basepath is not None else None)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(basepath)
+            return cls._instances[key]
+
+    @property
+    def path(self):
+        """
+        The path of the sidecar file this index is saved to.
+        """
+        if self.basepath is None:
+            return None
+        return self.basepath / self.filename
+
+    def __len__(self):
+        return len(self._locations)
+
+    def _resolve(self, fileuri):
+        if self.basepath is None:
+            return Path(fileuri)
+        return self.basepath / fileuri
+
+    def _stat(self, fileuri):
+        """
+        The `os.stat_result` recorded with the location of a file, or `None` if it does not exist.
+        """
+        try:
+            return self._resolve(fileuri).stat()
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        try:
+            with open(self.path) as fobj:
+                contents = json.load(fobj)
+        except (OSError, ValueError) as e:
+            log.warning("Could not read the data offset index %s: %s", self.path, e)
+            return
+        self._from_json(contents)
+
+    def _from_json(self, contents):
+        for (fileuri, target), location in contents["locations"]:
+            self._locations[(fileuri, target)] = DataLocation(
+                location["offset"],
+                location["dtype"],
+                tuple(location["shape"]),
+                location["size"],
+                location["mtime_ns"],
+            )
+
+    def save(self):
+        """
+        Write the index to its sidecar file, if it has changed.
+        """
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            contents = self._to_json()
+            self._dirty = False
+        # Write to a temporary file first so that a concurrent reader never sees a partial index.
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as fobj:
+            json.dump(contents, fobj)
+        tmp_path.replace(self.path)
+        log.debug("Saved %s data offsets to %s", len(contents["locations"]), self.path)
+
+    def _to_json(self):
+        return {
+            "locations": [
+                [list(key), {**location._asdict(), "shape": list(location.shape)}]
+                for key, location in self._locations.items()
+                # Files which can't be read directly are rescanned next time
+                if location is not None
+            ]
+        }
+
+    def __contains__(self, key):
+        fileuri, target = key
+        return (str(fileuri), target) in self._locations
+
+    def lookup(self, fileuri, target):
+        """
+        Return the recorded `DataLocation` for a file.
+
+        Returns `None` if the file has not been scanned, or if its data can
+        not be read directly.
+        """
+        return self._locations.get((str(fileuri), target))
+
+    def get(self, fileuri, target):
+        """
+        Return the `DataLocation` for a file, scanning it if it has not been scanned already.
+        """
+        if (fileuri, target) in self:
+            return self.lookup(fileuri, target)
+        return self.scan(fileuri, target)
+
+    def scan(self, fileuri, target):
+        """
+        Read the headers of a file to find the location of its data, and record it.
+        """
+        location = scan_data_location(self._resolve(fileuri), target)
+        with self._lock:
+            self._locations[(str(fileuri), target)] = location
+            self._dirty = True
+        return location
+
+    def build(self, fileuris, target, *, save=True):
+        """
+        Scan all the given files which are present and not already indexed.
+
+        Parameters
+        ----------
+        fileuris : iterable of `str`
+            The files to index, relative to ``basepath``.
+        target : `int`
+            The HDU to index in each file.
+        save : `bool`, optional
+            If `True` write the index to disk afterwards.
+        """
+        for fileuri in fileuris:
+            stat = self._stat(fileuri)
+            if stat is None:
+                continue
+            location = self.lookup(fileuri, target)
+            if location is not None and location[3:] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            self.scan(fileuri, target)
+        if save:
+            self.save()
+
+
+class TarDataOffsetIndex(DataOffsetIndex):
+    """
+    The locations of the data of FITS files stored in an uncompressed tar archive.
+
+    The headers of the archive are read once to find where each file is
+    stored in it, and the offsets of the data are recorded from the start of
+    the archive, so they can be read without extracting the files. Files are
+    looked up by their name in the archive, or by their name without any
+    directories if that is unique.
+
+    Parameters
+    ----------
+    basepath : `pathlib.Path`
+        The path of the tar archive. The index is saved in a sidecar file next
+        to it.
+    """
+
+    def __init__(self, basepath):
+        # The archive's (size, mtime_ns) and {name: (offset, size)} of its files
+        self._archive_stat = None
+        self._members = {}
+        self._basenames = {}
+        super().__init__(basepath)
+
+    @property
+    def path(self):
+        """
+        The path of the sidecar file this index is saved to.
+        """
+        return self.basepath.with_name(f"{self.basepath.name}.{self.filename}")
+
+    def _resolve(self, fileuri):
+        return self.basepath / fileuri
+
+    def _stat(self, fileuri):
+        if self.member(fileuri) is None:
+            return None
+        return self.basepath.stat()
+
+    def _to_json(self):
+        return {
+            **super()._to_json(),
+            "archive": {
+                "size": self._archive_stat[0],
+                "mtime_ns": self._archive_stat[1],
+                "members": self._members,
+            } if self._archive_stat is not None else None,
+        }
+
+    def _from_json(self, contents):
+        super()._from_json(contents)
+        if archive := contents.get("archive"):
+            self._set_members((archive["size"], archive["mtime_ns"]),
+                              {name: tuple(member) for name, member in archive["members"].items()})
+
+    def _set_members(self, archive_stat, members):
+        self._archive_stat = archive_stat
+        self._members = members
+        basenames = {}
+        for name in members:
+            basenames.setdefault(posixpath.basename(name), []).append(name)
+        self._basenames = {basename: names[0] for basename, names in basenames.items() if len(names) == 1}
+
+    def scan_members(self):
+        """
+        Read the headers of the archive to find the offset and size of each file in it.
+        """
+        stat = self.basepath.stat()
+        try:
+            with tarfile.open(self.basepath, mode="r:") as tar:
+                members = {info.name: (info.offset_data, info.size) for info in tar if info.isreg() and not info.issparse()}
+        except tarfile.ReadError as e:
+            raise ValueError(f"{self.basepath} is not an uncompressed tar archive: {e}") from e
+        log.debug("Found %s files in %s", len(members), self.basepath)
+        with self._lock:
+            self._set_members((stat.st_size, stat.st_mtime_ns), members)
+            self._dirty = True
+
+    def member(self, fileuri):
+        """
+        The ``(offset, size)`` of a file in the archive, or `None` if it is not in the archive.
+
+        The archive is scanned again if it has changed since it was last scanned.
+        """
+        try:
+            stat = self.basepath.stat()
+        except FileNotFoundError:
+            return None
+        if self._archive_stat != (stat.st_size, stat.st_mtime_ns):
+            self.scan_members()
+        fileuri = str(fileuri)
+        return self._members.get(fileuri) or self._members.get(self._basenames.get(fileuri))
+
+    @contextlib.contextmanager
+    def open_member(self, fileuri):
+        """
+        Open a file in the archive, without extracting it.
+        """
+        member = self.member(fileuri)
+        if member is None:
+            raise FileNotFoundError(f"{fileuri} is not in the archive {self.basepath}")
+        info = tarfile.TarInfo(str(fileuri))
+        info.offset_data, info.size = member
+        with tarfile.open(self.basepath, mode="r:") as tar, tar.extractfile(info) as fobj:
+            yield fobj
+
+    def scan(self, fileuri, target):
+        """
+        Read the headers of a file in the archive to find the location of its data, and record it.
+        """
+        stat = self.basepath.stat()
+        with self.open_member(fileuri) as fobj, fits.open(fobj, memmap=False, do_not_scale_image_data=True) as hdul:
+            location = _hdu_data_location(hdul, target, stat, self._resolve(fileuri), self.member(fileuri)[0])
+        with self._lock:
+            self._locations[(str(fileuri), target)] = location
+            self._dirty = True
+        return location
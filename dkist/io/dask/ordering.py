@@ -0,0 +1,140 @@
+"""
+Read the files of a dataset in the order they are laid out on disk.
+
+Dask runs the tasks which read files in an order chosen from the structure of
+the task graph, which is the order of the files in the dataset rather than
+the order of their data on disk. On spinning disks and network file systems
+this makes a scan of a whole dataset jump around the disk.
+
+When ``dkist.io.conf.io_order`` is set the tasks which read files are
+annotated with a ``priority`` which the distributed scheduler uses to run
+them in the order given by `dkist.io.utils.physical_order`. Dask's local
+schedulers ignore these annotations, so computing inside the `IOOrder`
+context manager starts the tasks in that order instead.
+"""
+from numbers import Integral
+
+from dask.callbacks import Callback
+
+from dkist.io.utils import physical_order
+
+try:
+    from dask._task_spec import DataNode, Task
+except ImportError:  # dask < 2025.1.0
+    DataNode = Task = None
+
+__all__ = ["IOOrder"]
+
+
+class IOOrder(Callback):
+    """
+    Start the tasks which read files in the order the files are laid out on disk.
+
+    This is a dask callback for the local (threaded, multiprocessing or
+    synchronous) schedulers, which is used as a context manager or passed to
+    ``compute(callbacks=...)``. The tasks which read files do not depend on
+    any other tasks, so they are all ready when the computation starts. This
+    sorts them so they are started in physical order, while the tasks which
+    use their results still run as soon as they are ready, keeping the memory
+    used by the computation the same as usual.
+
+    Examples
+    --------
+    >>> from dkist.io.dask import IOOrder
+    >>> with IOOrder():  # doctest: +SKIP
+    ...     total = ds.data.sum().compute()
+    """
+
+    def _start_state(self, dsk, state):
+        ready = state["ready"]
+        chunks = {key: _loader_chunk(dsk[key]) for key in ready}
+        loader_keys = [key for key in ready if chunks[key] is not None]
+        if not loader_keys:
+            return
+        ranks = _chunk_ranks([chunks[key] for key in loader_keys])
+        # The scheduler starts the task at the end of the list first
+        position = {key: i for i, key in enumerate(loader_keys)}
+        loader_keys.sort(key=lambda key: (ranks[position[key]], position[key]), reverse=True)
+        ready[:] = [*loader_keys, *(key for key in ready if chunks[key] is None)]
+
+
+class _IOPriority:
+    """
+    The ``priority`` annotation of the keys of a `~dkist.io.dask.utils.StripedLoaderLayer`.
+
+    Parameters
+    ----------
+    name : `str`
+        The name of the layer.
+    block_ranks : `numpy.ndarray`
+        The position in physical order of the first file of each block of
+        the layer, along the dimensions of the file grid.
+    """
+    __slots__ = ["block_ranks", "name"]
+
+    def __init__(self, name, block_ranks):
+        self.name = name
+        self.block_ranks = block_ranks
+
+    def __call__(self, key):
+        if not isinstance(key, tuple) or key[0] != self.name:
+            return 0
+        index = key[1:1 + self.block_ranks.ndim]
+        if not all(isinstance(i, Integral) for i in index):
+            return 0
+        # Tasks with a higher priority run first
+        return -int(self.block_ranks[index])
+
+
+def _loader_chunk(task):
+    """
+    Find the `~dkist.io.dask.utils.LoaderChunk` read by a task, or return `None`.
+    """
+    from dkist.io.dask.utils import LoaderChunk  # noqa: PLC0415
+
+    if isinstance(task, LoaderChunk):
+        return task
+    if DataNode is not None and isinstance(task, DataNode):
+        return _loader_chunk(task.value)
+    if Task is not None and isinstance(task, Task):
+        args = (*task.args, *task.kwargs.values())
+    elif isinstance(task, dict):
+        # Tasks fused by dask run a subgraph of the original tasks
+        args = task.values()
+    elif isinstance(task, (tuple, list)):
+        args = task[1:] if task and callable(task[0]) else task
+    else:
+        return None
+    for arg in args:
+        chunk = _loader_chunk(arg)
+        if chunk is not None:
+            return chunk
+    return None
+
+
+def _chunk_ranks(chunks):
+    """
+    Return a sortable position in physical order for each `~dkist.io.dask.utils.LoaderChunk`.
+
+    The files of each dataset are ranked together, with one listing of each
+    directory, and the datasets are read one after the other.
+    """
+    groups = {}
+    for chunk in chunks:
+        key = (id(chunk.loaders.spec), str(chunk.loaders.spec.basepath))
+        # A dict rather than a set, so files which can not be found keep the order of the tasks
+        groups.setdefault(key, (chunk.loaders.spec.basepath, {}))[1].update(
+            dict.fromkeys(chunk.loaders.fileuri_array.flat))
+
+    file_ranks = {}
+    for group, (key, (basepath, fileuris)) in enumerate(groups.items()):
+        fileuris = list(fileuris)
+        ranks = physical_order(fileuris, basepath)
+        file_ranks[key] = {fileuri: (group, int(rank)) for fileuri, rank in zip(fileuris, ranks)}
+
+    ranks = []
+    for chunk in chunks:
+        spec = chunk.loaders.spec
+        chunk_ranks = file_ranks[(id(spec), str(spec.basepath))]
+        ranks.append(min(chunk_ranks[fileuri] for fileuri in chunk.loaders.fileuri_array.flat))
+    return ranks
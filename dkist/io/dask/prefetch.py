@@ -0,0 +1,192 @@
+"""
+Read files ahead of the tasks which need them.
+
+When the chunks of a dataset are computed in the order of its files, each
+task waits for its files to be read from disk before it can start. The
+`Prefetcher` asks the operating system to start reading the next files in the
+background as each task runs, so that the disk is busy while the data already
+read is being processed.
+
+Prefetching is disabled by default, and is enabled by setting
+``dkist.io.conf.prefetch_files`` to the number of files to read ahead of each
+task.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dask.utils import parse_bytes
+
+from dkist import log
+from dkist.io import conf
+
+__all__ = ["Prefetcher", "prefetcher"]
+
+
+class Prefetcher:
+    """
+    Start reading files in the background, up to a memory budget.
+
+    The files are read into the operating system's page cache, so any loader
+    reading them afterwards finds them in memory. The total size of the files
+    which have been prefetched but not yet read by a loader is limited to
+    ``dkist.io.conf.prefetch_memory``, so that reading ahead does not evict
+    data which has not yet been used from the page cache. Files which are
+    never read, for example because a computation only needed some of the
+    files or failed, are released from the budget when it is needed to
+    prefetch other files, once they were prefetched more than
+    ``dkist.io.conf.prefetch_expiry`` seconds ago.
+
+    Parameters
+    ----------
+    max_workers : `int`, optional
+        The number of threads used to read files if ``posix_fadvise`` is not
+        used.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # (length, time) of each prefetched byte range by (path, offset), in the order they were requested
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+
+    @property
+    def pending_bytes(self):
+        """
+        The total size of the files which have been prefetched but not read.
+        """
+        return self._pending_bytes
+
+    @staticmethod
+    def _method():
+        method = str(conf.prefetch_method)
+        if method not in ("fadvise", "thread"):
+            raise ValueError(f"Unknown prefetch method {method!r}, expected 'fadvise' or 'thread'.")
+        if method == "fadvise" and not hasattr(os, "posix_fadvise"):
+            return "thread"
+        return method
+
+    def prefetch(self, loaders, item=None):
+        """
+        Start reading the files of ``loaders``, in order, until the memory budget is used.
+
+        Only the bytes needed to read ``item`` of the data of each file are
+        read, see `dkist.io.dask.loaders.BaseFITSLoader.prefetch_range`, and
+        loaders for which these are not known are skipped.
+        """
+        max_bytes = parse_bytes(str(conf.prefetch_memory))
+        method = self._method()
+        for loader in loaders:
+            byte_range = loader.prefetch_range(item)
+            if byte_range is None:
+                continue
+            path, offset, length = byte_range
+            key = (str(path), offset)
+            with self._lock:
+                if key in self._pending:
+                    continue
+                if self._pending_bytes + length > max_bytes:
+                    self._release_expired()
+                if self._pending_bytes + length > max_bytes:
+                    break
+                self._pending[key] = (length, time.monotonic())
+                self._pending_bytes += length
+            log.debug("Prefetching %s bytes at offset %s of %s", length, offset, path)
+            if method == "fadvise":
+                _fadvise(path, offset, length)
+            else:
+                self._submit(path, offset, length)
+
+    def consumed(self, loader, item=None):
+        """
+        Record that a loader has read ``item`` of its file, freeing its share of the memory budget.
+
+        As files are prefetched in the order they are expected to be read,
+        any files prefetched before this one which have not been read are
+        assumed to have been skipped, and are also released.
+        """
+        byte_range = loader.prefetch_range(item)
+        if byte_range is None:
+            return
+        key = (str(byte_range[0]), byte_range[1])
+        with self._lock:
+            if key not in self._pending:
+                return
+            while self._pending:
+                pending_key, (length, _) = self._pending.popitem(last=False)
+                self._pending_bytes -= length
+                if pending_key == key:
+                    break
+
+    def _release_expired(self):
+        """
+        Release the files prefetched more than ``dkist.io.conf.prefetch_expiry`` seconds ago.
+
+        Must be called with the lock held.
+        """
+        expired = time.monotonic() - float(conf.prefetch_expiry)
+        while self._pending:
+            (path, offset), (length, prefetched) = next(iter(self._pending.items()))
+            if prefetched > expired:
+                break
+            log.debug("Releasing %s bytes at offset %s of %s which were prefetched but not read", length, offset, path)
+            del self._pending[path, offset]
+            self._pending_bytes -= length
+
+    def clear(self):
+        """
+        Forget all prefetched files, freeing the memory budget.
+        """
+        with self._lock:
+            self._pending.clear()
+            self._pending_bytes = 0
+
+    def _submit(self, path, offset, length):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="dkist-prefetch")
+            executor = self._executor
+        executor.submit(_read, path, offset, length)
+
+
+def _fadvise(path, offset, length):
+    """
+    Ask the operating system to read a byte range of a file into the page cache.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        log.debug("Could not prefetch %s: %s", path, e)
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def _read(path, offset, length, block_size=2**20):
+    """
+    Read a byte range of a file, discarding the data, so that it is in the page cache.
+    """
+    buffer = bytearray(min(block_size, length))
+    try:
+        with open(path, mode="rb", buffering=0) as fobj:
+            fobj.seek(offset)
+            remaining = length
+            while remaining > 0:
+                nbytes = fobj.readinto(memoryview(buffer)[:remaining])
+                if not nbytes:
+                    break
+                remaining -= nbytes
+    except OSError as e:
+        log.debug("Could not prefetch %s: %s", path, e)
+
+
+prefetcher = Prefetcher()
+"""
+The process-wide `Prefetcher` used by the dask arrays of datasets.
+"""
@@ -0,0 +1,291 @@
+"""
+A cache of decoded frames in shared memory, used by every process on a node.
+
+When several Jupyter kernels or dask workers on the same node read the same
+datasets, each of them decodes and keeps its own copy of every frame. The
+`SharedFrameCache` saves the data of each file as a ``.npy`` file in a
+memory backed directory (``/dev/shm`` on Linux), which any process then
+memory maps. The pages of a mapped frame are shared by all the processes
+using it, so each frame is only decoded, and only held in memory, once. On
+platforms without ``/dev/shm`` the frames are saved in the temporary
+directory, where mapped frames are still shared through the page cache, but
+may also be written to disk.
+
+The files of the cache are listed in a small sqlite database in the same
+directory, which records their size and when they were last used, so that
+the total size of the cache on the node is kept below
+``dkist.io.conf.shared_cache_size`` by deleting the least recently used
+frames. Each process records the frames it has used in the index at most
+once every `SharedFrameCache.used_interval` seconds, so that reading frames
+which are already in the cache does not wait for other processes to write to
+the index. Frames which are deleted while a process has them mapped stay
+valid in that process until it unmaps them.
+"""
+import os
+import time
+import getpass
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from dask.utils import parse_bytes
+
+from dkist import log
+from dkist.io import conf
+from dkist.io.dask.cache import CacheInfo
+from dkist.io.dask.loaders import FileCache, _is_missing
+
+__all__ = ["SharedFrameCache", "shared_frame_cache"]
+
+
+class SharedFrameCache:
+    """
+    A cache of the data of whole FITS files, shared by all the processes on a node.
+
+    Parameters
+    ----------
+    directory : `pathlib.Path`, optional
+        The directory the frames and their index are saved in, which should
+        be on a memory backed file system. Defaults to
+        ``dkist.io.conf.shared_cache_dir``, or a directory for the current
+        user in ``/dev/shm`` (or the temporary directory on platforms without
+        ``/dev/shm``) if that option is empty.
+    maxsize : `int`, optional
+        The maximum total size of the frames in the cache, in bytes.
+        Defaults to ``dkist.io.conf.shared_cache_size``, which is read every
+        time the cache is used. The cache is disabled if this is zero.
+    """
+    index_filename = "index.sqlite"
+    suffix = ".npy"
+    used_interval = 1.0
+    """
+    The minimum number of seconds between writes of the times frames were used to the index.
+    """
+
+    def __init__(self, directory=None, maxsize=None):
+        self._directory = directory
+        self._maxsize = maxsize
+        self._local = threading.local()
+        self._hits = 0
+        self._misses = 0
+        # The last time each frame read from the cache was used, which have not been written to the index
+        self._used = {}
+        self._used_lock = threading.Lock()
+        self._used_written = time.monotonic()
+
+    @property
+    def directory(self):
+        """
+        The directory the frames and their index are saved in.
+        """
+        if self._directory is not None:
+            return Path(self._directory)
+        directory = str(conf.shared_cache_dir)
+        if directory:
+            return Path(directory).expanduser()
+        shm = Path("/dev/shm")
+        parent = shm if shm.is_dir() else Path(tempfile.gettempdir())
+        return parent / f"dkist-{getpass.getuser()}"
+
+    @property
+    def maxsize(self):
+        """
+        The maximum total size of the frames in the cache, in bytes.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return parse_bytes(str(conf.shared_cache_size))
+
+    def _connect(self):
+        """
+        The connection of this thread to the index of the cache.
+
+        Connections can not be shared between threads, or with processes
+        forked from this one, so each thread of each process opens its own.
+        """
+        directory = self.directory
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.key == (os.getpid(), directory):
+            return connection
+        directory.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode, with transactions started explicitly
+        connection = sqlite3.connect(directory / self.index_filename, timeout=60, isolation_level=None)
+        connection.execute("CREATE TABLE IF NOT EXISTS frames (name TEXT PRIMARY KEY, size INTEGER, used INTEGER)")
+        self._local.connection = connection
+        self._local.key = (os.getpid(), directory)
+        return connection
+
+    def read(self, loader, item, read=None):
+        """
+        Return ``loader[item]``, decoding the whole file into the cache if it is not already there.
+
+        Parameters
+        ----------
+        loader : `dkist.io.dask.loaders.BaseFITSLoader`
+            The loader of the file.
+        item : `tuple`
+            The index into the data of the file.
+        read : callable, optional
+            The function called as ``read(loader, item)`` to read data,
+            defaulting to indexing the loader.
+        """
+        read = read or (lambda loader, item: loader[item])
+        maxsize = self.maxsize
+        key = FileCache.key(loader) if maxsize > 0 else None
+        if key is None:
+            return read(loader, item)
+
+        name = hashlib.sha256(repr(key).encode()).hexdigest() + self.suffix
+        path = self.directory / name
+        try:
+            data = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            # Not in the cache, or another process has not finished writing it
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._record_use(name)
+            return data[item]
+
+        data = read(loader, (slice(None),) * len(loader.shape))
+        if data.nbytes <= maxsize and not _is_missing(data):
+            # The data of missing files is not saved, so it is read once the files exist
+            self._save(path, np.asarray(data), maxsize)
+        return data[item]
+
+    def _record_use(self, name):
+        """
+        Record that a frame was used, writing the uses recorded since the last write if it was long enough ago.
+        """
+        with self._used_lock:
+            self._used[name] = time.time_ns()
+            if time.monotonic() - self._used_written < self.used_interval:
+                return
+        self._write_used(self._connect())
+
+    def _write_used(self, connection):
+        """
+        Write the times the frames used by this process were last used to the index.
+        """
+        with self._used_lock:
+            used, self._used = self._used, {}
+            self._used_written = time.monotonic()
+        if used:
+            connection.executemany("UPDATE frames SET used = MAX(used, ?) WHERE name = ?",
+                                   [(used_ns, name) for name, used_ns in used.items()])
+
+    def _save(self, path, data, maxsize):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as fobj:
+                np.save(fobj, data, allow_pickle=False)
+            tmp_path.replace(path)
+        except OSError as e:
+            log.warning("Could not write to the shared frame cache %s: %s", path.parent, e)
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        connection = self._connect()
+        # Take the write lock before reading the total size, so processes do not evict at the same time
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("INSERT OR REPLACE INTO frames VALUES (?, ?, ?)",
+                               (path.name, path.stat().st_size, time.time_ns()))
+            # The order frames were used in is needed to evict the least recently used ones
+            self._write_used(connection)
+            self._evict(connection, maxsize)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection, maxsize):
+        """
+        Delete the least recently used frames until the cache is no larger than ``maxsize``.
+
+        Frames in the directory which are missing from the index are added to
+        it first, so they are evicted too.
+        """
+        self._reconcile(connection)
+        total, = connection.execute("SELECT COALESCE(SUM(size), 0) FROM frames").fetchone()
+        if total <= maxsize:
+            return
+        evicted = []
+        for name, size in connection.execute("SELECT name, size FROM frames ORDER BY used, rowid"):
+            if total <= maxsize:
+                break
+            evicted.append(name)
+            total -= size
+        for name in evicted:
+            (self.directory / name).unlink(missing_ok=True)
+        connection.executemany("DELETE FROM frames WHERE name = ?", [(name,) for name in evicted])
+        log.debug("Evicted %s frames from the shared frame cache", len(evicted))
+
+    def _reconcile(self, connection):
+        """
+        Add the frames in the directory which are not in the index to it.
+
+        A process which stops after saving a frame but before adding it to
+        the index leaves a frame which would otherwise never be evicted. The
+        frames are added as last used when they were written.
+        """
+        indexed = {name for name, in connection.execute("SELECT name FROM frames")}
+        missing = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.suffix) and entry.name not in indexed and entry.is_file():
+                    stat = entry.stat()
+                    missing.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        if missing:
+            log.debug("Adding %s frames missing from the index of the shared frame cache", len(missing))
+            # Another process may add one of these frames at the same time
+            connection.executemany("INSERT OR IGNORE INTO frames VALUES (?, ?, ?)", missing)
+
+    def resize(self, maxsize):
+        """
+        Change the maximum size of the cache, evicting frames if it has shrunk.
+
+        The size is not stored in the cache, so other processes keep their
+        own maximum size. Passing `None` uses
+        ``dkist.io.conf.shared_cache_size`` again.
+        """
+        self._maxsize = maxsize
+        self._shrink(self.maxsize)
+
+    def clear(self):
+        """
+        Delete all the frames in the cache, for every process on the node, and reset the statistics.
+        """
+        self._shrink(0)
+        self._hits = self._misses = 0
+
+    def _shrink(self, maxsize):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_used(connection)
+            self._evict(connection, maxsize)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses in this process, and the size of the cache on the node.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        currsize, = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM frames").fetchone()
+        return CacheInfo(self._hits, self._misses, self.maxsize, currsize)
+
+
+shared_frame_cache = SharedFrameCache()
+"""
+The `SharedFrameCache` used by the dask arrays of datasets.
+"""
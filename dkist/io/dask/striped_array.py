@@ -1,11 +1,12 @@
 """
 This module contains two key classes:
 
-* ``StripedExternalArray``: The object which tracks the ``BaseFITSLoader``
-  objects and the file references and their shape, and constructs a Dask Array.
-  The loader object (which actually reads the data out of the FITS files) holds
-  a reference back to this object which it uses to resolve the file paths at
-  load time.
+* ``StripedExternalArray``: The object which tracks the file references and
+  their shape, and constructs a Dask Array. The ``BaseFITSLoader`` objects
+  (which actually read the data out of the FITS files) are created on demand
+  through a ``LoaderArray``, from the ``LoaderSpec`` holding the properties
+  shared by all the files, using its ``basepath`` at the time they are
+  created to resolve the file paths.
 * ``FileManager``: The object providing the public API, which can be sliced.
 
 The slicing functionality on the ``FileManager`` object works by constructing a
@@ -25,11 +26,20 @@ from numpy.typing import DTypeLike, NDArray
 
 from astropy.wcs.wcsapi.wrappers.sliced_wcs import sanitize_slices
 
-from dkist.io.dask.loaders import BaseFITSLoader
-from dkist.io.dask.utils import stack_loader_array
-from dkist.io.utils import filemanager_info_str
+from dkist.io import conf
+from dkist.io.dask.loaders import (
+    BaseFITSLoader,
+    _as_output_dtype,
+    file_cache,
+    fits_file_pool,
+    get_fits_loader,
+    remote_file_pool,
+    tile_cache,
+)
+from dkist.io.dask.utils import FileTransform, stack_loader_array
+from dkist.io.utils import filemanager_info_str, is_url
 
-__all__ = ["FileManager", "StripedExternalArray"]
+__all__ = ["FileManager", "LoaderArray", "LoaderSpec", "StripedExternalArray"]
 
 
 class FileManagerProtocol(Protocol):
@@ -53,6 +63,122 @@ class FileManagerProtocol(Protocol):
     def shape(self) -> tuple: ...
 
 
+class LoaderSpec:
+    """
+    The properties shared by the loaders of all the files of a `StripedExternalArray`.
+
+    The tasks of the dask arrays reference this object rather than the
+    `StripedExternalArray`, so a task only carries these few values, and the
+    file uris of its chunk, when it is sent to another process. Setting the
+    ``basepath`` or ``loader`` of the `StripedExternalArray` changes them
+    here, so arrays which have already been generated read the files from
+    their new location. Their dask names still identify the old location, so
+    `dkist.io.DKISTFileManager` replaces the data of its dataset with a new
+    array when they change.
+
+    Parameters
+    ----------
+    shape : tuple[int]
+        The shape of the data in each file.
+    dtype : `numpy.dtype`
+        The dtype of the data in each file.
+    target : `int`
+        The HDU the data are read from.
+    loader : type[`.BaseFITSLoader`]
+        The class used to read the files.
+    basepath : `os.PathLike`, optional
+        The directory (or URL, or tar archive) relative file uris are resolved in.
+    """
+    __slots__ = ["basepath", "dtype", "loader", "shape", "target"]
+
+    def __init__(self, shape, dtype, target, *, loader, basepath=None):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.target = target
+        self.loader = loader
+        self.basepath = basepath
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(shape={self.shape}, dtype={self.dtype}, target={self.target}, "
+                f"loader={self.loader.__name__}, basepath={self.basepath!r})")
+
+    def make_loader(self, fileuri: str, output_dtype: DTypeLike = None) -> BaseFITSLoader:
+        """
+        Create the loader of one file.
+        """
+        return self.loader(fileuri, self.shape, self.dtype, self.target, self.basepath, output_dtype=output_dtype)
+
+
+class LoaderArray:
+    """
+    An array of `.BaseFITSLoader` objects, which are created when they are accessed.
+
+    Rather than storing a loader object for every file, this stores an array
+    of file uris and a `LoaderSpec` holding the loader class, shape, dtype,
+    target and basepath shared by all the files. Indexing with integers
+    returns a new loader, any other index returns a new `LoaderArray`.
+
+    Parameters
+    ----------
+    fileuri_array : `numpy.ndarray`
+        The file uris of the loaders.
+    spec : `LoaderSpec`
+        The properties shared by all the loaders.
+    output_dtype : `numpy.dtype`, optional
+        The floating point or complex dtype the loaders convert the data to.
+    """
+    __slots__ = ["fileuri_array", "output_dtype", "spec"]
+
+    def __init__(self, fileuri_array: NDArray[np.str_], spec: LoaderSpec, output_dtype: DTypeLike = None):
+        self.fileuri_array = fileuri_array
+        self.spec = spec
+        self.output_dtype = _as_output_dtype(output_dtype)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} shape: {self.shape} of {self.spec!r}>"
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.fileuri_array.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.fileuri_array.ndim
+
+    @property
+    def size(self) -> int:
+        return self.fileuri_array.size
+
+    def __len__(self) -> int:
+        return len(self.fileuri_array)
+
+    def __getitem__(self, item):
+        fileuris = self.fileuri_array[item]
+        if isinstance(fileuris, np.ndarray):
+            return type(self)(fileuris, self.spec, self.output_dtype)
+        return self.spec.make_loader(fileuris, self.output_dtype)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        loaders = np.empty(self.shape, dtype=object)
+        for index in np.ndindex(self.shape):
+            loaders[index] = self.spec.make_loader(self.fileuri_array[index], self.output_dtype)
+        return loaders
+
+    @property
+    def flat(self):
+        """
+        A flat view of the loaders, like `numpy.ndarray.flat`.
+        """
+        return type(self)(self.fileuri_array.reshape(-1), self.spec, self.output_dtype)
+
+    def reshape(self, *shape):
+        return type(self)(self.fileuri_array.reshape(*shape), self.spec, self.output_dtype)
+
+
 class BaseStripedExternalArray(abc.ABC):
     """
     Implements shared functionality between FITSLoader and FITSLoaderView.
@@ -68,10 +194,8 @@ class BaseStripedExternalArray(abc.ABC):
         An array of relative (to ``basepath``) file uris.
         """
 
-    # np.object_ isn't a generic so we can't type hint the actual type
-    # https://github.com/numpy/numpy/issues/25351
     @abc.abstractproperty
-    def loader_array(self) -> NDArray[np.object_]:
+    def loader_array(self) -> LoaderArray:
         """
         An array of `.BaseFITSLoader` objects.
 
@@ -113,11 +237,38 @@ class BaseStripedExternalArray(abc.ABC):
         Construct a `dask.array.Array` object from this set of references.
 
         Each call to this method generates a new array, but all the loaders
-        still have a reference to this `~.FileManager` object, meaning changes
-        to this object will be reflected in the data loaded by the array.
+        share the `LoaderSpec` of this `~.FileManager` object, meaning changes
+        to its ``basepath`` or ``loader`` will be reflected in the data loaded
+        by the array.
         """
         return stack_loader_array(self.loader_array, self.output_shape, self.chunksize)
 
+    def _array_cache_key(self) -> tuple:
+        """
+        The properties the array generated by `_generate_array` depends on.
+        """
+        # str, because a dtype compares equal to None, which numpy takes to mean float64
+        return (self.basepath, self.loader, str(self.output_dtype), self.chunksize,
+                str(conf.chunk_size), bool(conf.split_large_files), bool(conf.io_order))
+
+    @property
+    def dask_array(self) -> dask.array.Array:
+        """
+        The `dask.array.Array` for this set of references.
+
+        The array is generated the first time it is accessed, and generated
+        again only if ``basepath``, ``loader``, ``output_dtype`` or the
+        chunking configuration change. The tasks of the array only reference
+        the `LoaderSpec` of this object, not this object itself, so caching the
+        array here does not create a reference cycle, and sending the tasks to
+        another process does not send the whole graph.
+        """
+        key = self._array_cache_key()
+        cached = self._cached_array
+        if cached is None or cached[0] != key:
+            cached = self._cached_array = (key, self._generate_array())
+        return cached[1]
+
 
 class StripedExternalArray(BaseStripedExternalArray):
     def __init__(
@@ -130,21 +281,17 @@ class StripedExternalArray(BaseStripedExternalArray):
         loader: type[BaseFITSLoader],
         basepath: os.PathLike = None,
         chunksize: Iterable[int] = None,
+        output_dtype: DTypeLike = None,
     ):
         shape = tuple(shape)
         self.shape = shape
         self.dtype = dtype
         self.target = target
-        self._loader = loader
-        self._basepath = self._sanitize_basepath(basepath)
+        self._spec = LoaderSpec(shape, dtype, target, loader=loader, basepath=self._sanitize_basepath(basepath))
         self.chunksize = chunksize
+        self.output_dtype = output_dtype
         self._fileuri_array = np.atleast_1d(np.array(fileuris))
-
-        loader_array = np.empty_like(self._fileuri_array, dtype=object)
-        for i, fileuri in enumerate(self._fileuri_array.flat):
-            loader_array.flat[i] = loader(fileuri, shape, dtype, target, self.basepath)
-
-        self._loader_array = loader_array
+        self._cached_array = None
 
     def __str__(self: FileManagerProtocol) -> str:
         return filemanager_info_str(self)
@@ -155,24 +302,56 @@ class StripedExternalArray(BaseStripedExternalArray):
 
     @property
     def ndim(self):
-        return len(self.loader_array.shape)
+        return self._fileuri_array.ndim
 
     @staticmethod
     def _sanitize_basepath(value):
-        return Path(value).expanduser() if value is not None else None
+        if value is None or is_url(value):
+            return value
+        return Path(value).expanduser()
 
     @property
     def basepath(self) -> os.PathLike:
         """
         The path all arrays generated from this ``FileManager`` use to read data from.
         """
-        return self._basepath
+        return self._spec.basepath
 
     @basepath.setter
     def basepath(self, value: os.PathLike | str | None):
-        self._basepath = self._sanitize_basepath(value)
-        for loader in self._loader_array.flat:
-            loader.basepath = self._basepath
+        # Files opened from the old location should not be reused.
+        basepath = self._spec.basepath
+        if basepath is not None:
+            file_cache.invalidate(basepath)
+        if is_url(basepath):
+            remote_file_pool.invalidate(basepath)
+        elif basepath is not None:
+            fits_file_pool.invalidate(basepath)
+            tile_cache.invalidate(basepath)
+        # The spec is shared with the arrays already generated, so they read from the new location.
+        self._spec.basepath = self._sanitize_basepath(value)
+
+    @property
+    def output_dtype(self) -> np.dtype | None:
+        """
+        The dtype the data are converted to as they are read, or `None` to keep the dtype of the files.
+        """
+        return self._output_dtype
+
+    @output_dtype.setter
+    def output_dtype(self, value: DTypeLike):
+        self._output_dtype = _as_output_dtype(value)
+
+    @property
+    def loader(self) -> type[BaseFITSLoader]:
+        """
+        The `.BaseFITSLoader` subclass used to read the files.
+        """
+        return self._spec.loader
+
+    @loader.setter
+    def loader(self, value: type[BaseFITSLoader] | str):
+        self._spec.loader = get_fits_loader(value)
 
     @property
     def fileuri_array(self) -> NDArray[np.str_]:
@@ -182,14 +361,15 @@ class StripedExternalArray(BaseStripedExternalArray):
         return self._fileuri_array
 
     @property
-    def loader_array(self) -> NDArray[np.object_]:
+    def loader_array(self) -> LoaderArray:
         """
         An array of `.BaseFITSLoader` objects.
 
         These loader objects implement the minimal array-like interface for
-        conversion to a dask array.
+        conversion to a dask array. They are created when accessed, using the
+        current value of ``basepath``.
         """
-        return self._loader_array
+        return LoaderArray(self._fileuri_array, self._spec, self.output_dtype)
 
 
 class StripedExternalArrayView(BaseStripedExternalArray):
@@ -197,11 +377,12 @@ class StripedExternalArrayView(BaseStripedExternalArray):
     # the fileuri_array and loader_array properties Any property which
     # references the sliced objects should be defined in Base or this view
     # class.
-    __slots__ = ["parent", "parent_slice"]
+    __slots__ = ["_cached_array", "parent", "parent_slice"]
 
     def __init__(self, parent: StripedExternalArray, aslice: tuple | slice | int):
         self.parent = parent
         self.parent_slice = tuple(aslice) if isinstance(aslice, (tuple, list)) else (aslice,)
+        self._cached_array = None
 
     def __getattr__(self, attr):
         return getattr(self.parent, attr)
@@ -224,6 +405,28 @@ class StripedExternalArrayView(BaseStripedExternalArray):
     def basepath(self, value):
         self.parent.basepath = value
 
+    @property
+    def loader(self) -> type[BaseFITSLoader]:
+        """
+        The `.BaseFITSLoader` subclass used to read the files.
+        """
+        return self.parent.loader
+
+    @loader.setter
+    def loader(self, value: type[BaseFITSLoader] | str):
+        self.parent.loader = value
+
+    @property
+    def output_dtype(self) -> np.dtype | None:
+        """
+        The dtype the data are converted to as they are read, or `None` to keep the dtype of the files.
+        """
+        return self.parent.output_dtype
+
+    @output_dtype.setter
+    def output_dtype(self, value: DTypeLike):
+        self.parent.output_dtype = value
+
     @property
     def fileuri_array(self) -> NDArray[np.str_]:
         """
@@ -231,19 +434,17 @@ class StripedExternalArrayView(BaseStripedExternalArray):
         """
         # array call here to ensure that a length one array is returned rather
         # than a single element.
-        return np.array(self._fileuri_array[self.parent_slice])
+        return np.array(self.parent.fileuri_array[self.parent_slice])
 
     @property
-    def loader_array(self) -> NDArray[np.object_]:
+    def loader_array(self) -> LoaderArray:
         """
-        An array of `.BaseParent` objects.
+        An array of `.BaseFITSLoader` objects.
 
         These loader objects implement the minimal array-like interface for
         conversion to a dask array.
         """
-        # array call here to ensure that a length one array is returned rather
-        # than a single element.
-        return np.array(self.parent.loader_array[self.parent_slice])
+        return LoaderArray(self.fileuri_array, self.parent._spec, self.parent.output_dtype)
 
 
 class FileManager:
@@ -257,12 +458,14 @@ class FileManager:
     __slots__ = ["_striped_external_array", "_subslice"]
 
     @classmethod
-    def from_parts(cls, fileuris, target, dtype, shape, *, loader, basepath=None, chunksize=None, subslice=None):
+    def from_parts(cls, fileuris, target, dtype, shape, *, loader, basepath=None, chunksize=None, subslice=None,
+                   output_dtype=None):
         """
         An initialization helper for constructing the `StripedExternalArray` and the `FileManager` together.
         """
         striped_array = StripedExternalArray(
             fileuris, target, dtype, shape, loader=loader, basepath=basepath, chunksize=None,
+            output_dtype=output_dtype,
         )
         return cls(striped_array, subslice)
 
@@ -303,6 +506,9 @@ class FileManager:
     def _slice_by_cube(self, item_):
         item = self._array_slice_to_loader_slice(item_)
         item_ = np.index_exp[item_]
+        if any(i is Ellipsis for i in item_):
+            # The part of the slice which applies to the files has to be explicit
+            item_ = tuple(sanitize_slices(item_, len(self.output_shape)))
         loader_view = StripedExternalArrayView(self._striped_external_array, item)
         subslice = item_[len((item,) if isinstance(item, int) else item):]
         return type(self)(loader_view, subslice)
@@ -310,17 +516,77 @@ class FileManager:
     def _generate_array(self):
         return self._striped_external_array._generate_array()
 
-    # @cached_property
+    def _apply_subslice(self, array):
+        """
+        Apply the part of the slice of a dataset which falls in the dimensions of the files to an array of its files.
+        """
+        if not self._subslice:
+            return array
+        file_shape = self._striped_external_array.shape
+        file_ndim = len(file_shape) - (file_shape[0] == 1)
+        return array[(..., *self._subslice, *(slice(None),) * (file_ndim - len(self._subslice)))]
+
     @property
     def dask_array(self):
         """
         The Dask array managed by this FileManager.
 
         .. note::
-           This array is cached, so only generated once.
-
-        """
-        return self._generate_array()
+           This array is cached, so only generated once, unless ``basepath``
+           or the loader used to read the files change.
+
+        """
+        return self._striped_external_array.dask_array
+
+    def transformed_array(self, func, shape, dtype):
+        """
+        A Dask array of the result of applying ``func`` to the data of each file.
+
+        ``func`` is called with the whole data array of one file, in the task
+        which reads the file, so operations such as cropping, binning or
+        applying a calibration array do not need separate dask layers, and
+        the full resolution data of a file is never held in memory after it
+        has been transformed.
+
+        Parameters
+        ----------
+        func : callable
+            A function taking the data array of one file, with the shape of
+            `shape`, and returning an array of ``shape`` and ``dtype``. The
+            data of missing files is an array of NaN.
+        shape : tuple[int]
+            The shape of the arrays returned by ``func``.
+        dtype : `numpy.dtype`
+            The dtype of the arrays returned by ``func``.
+
+        Returns
+        -------
+        `dask.array.Array`
+            An array with the dimensions of `fileuri_array` followed by
+            ``shape``. A new array is generated by each call.
+        """
+        transform = FileTransform(func, shape, dtype)
+        loader_array = self._striped_external_array.loader_array
+        output_shape = transform.shape
+        if loader_array.size != 1:
+            output_shape = (*loader_array.shape, *output_shape)
+        return stack_loader_array(loader_array, output_shape, transform=transform)
+
+    def select_files(self, mask):
+        """
+        A new `.FileManager` reading only the files where ``mask`` is `True`.
+
+        The selected files are arranged in a one dimensional array, in the
+        order of `fileuri_array`.
+        """
+        striped_array = self._striped_external_array
+        return type(self).from_parts(self.fileuri_array[mask],
+                                     striped_array.target,
+                                     striped_array.dtype,
+                                     striped_array.shape,
+                                     loader=striped_array.loader,
+                                     basepath=striped_array.basepath,
+                                     output_dtype=striped_array.output_dtype)
 
     @property
     def fileuri_array(self):
@@ -342,6 +608,31 @@ class FileManager:
     def basepath(self, value):
         self._striped_external_array.basepath = value
 
+    @property
+    def loader(self):
+        """
+        The `.BaseFITSLoader` subclass used to read the files.
+
+        This can be set to another loader class, or the name of one
+        registered in `dkist.io.dask.loaders.fits_loaders`.
+        """
+        return self._striped_external_array.loader
+
+    @loader.setter
+    def loader(self, value):
+        self._striped_external_array.loader = value
+
+    @property
+    def output_dtype(self):
+        """
+        The dtype the data are converted to as they are read, or `None` to keep the dtype of the files.
+        """
+        return self._striped_external_array.output_dtype
+
+    @output_dtype.setter
+    def output_dtype(self, value):
+        self._striped_external_array.output_dtype = value
+
     @property
     def filenames(self):
         """
@@ -349,6 +640,13 @@ class FileManager:
         """
         return self.fileuri_array.flatten().tolist()
 
+    @property
+    def target(self):
+        """
+        The HDU number the data is read from in each file.
+        """
+        return self._striped_external_array.target
+
     @property
     def output_shape(self):
         """
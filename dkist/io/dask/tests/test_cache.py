@@ -0,0 +1,76 @@
+import threading
+
+from dkist.io.dask.cache import CacheInfo, LRUCache
+
+
+def test_lru_eviction_order():
+    evicted = []
+    cache = LRUCache(2, on_evict=lambda key, value: evicted.append(key))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # Use a so b is now the least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert evicted == ["b"]
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_lru_sizeof():
+    cache = LRUCache(10, sizeof=len)
+    cache.put("a", "12345")
+    cache.put("b", "123456")
+    assert "a" not in cache
+    assert cache.currsize == 6
+
+    # Items bigger than the whole cache are never stored
+    cache.put("c", "12345678901")
+    assert "c" not in cache
+
+
+def test_lru_cache_info():
+    cache = LRUCache(2)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    assert cache.cache_info() == CacheInfo(hits=2, misses=1, maxsize=2, currsize=1)
+
+    cache.clear()
+    assert cache.cache_info() == CacheInfo(hits=0, misses=0, maxsize=2, currsize=0)
+
+
+def test_lru_resize_evict_pop():
+    evicted = []
+    cache = LRUCache(3, on_evict=lambda key, value: evicted.append(key))
+    for key in "abc":
+        cache.put(key, key)
+
+    cache.resize(2)
+    assert evicted == ["a"]
+
+    cache.evict(lambda key: key == "c")
+    assert evicted == ["a", "c"]
+
+    assert cache.pop("b") == "b"
+    assert cache.pop("b", "missing") == "missing"
+    assert len(cache) == 0
+
+
+def test_lru_threads():
+    cache = LRUCache(50)
+
+    def worker(offset):
+        for i in range(1000):
+            cache.put((offset, i % 100), i)
+            cache.get((offset, (i + 1) % 100))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == cache.currsize == 50
@@ -0,0 +1,131 @@
+import mmap
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.io import conf
+from dkist.io.dask import decode
+from dkist.io.dask.decode import DecodePool
+
+
+def _arange(n):
+    return np.arange(n, dtype=">f4")
+
+
+def _nan(n):
+    return np.broadcast_to(np.array(np.nan), (n, n))
+
+
+def _nan_or_ones(n):
+    return _nan(10) if n == 10 else np.ones((10, 10))
+
+
+def _fail(n):
+    raise ValueError(f"Could not read {n}")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = DecodePool()
+    with conf.set_temp("decode_processes", 2):
+        yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def dataset_pool(pool, mocker):
+    mocker.patch("dkist.io.dask.utils.decode_pool", pool)
+    return pool
+
+
+def test_map(pool, mocker):
+    spy = mocker.spy(decode, "_from_shared_memory")
+    data = pool.map(_arange, [(10,), (20,)])
+    assert pool.max_workers == 2
+
+    assert_allclose(data[0], np.arange(10))
+    assert_allclose(data[1], np.arange(20))
+    assert data[0].dtype == np.dtype(">f4")
+    # The arrays are backed by the shared memory, not copies of it
+    assert isinstance(data[0].base, mmap.mmap)
+
+    # The blocks are unlinked as soon as they are mapped
+    for call in spy.call_args_list:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(call.args[0])
+
+
+def test_map_broadcast(pool, mocker):
+    spy = mocker.spy(decode, "_from_shared_memory")
+    data, = pool.map(_nan, [(100,)])
+    assert data.shape == (100, 100)
+    assert np.isnan(data).all()
+    # Views of a single value are sent without a shared memory block
+    assert spy.call_args.args[0] is None
+    assert not any(data.strides)
+
+
+def test_map_error(pool):
+    with pytest.raises(ValueError, match="Could not read 1"):
+        pool.map(_fail, [(1,)])
+
+
+def test_map_into(pool):
+    data = pool.map_into(_arange, [(10,), (10,), (10,)], (10,), "f8")
+    assert data.shape == (3, 10)
+    assert data.dtype == np.dtype("f8")
+    assert_allclose(data, np.broadcast_to(np.arange(10), (3, 10)))
+    # The workers wrote straight into the shared memory block of the result
+    assert isinstance(data.base, mmap.mmap)
+
+
+def test_map_into_broadcast(pool):
+    data = pool.map_into(_nan, [(10,), (10,)], (10, 10), "f8")
+    assert data.shape == (2, 10, 10)
+    assert np.isnan(data).all()
+    assert not any(data.strides)
+
+    data = pool.map_into(_nan_or_ones, [(10,), (11,)], (10, 10), "f8")
+    assert np.isnan(data[0]).all()
+    assert (data[1] == 1).all()
+
+
+def test_map_into_error(pool):
+    with pytest.raises(ValueError, match="Could not read 1"):
+        pool.map_into(_fail, [(1,), (2,)], (10,), "f8")
+
+
+def test_no_processes(pool):
+    with conf.set_temp("decode_processes", 0), pytest.raises(ValueError, match="decode_processes"):
+        pool.map(_arange, [(10,)])
+
+
+def test_dataset_decode_processes(eit_dataset, dataset_pool, mocker):
+    expected = eit_dataset.data.compute()
+    spy = mocker.spy(dataset_pool, "map")
+    with conf.set_temp("chunk_size", "0"):
+        data = eit_dataset.files.dask_array.compute()
+    assert_allclose(data, expected)
+    assert spy.call_count == len(eit_dataset.files)
+
+    eit_dataset.files.basepath = "/not/a/real/path"
+    assert np.isnan(eit_dataset.files.dask_array.compute()).all()
+
+
+@pytest.mark.parametrize("chunk_size", ["0", "auto"])
+def test_dataset_decode_zero_copy(eit_dataset, dataset_pool, mocker, chunk_size):
+    method = "map" if chunk_size == "0" else "map_into"
+    spy = mocker.spy(dataset_pool, method)
+    with conf.set_temp("chunk_size", chunk_size):
+        array = eit_dataset.files.dask_array
+    task = array.dask[(array.name, *(0,) * array.ndim)]
+    chunk = task.args[0].value
+    data = chunk[(slice(None),) * chunk.ndim]
+    assert data.shape == chunk.shape
+
+    shared = spy.spy_return[0] if method == "map" else spy.spy_return
+    # The chunk is a view of the shared memory the workers wrote to, not a copy of it
+    assert np.shares_memory(data, shared)
+    assert isinstance(shared.base, mmap.mmap)
@@ -0,0 +1,134 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.data.test import rootdir
+from dkist.io import conf
+from dkist.io.dask.disk_cache import DiskChunkCache, _normalize_index
+from dkist.io.dask.loaders import AstropyFITSLoader
+
+eitdir = Path(rootdir) / "EIT"
+eitfiles = sorted(path.name for path in eitdir.glob("*.fits"))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskChunkCache(tmp_path / "cache", maxsize=2**30)
+
+
+@pytest.fixture
+def loader():
+    return AstropyFITSLoader(eitfiles[0], (128, 128), "float64", 0, eitdir)
+
+
+@pytest.fixture
+def read(mocker):
+    return mocker.spy(AstropyFITSLoader, "__getitem__")
+
+
+def test_read(cache, loader, read):
+    expected = loader[10:20]
+    read.reset_mock()
+
+    assert_allclose(cache.read(loader, np.s_[10:20]), expected)
+    assert read.call_count == 1
+    assert len(list(cache.directory.glob("*.npy"))) == 1
+
+    data = cache.read(loader, (slice(10, 20), slice(None)))
+    assert isinstance(data, np.memmap)
+    assert_allclose(data, expected)
+    # An equivalent index reuses the same entry
+    assert read.call_count == 1
+    assert cache.cache_info().hits == 1
+
+    cache.read(loader, np.s_[20:30])
+    assert read.call_count == 2
+
+
+def test_normalize_index():
+    assert _normalize_index((-1, slice(None)), (128, 128)) == _normalize_index(127, (128, 128))
+    assert _normalize_index(128, (128, 128)) != _normalize_index(0, (128, 128))
+    assert _normalize_index(-129, (128, 128)) != _normalize_index(127, (128, 128))
+
+
+def test_out_of_range_index(cache, loader):
+    cache.read(loader, np.s_[0])
+    with pytest.raises(IndexError):
+        cache.read(loader, np.s_[128])
+
+
+def test_persistent(cache, loader, read):
+    cache.read(loader, np.s_[:])
+    new_cache = DiskChunkCache(cache.directory, maxsize=cache.maxsize)
+    assert_allclose(new_cache.read(loader, np.s_[:]), loader[:])
+    assert read.call_count == 2
+    assert new_cache.cache_info().currsize > 128 * 128 * 8
+
+
+def test_basepath_change(cache, loader, tmp_path):
+    cache.read(loader, np.s_[:])
+    # A different file with the same name in another directory
+    shutil.copy(eitdir / eitfiles[1], tmp_path / eitfiles[0])
+    loader.basepath = tmp_path
+    assert_allclose(cache.read(loader, np.s_[:]), AstropyFITSLoader(eitfiles[1], (128, 128), "float64", 0, eitdir)[:])
+
+
+def test_modified_file(cache, tmp_path, read):
+    shutil.copy(eitdir / eitfiles[0], tmp_path / "file.fits")
+    loader = AstropyFITSLoader("file.fits", (128, 128), "float64", 0, tmp_path)
+    cache.read(loader, np.s_[:])
+
+    shutil.copy(eitdir / eitfiles[1], tmp_path / "file.fits")
+    stat = (tmp_path / "file.fits").stat()
+    os.utime(tmp_path / "file.fits", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    data = cache.read(loader, np.s_[:])
+    assert read.call_count == 2
+    assert_allclose(data, AstropyFITSLoader(eitfiles[1], (128, 128), "float64", 0, eitdir)[:])
+
+
+def test_missing_file_not_cached(cache, loader):
+    loader.fileuri = "missing.fits"
+    assert np.isnan(cache.read(loader, np.s_[:])).all()
+    assert not list(cache.directory.glob("*.npy"))
+
+
+def test_eviction(tmp_path, read):
+    loaders = [AstropyFITSLoader(name, (128, 128), "float64", 0, eitdir) for name in eitfiles[:3]]
+    cache = DiskChunkCache(tmp_path, maxsize=2 * (128 * 128 * 8 + 128))
+    for loader in loaders:
+        cache.read(loader, np.s_[:])
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+    assert not (tmp_path / cache.key(loaders[0], np.s_[:])).exists()
+
+    # Using an entry makes it the most recently used
+    cache.read(loaders[1], np.s_[:])
+    cache.read(loaders[0], np.s_[:])
+    assert not (tmp_path / cache.key(loaders[2], np.s_[:])).exists()
+    assert read.call_count == 4
+
+    cache.clear()
+    assert not list(tmp_path.glob("*.npy"))
+
+
+def test_disabled(loader, read):
+    cache = DiskChunkCache()
+    assert cache.directory is None
+    cache.read(loader, np.s_[:])
+    cache.read(loader, np.s_[:])
+    assert read.call_count == 2
+
+
+def test_dataset_disk_cache(eit_dataset, tmp_path, read, mocker):
+    mocker.patch("dkist.io.dask.utils.disk_cache", DiskChunkCache())
+    expected = eit_dataset.data.compute()
+    read.reset_mock()
+    with conf.set_temp("disk_cache_dir", str(tmp_path)):
+        assert_allclose(eit_dataset.data.compute(), expected)
+        assert read.call_count == len(eit_dataset.files)
+        assert_allclose(eit_dataset.data.compute(), expected)
+    assert read.call_count == len(eit_dataset.files)
+    assert len(list(tmp_path.glob("*.npy"))) == len(eit_dataset.files)
@@ -1,12 +1,22 @@
+import gc
+import pickle
+import weakref
+import contextlib
 from pathlib import Path
 
 import dask.array as da
+from dask.core import flatten
 import numpy as np
 import pytest
 from numpy.testing import assert_allclose
 
+from astropy.io import fits
+
 from dkist.data.test import rootdir
-from dkist.io.dask.striped_array import FileManager, StripedExternalArray, StripedExternalArrayView
+from dkist.io import conf
+from dkist.io.dask.loaders import AstropyFITSLoader, RawFITSLoader
+from dkist.io.dask.striped_array import FileManager, LoaderArray, StripedExternalArray, StripedExternalArrayView
+from dkist.io.dask.utils import StripedLoaderLayer, contiguous_chunks
 
 eitdir = Path(rootdir) / "EIT"
 
@@ -192,3 +202,282 @@ def test_file_manager_slice_slice(large_visp_dataset):
     assert len(spectrum.files) == 1
     assert spectrum.files._fm.output_shape == stokesI.files._fm.output_shape[1:]
     assert spectrum.files._fm._striped_external_array.loader_array.shape == ()
+
+
+def test_slice_pushed_into_loader(file_manager, mocker):
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    array = file_manager._generate_array()
+
+    sub_array = array[2, 10:20, 5:7].compute()
+    assert sub_array.shape == (10, 2)
+    spy.assert_called_once()
+    assert spy.call_args.args[1] == (slice(10, 20), slice(5, 7))
+
+    spy.reset_mock()
+    full_array = array.compute()
+    assert_allclose(full_array[2, 10:20, 5:7], sub_array)
+    assert spy.call_count == len(file_manager)
+
+
+def test_graph_layer_not_materialized(file_manager):
+    with conf.set_temp("chunk_size", "0"):
+        array = file_manager._generate_array()
+    layer = array.dask.layers[array.name]
+    assert isinstance(layer, StripedLoaderLayer)
+    assert not layer.is_materialized()
+    assert len(layer) == len(file_manager)
+
+    sub_array = array[3:5, :10]
+    culled = sub_array.dask.cull(set(flatten(sub_array.__dask_keys__())))
+    loader_layers = [layer for layer in culled.layers.values() if any(key[0] == array.name for key in layer)]
+    assert len(loader_layers) == 1
+    assert set(loader_layers[0]) == {(array.name, 3, 0, 0), (array.name, 4, 0, 0)}
+
+    assert (array.name, len(file_manager), 0, 0) not in layer
+    assert (array.name, 0, 1, 0) not in layer
+    with pytest.raises(KeyError):
+        layer[(array.name, 0, 1, 0)]
+
+
+@pytest.mark.parametrize("n_files", [20, 20_000])
+def test_tasks_only_carry_their_files(n_files):
+    fileuris = [f"file_{i:06}.fits" for i in range(n_files)]
+    striped_array = StripedExternalArray(fileuris, 0, "float32", (1, 128, 128), loader=AstropyFITSLoader,
+                                         basepath=eitdir)
+    with conf.set_temp("chunk_size", "0"):
+        array = striped_array.dask_array
+    sub_array = array[5]
+    culled = sub_array.dask.cull(set(flatten(sub_array.__dask_keys__())))
+    task = dict(culled)[(array.name, 5, 0, 0)]
+
+    pickled = pickle.dumps(task)
+    assert len(pickled) < 2000
+    assert b"file_000006.fits" not in pickled
+    assert pickle.loads(pickled).args[0].value.loaders.spec.basepath == eitdir
+
+
+def test_loader_array_created_on_demand(file_manager, loader_array):
+    assert isinstance(loader_array, LoaderArray)
+    assert loader_array.fileuri_array is file_manager._striped_external_array._fileuri_array
+
+    loader = loader_array[3]
+    assert isinstance(loader, AstropyFITSLoader)
+    assert loader.fileuri == file_manager.filenames[3]
+    assert loader.basepath == file_manager.basepath
+    assert loader.shape == file_manager._striped_external_array.shape
+
+    sub_array = loader_array[2:5]
+    assert isinstance(sub_array, LoaderArray)
+    assert sub_array.shape == (3,)
+    assert [loader.fileuri for loader in sub_array] == list(file_manager.filenames[2:5])
+
+
+def test_loader_array_uses_current_basepath(file_manager, loader_array):
+    file_manager.basepath = "/not/a/real/path"
+    assert loader_array[0].basepath == Path("/not/a/real/path")
+    assert file_manager[1]._striped_external_array.loader_array.flat[0].basepath == Path("/not/a/real/path")
+
+
+@pytest.mark.parametrize(("grid_shape", "n_files", "expected"), [
+    ((10,), 1, ((1,) * 10,)),
+    ((10,), 0, ((1,) * 10,)),
+    ((10,), 4, ((4, 4, 2),)),
+    ((10,), 20, ((10,),)),
+    ((4, 20), 6, ((1, 1, 1, 1), (6, 6, 6, 2))),
+    ((4, 20), 50, ((2, 2), (20,))),
+    ((3, 2, 5), 10, ((1, 1, 1), (2,), (5,))),
+])
+def test_contiguous_chunks(grid_shape, n_files, expected):
+    assert contiguous_chunks(grid_shape, 100, n_files * 100) == expected
+
+
+@pytest.mark.parametrize("chunk_size", ["auto", "0", "200 kB"])
+def test_multi_file_chunks(file_manager, chunk_size):
+    with conf.set_temp("chunk_size", "0"):
+        expected = file_manager._generate_array().compute()
+
+    with conf.set_temp("chunk_size", chunk_size):
+        array = file_manager._generate_array()
+    file_nbytes = 128 * 128 * array.dtype.itemsize
+    if chunk_size == "0":
+        assert array.chunks[0] == (1,) * len(file_manager)
+    elif chunk_size == "auto":
+        assert array.chunks[0] == (len(file_manager),)
+    else:
+        assert max(array.chunks[0]) == 200_000 // file_nbytes
+    assert array.numblocks[1:] == (1, 1)
+    assert_allclose(array.compute(), expected)
+    assert_allclose(array[2:5, 10:20].compute(), expected[2:5, 10:20])
+    assert_allclose(array[::3, 5].compute(), expected[::3, 5])
+
+
+def test_multi_file_chunk_reads_only_needed_files(file_manager, mocker):
+    with conf.set_temp("chunk_size", "1 GiB"):
+        array = file_manager._generate_array()
+    assert array.numblocks == (1, 1, 1)
+
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    array[3:5, 10:20].compute()
+    assert spy.call_count == 2
+    assert {call.args[0].fileuri for call in spy.call_args_list} == set(file_manager.filenames[3:5])
+    assert all(call.args[1][0] == slice(10, 20) for call in spy.call_args_list)
+
+
+def test_split_large_files(file_manager, mocker):
+    with conf.set_temp("chunk_size", "0"):
+        expected = file_manager._generate_array().compute()
+
+    with conf.set_temp("chunk_size", "20 kB"), conf.set_temp("split_large_files", True):
+        array = file_manager._generate_array()
+    row_nbytes = 128 * array.dtype.itemsize
+    assert array.chunks[0] == (1,) * len(file_manager)
+    assert max(array.chunks[1]) == 20_000 // row_nbytes
+    assert array.chunks[2] == (128,)
+    assert_allclose(array.compute(), expected)
+    assert_allclose(array[:, ::-3, 5].compute(), expected[:, ::-3, 5])
+    assert_allclose(array[3, 50:100].compute(), expected[3, 50:100])
+
+    # Only the rows of the one chunk the slice falls in are read
+    rows = array.chunks[1][0]
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    array[3, rows + 1:rows + 5].compute()
+    spy.assert_called_once()
+    assert spy.call_args.args[1][0] == slice(rows + 1, rows + 5, 1)
+
+
+@pytest.mark.parametrize("config", [
+    {},
+    {"chunk_size": "0"},
+    {"chunk_size": "70000"},
+    {"chunk_size": "20 kB", "split_large_files": True},
+    {"decode_processes": 2},
+])
+def test_pixel_time_series(file_manager, config, tmp_path):
+    # Indexing every dimension of the files reads a scalar from each of them
+    expected = np.stack([fits.getdata(eitdir / fileuri) for fileuri in file_manager.filenames])
+    with conf.set_temp("disk_cache_dir", str(tmp_path)), contextlib.ExitStack() as stack:
+        for name, value in config.items():
+            stack.enter_context(conf.set_temp(name, value))
+        array = file_manager._generate_array()
+        assert_allclose(array[2, 5, 7].compute(), expected[2, 5, 7])
+        assert_allclose(array[:, 5, 7].compute(), expected[:, 5, 7])
+
+
+def test_large_files_not_split_by_default(file_manager):
+    with conf.set_temp("chunk_size", "20 kB"):
+        array = file_manager._generate_array()
+    assert array.numblocks == (len(file_manager), 1, 1)
+
+
+def test_generated_array_names_are_deterministic(file_manager):
+    assert file_manager._generate_array().name == file_manager._generate_array().name
+    assert file_manager[2:5]._generate_array().name == file_manager[2:5]._generate_array().name
+    assert file_manager[2:5]._generate_array().name != file_manager[2:6]._generate_array().name
+
+    name = file_manager._generate_array().name
+    with conf.set_temp("chunk_size", "0"):
+        assert file_manager._generate_array().name != name
+
+    file_manager.basepath = "/not/a/real/path"
+    assert file_manager._generate_array().name != name
+
+
+def test_deterministic_names_share_tasks(file_manager, mocker):
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    array1 = file_manager._generate_array()
+    array2 = file_manager._generate_array()
+    da.compute(array1, array2)
+    assert spy.call_count == len(file_manager)
+
+
+def test_cached_array_not_referenced_by_tasks():
+    striped_array = StripedExternalArray(["a.fits", "b.fits"], 0, "float32", (1, 128, 128),
+                                         loader=AstropyFITSLoader, basepath=eitdir)
+    array = striped_array.dask_array
+    container = weakref.ref(striped_array)
+    gc.disable()
+    try:
+        # Without a reference cycle the container is freed as soon as it is deleted
+        del striped_array
+        assert container() is None
+    finally:
+        gc.enable()
+    task = array.dask[(array.name, 0, 0, 0)]
+    assert b"_cached_array" not in pickle.dumps(task)
+
+
+def test_dask_array_cached(file_manager):
+    array = file_manager.dask_array
+    assert file_manager.dask_array is array
+
+    view = file_manager[2:5]
+    assert view.dask_array is view.dask_array
+    assert view.dask_array is not array
+
+    file_manager.basepath = "/not/a/real/path"
+    assert file_manager.dask_array is not array
+    assert np.isnan(file_manager.dask_array).all()
+    assert np.isnan(view.dask_array).all()
+
+    file_manager.basepath = eitdir
+    array = file_manager.dask_array
+    file_manager._striped_external_array.loader = RawFITSLoader
+    assert file_manager.dask_array is not array
+    assert_allclose(file_manager.dask_array, array)
+
+    array = file_manager.dask_array
+    with conf.set_temp("chunk_size", "0"):
+        assert file_manager.dask_array is not array
+
+
+def test_dask_array_name_follows_loader(file_manager):
+    array = file_manager.dask_array
+    file_manager._striped_external_array.loader = RawFITSLoader
+    assert file_manager.dask_array.name != array.name
+
+    array = file_manager.dask_array
+    file_manager._striped_external_array.output_dtype = "float64"
+    assert file_manager.dask_array.name != array.name
+    assert file_manager.dask_array.dtype == np.dtype("float64")
+
+
+def test_chunk_dtype_is_output_dtype(file_manager):
+    file_manager._striped_external_array.output_dtype = "float32"
+    array = file_manager.dask_array
+    task = array.dask[(array.name, *(0,) * array.ndim)]
+    assert task.args[0].value.dtype == np.float32
+    assert array.blocks[0].compute().dtype == np.float32
+
+
+def _bin(data):
+    return data[16:112, 16:112].reshape(48, 2, 48, 2).mean(axis=(1, 3))
+
+
+@pytest.mark.parametrize("chunk_size", ["0", "auto"])
+def test_transformed_array(file_manager, chunk_size, mocker):
+    expected = file_manager.dask_array[:, 16:112, 16:112].reshape(-1, 48, 2, 48, 2).mean(axis=(2, 4)).compute()
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    with conf.set_temp("chunk_size", chunk_size):
+        array = file_manager.transformed_array(_bin, (48, 48), "float32")
+        assert array.name == file_manager.transformed_array(_bin, (48, 48), "float32").name
+        assert array.name != file_manager.transformed_array(_bin, (48, 48), "float64").name
+    assert array.shape == (len(file_manager), 48, 48)
+    assert array.dtype == np.float32
+    assert len(array.dask.layers) == 1
+
+    assert_allclose(array[:, :10, 5].compute(), expected[:, :10, 5], rtol=1e-6)
+    # Each file is read whole, whichever part of the result is needed
+    assert spy.call_count == len(file_manager)
+    assert all(call.args[1] == (slice(None), slice(None)) for call in spy.call_args_list)
+
+
+def test_transformed_array_wrong_shape(file_manager):
+    array = file_manager.transformed_array(_bin, (50, 50), "float64")
+    with pytest.raises(ValueError, match=r"declared to return shape \(50, 50\)"):
+        array[0].compute()
+
+
+def test_transformed_array_single_file(file_manager):
+    array = file_manager[0].transformed_array(_bin, (48, 48), "float64")
+    assert array.shape == (48, 48)
+    assert_allclose(array, _bin(file_manager.dask_array[0].compute()))
@@ -0,0 +1,86 @@
+import shutil
+import tarfile
+from pathlib import Path
+
+import dask
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.data.test import rootdir
+from dkist.io import conf
+from dkist.io.dask import IOOrder
+from dkist.io.dask.loaders import AstropyFITSLoader
+from dkist.io.utils import physical_order
+
+eitdir = Path(rootdir) / "EIT"
+
+
+@pytest.fixture
+def reversed_eit_dataset(eit_dataset, tmp_path):
+    """
+    The EIT dataset with its files written to disk in reverse order.
+    """
+    for fileuri in eit_dataset.files.fileuri_array[::-1]:
+        shutil.copy(eitdir / fileuri, tmp_path / fileuri)
+    eit_dataset.files.basepath = tmp_path
+    return eit_dataset
+
+
+def _inode_order(fileuris, basepath):
+    return sorted(fileuris, key=lambda fileuri: (basepath / fileuri).stat().st_ino)
+
+
+def test_physical_order(reversed_eit_dataset, tmp_path):
+    fileuris = reversed_eit_dataset.files.fileuri_array
+    ranks = physical_order(fileuris, tmp_path)
+    assert ranks.shape == fileuris.shape
+    assert list(fileuris[np.argsort(ranks)]) == _inode_order(fileuris, tmp_path)
+
+
+def test_physical_order_missing_files(tmp_path):
+    (tmp_path / "b.fits").touch()
+    assert physical_order(np.array(["c.fits", "b.fits", "a.fits"]), tmp_path).tolist() == [1, 0, 2]
+    assert physical_order(np.array(["c.fits", "b.fits"]), "https://example.com/data").tolist() == [0, 1]
+
+
+def test_physical_order_tar(eit_dataset, tmp_path):
+    fileuris = eit_dataset.files.fileuri_array
+    with tarfile.open(tmp_path / "EIT.tar", "w") as tar:
+        for fileuri in fileuris[::-1]:
+            tar.add(eitdir / fileuri, arcname=fileuri)
+    assert physical_order(fileuris, tmp_path / "EIT.tar").tolist() == list(range(len(fileuris)))[::-1]
+
+
+def test_io_order_compute(reversed_eit_dataset, tmp_path, mocker):
+    ds = reversed_eit_dataset
+    expected = ds.data.compute()
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    with conf.set_temp("chunk_size", "0"), IOOrder():
+        data = ds.files.dask_array.sum(axis=(1, 2)).compute(scheduler="sync")
+    assert_allclose(data, expected.sum(axis=(1, 2)))
+
+    read = [call.args[0].fileuri for call in spy.call_args_list]
+    assert read == _inode_order(ds.files.fileuri_array, tmp_path)
+
+
+def test_io_order_slice(reversed_eit_dataset, tmp_path, mocker):
+    ds = reversed_eit_dataset
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    with conf.set_temp("chunk_size", "0"), IOOrder():
+        ds.files.dask_array[2:8, :10].compute(scheduler="sync")
+    read = [call.args[0].fileuri for call in spy.call_args_list]
+    assert read == _inode_order(ds.files.fileuri_array[2:8], tmp_path)
+
+
+def test_io_order_priority(reversed_eit_dataset, tmp_path):
+    ds = reversed_eit_dataset
+    with conf.set_temp("chunk_size", "0"):
+        assert all(layer.annotations is None for layer in ds.files.dask_array.dask.layers.values())
+        with conf.set_temp("io_order", True):
+            array = ds.files.dask_array
+    priority = array.dask.layers[array.name].annotations["priority"]
+    keys = sorted(dask.core.flatten(array.__dask_keys__()), key=priority, reverse=True)
+    fileuris = [ds.files.fileuri_array[key[1]] for key in keys]
+    assert fileuris == _inode_order(ds.files.fileuri_array, tmp_path)
+    assert priority(("not-a-layer", 0)) == 0
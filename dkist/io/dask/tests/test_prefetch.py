@@ -0,0 +1,170 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.data.test import rootdir
+from dkist.io import conf
+from dkist.io.dask import prefetch
+from dkist.io.dask.offsets import DataOffsetIndex
+from dkist.io.dask.loaders import AstropyFITSLoader, RawFITSLoader
+from dkist.io.dask.prefetch import Prefetcher
+
+eitdir = Path(rootdir) / "EIT"
+
+
+@pytest.fixture
+def loaders():
+    return [AstropyFITSLoader(path.name, (128, 128), "float64", 0, eitdir)
+            for path in sorted(eitdir.glob("*.fits"))]
+
+
+@pytest.fixture
+def prefetcher(mocker):
+    prefetcher = Prefetcher(max_workers=1)
+    mocker.patch("dkist.io.dask.utils.prefetcher", prefetcher)
+    return prefetcher
+
+
+@pytest.fixture
+def read(mocker):
+    return mocker.patch.object(Prefetcher, "_submit")
+
+
+def test_byte_range(loaders):
+    path, offset, length = loaders[0].byte_range()
+    assert path == eitdir / loaders[0].fileuri
+    assert offset == 0
+    assert length == path.stat().st_size
+
+    loaders[0].fileuri = "missing.fits"
+    assert loaders[0].byte_range() is None
+
+
+@pytest.mark.parametrize("method", ["thread", "fadvise"])
+def test_prefetch(prefetcher, loaders, method, mocker):
+    if method == "fadvise":
+        if not hasattr(os, "posix_fadvise"):
+            pytest.skip("posix_fadvise is not available")
+        read = mocker.spy(os, "posix_fadvise")
+    else:
+        read = mocker.patch.object(prefetcher, "_submit")
+
+    with conf.set_temp("prefetch_method", method):
+        prefetcher.prefetch(loaders[:3])
+        # Files which have already been prefetched are skipped
+        prefetcher.prefetch(loaders[:3])
+
+    assert read.call_count == 3
+    assert prefetcher.pending_bytes == sum(loader.byte_range()[2] for loader in loaders[:3])
+
+
+def test_prefetch_thread_reads_file(loaders, mocker):
+    read = mocker.spy(prefetch, "_read")
+    prefetcher = Prefetcher(max_workers=1)
+    with conf.set_temp("prefetch_method", "thread"):
+        prefetcher.prefetch(loaders[:1])
+    prefetcher._executor.shutdown(wait=True)
+    read.assert_called_once_with(*loaders[0].byte_range())
+
+
+def test_prefetch_memory_budget(prefetcher, read, loaders):
+    sizes = [loader.byte_range()[2] for loader in loaders]
+    with conf.set_temp("prefetch_method", "thread"), conf.set_temp("prefetch_memory", str(max(sizes) * 2)):
+        prefetcher.prefetch(loaders)
+        assert read.call_count == 2
+
+        # Reading a file frees its share of the budget
+        prefetcher.consumed(loaders[0])
+        prefetcher.prefetch(loaders)
+        assert read.call_count == 3
+        assert prefetcher.pending_bytes == sum(sizes[1:3])
+
+
+def test_consumed_releases_skipped_files(prefetcher, read, loaders):
+    with conf.set_temp("prefetch_method", "thread"):
+        prefetcher.prefetch(loaders[:3])
+    prefetcher.consumed(loaders[1])
+    assert prefetcher.pending_bytes == loaders[2].byte_range()[2]
+
+    # Files which were never prefetched are ignored
+    prefetcher.consumed(loaders[5])
+    assert prefetcher.pending_bytes == loaders[2].byte_range()[2]
+
+    prefetcher.clear()
+    assert prefetcher.pending_bytes == 0
+
+
+def test_unread_files_released(prefetcher, read, loaders, mocker):
+    sizes = [loader.byte_range()[2] for loader in loaders]
+    now = mocker.patch("dkist.io.dask.prefetch.time.monotonic", return_value=100.0)
+    with (conf.set_temp("prefetch_method", "thread"), conf.set_temp("prefetch_memory", str(max(sizes) * 2)),
+          conf.set_temp("prefetch_expiry", 10)):
+        # None of these files are ever read
+        prefetcher.prefetch(loaders[:2])
+        prefetcher.prefetch(loaders[2:4])
+        assert read.call_count == 2
+
+        now.return_value = 111.0
+        prefetcher.prefetch(loaders[2:4])
+    assert read.call_count == 4
+    assert prefetcher.pending_bytes == sum(sizes[2:4])
+
+
+def test_prefetch_range(loaders, tmp_path):
+    loader = loaders[0]
+    assert loader.prefetch_range() == loader.byte_range()
+    assert loader.prefetch_range((slice(None), slice(0, 128))) == loader.byte_range()
+    # The bytes astropy reads for part of the file are not known
+    assert loader.prefetch_range((slice(10, 20), slice(None))) is None
+
+    shutil.copy(eitdir / loader.fileuri, tmp_path)
+    raw = RawFITSLoader(loader.fileuri, (128, 128), "float64", 0, tmp_path)
+    assert raw.prefetch_range((slice(10, 20), slice(None))) is None
+    location = DataOffsetIndex.for_basepath(tmp_path).scan(loader.fileuri, 0)
+    assert raw.prefetch_range((slice(10, 20), slice(None))) == (tmp_path / loader.fileuri,
+                                                                location.offset + 10 * 128 * 8, 10 * 128 * 8)
+    assert raw.prefetch_range((5, slice(0, 10))) == (tmp_path / loader.fileuri, location.offset + 5 * 128 * 8, 128 * 8)
+
+
+def test_dataset_prefetch_roi(eit_dataset, prefetcher, read):
+    with (conf.set_temp("chunk_size", "0"), conf.set_temp("prefetch_files", 2),
+          conf.set_temp("prefetch_method", "thread")):
+        eit_dataset.files.dask_array[:3, 10:20].compute()
+    # Whole files are not prefetched for reads of part of each file
+    assert read.call_count == 0
+    assert prefetcher.pending_bytes == 0
+
+
+def test_unknown_method(prefetcher, loaders):
+    with conf.set_temp("prefetch_method", "spam"), pytest.raises(ValueError, match="Unknown prefetch method"):
+        prefetcher.prefetch(loaders)
+
+
+def test_dataset_prefetch(eit_dataset, prefetcher, read, mocker):
+    expected = eit_dataset.data.compute()
+    spy = mocker.spy(prefetcher, "prefetch")
+    with (conf.set_temp("chunk_size", "0"), conf.set_temp("prefetch_files", 2),
+          conf.set_temp("prefetch_method", "thread")):
+        array = eit_dataset.files.dask_array
+        data = [array[i].compute() for i in range(3)]
+
+    assert_allclose(data, expected[:3])
+    fileuris = eit_dataset.files.fileuri_array
+    assert [[loader.fileuri for loader in call.args[0]] for call in spy.call_args_list] == [
+        list(fileuris[1:3]),
+        list(fileuris[2:4]),
+        list(fileuris[3:5]),
+    ]
+    # Only the files which were not read are still pending
+    assert prefetcher.pending_bytes == sum((eitdir / f).stat().st_size for f in fileuris[3:5])
+
+
+def test_dataset_no_prefetch(eit_dataset, prefetcher, mocker):
+    spy = mocker.spy(prefetcher, "prefetch")
+    with conf.set_temp("chunk_size", "0"):
+        eit_dataset.files.dask_array[:3].compute()
+    assert spy.call_count == 0
+    assert prefetcher.pending_bytes == 0
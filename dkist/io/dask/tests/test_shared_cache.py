@@ -0,0 +1,158 @@
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.data.test import rootdir
+from dkist.io import conf
+from dkist.io.dask.loaders import AstropyFITSLoader
+from dkist.io.dask.shared_cache import SharedFrameCache
+
+eitdir = Path(rootdir) / "EIT"
+eitfiles = sorted(path.name for path in eitdir.glob("*.fits"))
+frame_size = 128 * 128 * 8 + 128
+
+
+def _loader(i):
+    return AstropyFITSLoader(eitfiles[i], (128, 128), "float64", 0, eitdir)
+
+
+def _read_in_other_process(directory, i):
+    def read(loader, item):
+        raise AssertionError("The frame should have been read from the cache")
+    cache = SharedFrameCache(directory, maxsize=2**30)
+    data = cache.read(_loader(i), np.s_[:], read)
+    return isinstance(data.base, np.memmap), np.array(data)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedFrameCache(tmp_path, maxsize=2**30)
+
+
+@pytest.fixture
+def read(mocker):
+    return mocker.spy(AstropyFITSLoader, "__getitem__")
+
+
+def test_read(cache, read):
+    expected = _loader(0)[:]
+    read.reset_mock()
+    assert_allclose(cache.read(_loader(0), np.s_[10:20]), expected[10:20])
+    assert read.call_count == 1
+    assert read.call_args.args[1] == (slice(None), slice(None))
+
+    data = cache.read(_loader(0), np.s_[5])
+    assert_allclose(data, expected[5])
+    assert isinstance(data.base, np.memmap)
+    assert read.call_count == 1
+    assert cache.cache_info() == (1, 1, 2**30, frame_size)
+
+
+def test_shared_between_processes(cache):
+    expected = cache.read(_loader(1), np.s_[:])
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        mapped, data = executor.submit(_read_in_other_process, cache.directory, 1).result()
+    assert mapped
+    assert_allclose(data, expected)
+
+
+def test_node_wide_eviction(tmp_path, read):
+    # Two caches on one directory behave like two processes on a node
+    first = SharedFrameCache(tmp_path, maxsize=2 * frame_size)
+    second = SharedFrameCache(tmp_path, maxsize=2 * frame_size)
+    first.read(_loader(0), np.s_[:])
+    first.read(_loader(1), np.s_[:])
+    # Using a frame in one process makes it recently used for all of them
+    second.read(_loader(0), np.s_[:])
+    second.read(_loader(2), np.s_[:])
+    assert read.call_count == 3
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+    assert first.cache_info().currsize == 2 * frame_size
+
+    first.read(_loader(0), np.s_[:])
+    assert read.call_count == 3
+    first.read(_loader(1), np.s_[:])
+    assert read.call_count == 4
+
+    second.resize(frame_size)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    first.clear()
+    assert not list(tmp_path.glob("*.npy"))
+    assert second.cache_info().currsize == 0
+
+
+def test_missing_file_not_cached(cache):
+    loader = _loader(0)
+    loader.basepath = cache.directory
+    assert np.isnan(cache.read(loader, np.s_[:])).all()
+    assert not list(cache.directory.glob("*.npy"))
+
+
+def test_disabled(tmp_path, read):
+    cache = SharedFrameCache(tmp_path)
+    assert cache.maxsize == 0
+    cache.read(_loader(0), np.s_[:10])
+    assert read.call_args.args[1] == np.s_[:10]
+    assert not list(tmp_path.iterdir())
+
+
+def test_dataset_shared_cache(eit_dataset, tmp_path, read, mocker):
+    mocker.patch("dkist.io.dask.utils.shared_frame_cache", SharedFrameCache())
+    expected = eit_dataset.data.compute()
+    read.reset_mock()
+    with conf.set_temp("shared_cache_dir", str(tmp_path)), conf.set_temp("shared_cache_size", "10 MiB"):
+        assert_allclose(eit_dataset.data.compute(), expected)
+        assert_allclose(eit_dataset[1:3].data.compute(), expected[1:3])
+    assert read.call_count == len(eit_dataset.files)
+    assert len(list(tmp_path.glob("*.npy"))) == len(eit_dataset.files)
+
+
+def test_uses_written_in_batches(cache, mocker):
+    cache.read(_loader(0), np.s_[:])
+    cache.read(_loader(1), np.s_[:])
+    used = dict(cache._connect().execute("SELECT name, used FROM frames"))
+    write = mocker.spy(cache, "_write_used")
+    cache.used_interval = 3600
+    for _ in range(3):
+        cache.read(_loader(0), np.s_[:])
+    assert write.call_count == 0
+    assert dict(cache._connect().execute("SELECT name, used FROM frames")) == used
+
+    cache.used_interval = 0
+    cache.read(_loader(1), np.s_[:])
+    assert write.call_count == 1
+    (first, used_first), (second, used_second) = cache._connect().execute("SELECT name, used FROM frames ORDER BY used")
+    assert (used_first, used_second) > (used[first], used[second])
+
+
+def test_unindexed_frames_evicted(tmp_path):
+    cache = SharedFrameCache(tmp_path, maxsize=2 * frame_size)
+    cache.read(_loader(0), np.s_[:])
+    # A frame saved by a process which stopped before adding it to the index
+    orphan = next(tmp_path.glob("*.npy"))
+    orphan.rename(tmp_path / f"orphan{SharedFrameCache.suffix}")
+    cache._connect().execute("DELETE FROM frames")
+
+    cache.read(_loader(1), np.s_[:])
+    cache.read(_loader(2), np.s_[:])
+    assert not (tmp_path / "orphan.npy").exists()
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+    (tmp_path / "orphan.npy").write_bytes(b"0" * 10)
+    cache.clear()
+    assert not list(tmp_path.glob("*.npy"))
+
+
+def test_default_directory(monkeypatch, tmp_path):
+    cache = SharedFrameCache()
+    with conf.set_temp("shared_cache_dir", ""):
+        assert cache.directory.parent == Path("/dev/shm")
+        monkeypatch.setattr(Path, "is_dir", lambda path: False)
+        monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+        assert cache.directory.parent == tmp_path
+    with conf.set_temp("shared_cache_dir", str(tmp_path)):
+        assert cache.directory == tmp_path
@@ -1,58 +1,157 @@
-import uuid
 import warnings
+from numbers import Integral
 
 import dask
 import numpy as np
+from dask.array.core import getter
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph, Layer, MaterializedLayer
+from dask.utils import parse_bytes
 
+from dkist.io import conf
+from dkist.io.utils import physical_order
+from dkist.io.dask.decode import decode_pool
+from dkist.io.dask.loaders import file_cache
+from dkist.io.dask.prefetch import prefetcher
+from dkist.io.dask.ordering import _IOPriority
+from dkist.io.dask.disk_cache import disk_cache
+from dkist.io.dask.shared_cache import shared_frame_cache
 from dkist.utils.exceptions import DKISTDeprecationWarning
 
-__all__ = ["stack_loader_array"]
+try:
+    from dask._task_spec import DataNode, Task
+except ImportError:  # dask < 2025.1.0
+    DataNode = Task = None
 
+__all__ = ["FileTransform", "StripedLoaderLayer", "stack_loader_array"]
 
-def stack_loader_array(loader_array, output_shape, chunksize=None):
+
+class FileTransform:
+    """
+    A function applied to the data of each file as it is read.
+
+    The function is called with the whole data array of a file, in the task
+    which reads it, so the file's data never needs to be held in memory
+    alongside the result. Because the shape and dtype of the result are
+    needed to construct the dask array before any files are read they must be
+    declared up front.
+
+    Parameters
+    ----------
+    func : callable
+        A function taking the data array of one file and returning an array
+        of ``shape`` and ``dtype``. The data of missing files is a read only
+        array of NaN, so ``func`` must not modify its argument in place.
+    shape : tuple[int]
+        The shape of the arrays returned by ``func``.
+    dtype : `numpy.dtype`
+        The dtype of the arrays returned by ``func``.
+    """
+    __slots__ = ["dtype", "func", "shape"]
+
+    def __init__(self, func, shape, dtype):
+        self.func = func
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.func!r}, shape={self.shape}, dtype={self.dtype})"
+
+    def __dask_tokenize__(self):
+        return (type(self).__name__, tokenize(self.func), self.shape, self.dtype.str)
+
+    def __call__(self, data):
+        result = np.asarray(self.func(data))
+        if result.shape != self.shape:
+            raise ValueError(f"{self.func!r} returned an array of shape {result.shape}, "
+                             f"but was declared to return shape {self.shape}.")
+        return result.astype(self.dtype, copy=False)
+
+
+def stack_loader_array(loader_array, output_shape, chunksize=None, *, transform=None):
     """
     Converts an array of loaders to a dask array that loads a chunk from each loader
 
     This results in a dask array with the correct chunks and dimensions.
 
+    Each chunk contains the data from one or more consecutive files, so that
+    chunks are close to ``dkist.io.conf.chunk_size`` bytes. If
+    ``dkist.io.conf.split_large_files`` is `True`, files larger than this are
+    split into several chunks, which are read independently.
+
+    Each chunk is read by calling `dask.array.core.getter` on a `LoaderChunk`,
+    this means that when the array is sliced dask's graph optimisation fuses
+    the slice into the call to the loaders, and only the requested part of
+    each file is read.
+
     Parameters
     ----------
-    loader_array : `dkist.io.loaders.BaseFITSLoader`
+    loader_array : `dkist.io.dask.striped_array.LoaderArray`
         An array of loader objects
     output_shape : tuple[int]
         The intended shape of the final array
     chunksize : tuple[int]
         Can be used to set a chunk size. If not provided, each batch is one chunk
+    transform : `FileTransform`, optional
+        A function applied to the data of each file in the task which reads
+        it. The trailing dimensions of ``output_shape`` are then the shape of
+        the result of the transform, and files are never split.
 
     Returns
     -------
     array : `dask.array.Array`
     """
-    file_shape = loader_array.flat[0].shape
+    first_loader = loader_array.flat[0]
+    file_shape = tuple(first_loader.shape)
+    dtype = first_loader.output_dtype if first_loader.output_dtype is not None else first_loader.dtype
+    output_shape = tuple(output_shape)
+
+    # The trailing dimensions of the output array are the dimensions of each
+    # file, with the first one dropped if it is length one.
+    squeeze = False
+    if transform is not None:
+        file_shape = transform.shape
+        dtype = transform.dtype
+    elif output_shape[len(output_shape) - len(file_shape):] != file_shape:
+        squeeze = True
+        file_shape = file_shape[1:]
+    grid_shape = output_shape[:len(output_shape) - len(file_shape)]
+    loader_array = loader_array.reshape(grid_shape)
+
+    itemsize = np.dtype(dtype).itemsize
+    target_nbytes = chunk_size_bytes()
+    file_nbytes = int(np.prod(file_shape)) * itemsize
+    # Each chunk spans one or more files in the dimensions of the loader
+    # array, and all the pixels in the others, unless large files are split.
+    grid_chunks = contiguous_chunks(grid_shape, file_nbytes, target_nbytes)
+    file_chunks = tuple((s,) for s in file_shape)
+    # Each part of a transformed file would need the whole file to be read and transformed
+    if transform is None and conf.split_large_files and target_nbytes and file_nbytes > target_nbytes:
+        file_chunks = contiguous_chunks(file_shape, itemsize, target_nbytes)
+    chunks = (*grid_chunks, *file_chunks)
 
     # Dask identifies arrays by their name, so the name has to be unique to
-    # this array: if two arrays share a name, combining them into a single
-    # graph (for example stacking two tiles of a mosaic) silently uses one
-    # array's tasks for both.
-    name = f"load_files-{uuid.uuid4().hex}"
-
-    tasks = {}
-    for i, loader in enumerate(loader_array.flat):
-        # The key identifies this chunk's position in the (partially-flattened) final data cube
-        key = (name, i)
-        key += (0,) * len(file_shape)
-        # Each task will be to call _call_loader, with the loader as an argument
-        tasks[key] = (_call_loader, loader)
-
-    dsk = dask.highlevelgraph.HighLevelGraph.from_collections(name, tasks, dependencies=())
-    # Specifies that each chunk occupies a space of 1 pixel in the first dimension, and all the pixels in the others
-    chunks = (*((1,) * loader_array.size,), *((s,) for s in file_shape))
+    # the files this array reads: if two arrays share a name, combining them
+    # into a single graph (for example stacking two tiles of a mosaic)
+    # silently uses one array's tasks for both. Arrays of the same files
+    # share a name, so dask can reuse the results of one for the other.
+    # The loader class, basepath and output dtype are those in effect when the
+    # array is built, which `dkist.io.dask.striped_array.BaseStripedExternalArray.dask_array`
+    # regenerates the array for when they change, as does the file manager of
+    # a dataset for the data of the dataset.
+    name = "load_files-" + tokenize(_fileuri_array(loader_array), type(first_loader), first_loader.target,
+                                    np.dtype(dtype).str, first_loader.output_dtype, first_loader.shape,
+                                    str(first_loader.basepath), chunks, squeeze, transform)
+    annotations = None
+    if conf.io_order:
+        annotations = {"priority": _io_priority(name, loader_array, grid_chunks)}
+    layer = StripedLoaderLayer(name, loader_array, file_shape, chunks=chunks, squeeze=squeeze, transform=transform,
+                               annotations=annotations)
+    dsk = HighLevelGraph.from_collections(name, layer, dependencies=())
     array = dask.array.Array(dsk,
                              name=name,
                              chunks=chunks,
-                             dtype=loader_array.flat[0].dtype)
-    # Now impose the higher dimensions on the data cube
-    array = array.reshape(output_shape)
+                             dtype=dtype)
     if chunksize is not None:
         warnings.warn("Using the dask file loader with a non-default chunksize is deprecated. "
                       "If you see this warning loading an ASDF file please open an issue "
@@ -63,8 +162,368 @@ def stack_loader_array(loader_array, output_shape, chunksize=None):
     return array
 
 
-def _call_loader(loader):
-    data = loader.data
-    # The data needs an extra dimension for the leading index of the intermediate data cube, which has a leading
-    # index for file number
-    return np.expand_dims(data, 0)
+def _fileuri_array(loader_array):
+    """
+    The file uris of an array of loaders.
+    """
+    if hasattr(loader_array, "fileuri_array"):
+        return np.asarray(loader_array.fileuri_array)
+    return np.array([loader.fileuri for loader in np.asarray(loader_array).flat]).reshape(loader_array.shape)
+
+
+def chunk_size_bytes():
+    """
+    The target size of a chunk in bytes, from ``dkist.io.conf.chunk_size``.
+    """
+    chunk_size = str(conf.chunk_size).strip()
+    if chunk_size == "auto":
+        chunk_size = dask.config.get("array.chunk-size")
+    return parse_bytes(chunk_size)
+
+
+def _io_priority(name, loader_array, grid_chunks):
+    """
+    The ``priority`` annotation which runs the blocks of a layer in the physical order of their files.
+    """
+    ranks = physical_order(loader_array.fileuri_array, loader_array.spec.basepath)
+    # Each block is ranked by its first file to be read
+    for axis, chunks in enumerate(grid_chunks):
+        ranks = np.minimum.reduceat(ranks, np.cumsum((0, *chunks[:-1])).astype(int), axis=axis)
+    return _IOPriority(name, ranks)
+
+
+def contiguous_chunks(shape, item_nbytes, target_nbytes):
+    """
+    Choose chunks for an array so that each chunk is contiguous in C order.
+
+    The last dimension is filled first, and a chunk only spans more than one
+    element of a dimension if it spans all of the dimensions after it. For the
+    grid of files this means each chunk is made up of consecutive files, and
+    for the data in a file that each chunk is a contiguous block of it.
+
+    Parameters
+    ----------
+    shape : tuple[int]
+        The shape of the array.
+    item_nbytes : `int`
+        The number of bytes in each element, i.e. each file for the grid of files.
+    target_nbytes : `int`
+        The target number of bytes in each chunk. Each chunk contains at least
+        one element, so if this is smaller than ``item_nbytes`` every element
+        is a separate chunk.
+
+    Returns
+    -------
+    tuple[tuple[int]]
+        The chunks along each dimension, in the format of `dask.array.Array.chunks`.
+    """
+    n_items = max(1, target_nbytes // item_nbytes) if item_nbytes else 1
+    chunks = []
+    for size in reversed(shape):
+        step = max(1, min(size, n_items))
+        n_items = n_items // size if step == size else 1
+        chunks.append((step,) * (size // step) + ((size % step,) if size % step else ()))
+    return tuple(reversed(chunks))
+
+
+class StripedLoaderLayer(Layer):
+    """
+    A graph layer with one task reading each chunk of a striped array.
+
+    The tasks are only generated when they are needed by a computation, so
+    the cost of building, slicing and culling the array does not depend on
+    the number of files.
+
+    Parameters
+    ----------
+    name : `str`
+        The name of the dask array.
+    loader_array : `dkist.io.dask.striped_array.LoaderArray`
+        An array of `dkist.io.dask.loaders.BaseFITSLoader` objects, with the
+        shape of the leading dimensions of the dask array.
+    file_shape : tuple[int]
+        The shape of the data in each file which makes up the trailing
+        dimensions of the dask array.
+    chunks : tuple[tuple[int]], optional
+        The chunks of the dask array, the leading dimensions give the number
+        of files in each chunk and the trailing dimensions the part of each
+        file. Defaults to one file per chunk.
+    squeeze : `bool`
+        If `True` the first dimension of the data in the files is length one
+        and is not included in ``file_shape``.
+    transform : `FileTransform`, optional
+        A function applied to the data of each file as it is read, in which
+        case ``file_shape`` is the shape of its result.
+    """
+
+    def __init__(self, name, loader_array, file_shape, *, chunks=None, squeeze=False, transform=None,
+                 annotations=None):
+        super().__init__(annotations=annotations)
+        self.name = name
+        self.loader_array = loader_array
+        self.file_shape = tuple(file_shape)
+        if chunks is None:
+            chunks = (*((1,) * size for size in loader_array.shape), *((s,) for s in self.file_shape))
+        self.chunks = tuple(tuple(c) for c in chunks)
+        self._offsets = tuple(np.cumsum((0, *c)).tolist() for c in self.chunks)
+        self.squeeze = squeeze
+        self.transform = transform
+
+    def __repr__(self):
+        return (f"{type(self).__name__}<name='{self.name}', files={self.loader_array.shape}, "
+                f"blocks={self.numblocks}>")
+
+    @property
+    def has_legacy_tasks(self):
+        return Task is None
+
+    @property
+    def numblocks(self):
+        return tuple(len(c) for c in self.chunks)
+
+    def _block_index(self, key):
+        """
+        Return the block index of a key, or `None` if the key is not in this layer.
+        """
+        if not isinstance(key, tuple) or len(key) != 1 + len(self.chunks) or key[0] != self.name:
+            return None
+        index = key[1:]
+        if not all(isinstance(i, Integral) and 0 <= i < n for i, n in zip(index, self.numblocks)):
+            return None
+        return index
+
+    def _task(self, key, index):
+        region = tuple(slice(offsets[i], offsets[i + 1]) for i, offsets in zip(index, self._offsets))
+        grid_ndim = self.loader_array.ndim
+        file_offset = None
+        if self.numblocks[grid_ndim:] != (1,) * len(self.file_shape):
+            file_offset = tuple(s.start for s in region[grid_ndim:])
+        # Indexing with () would return a single loader for a single file, rather than an array
+        chunk = LoaderChunk(self.loader_array[region[:grid_ndim] or ...],
+                            tuple(s.stop - s.start for s in region),
+                            file_offset=file_offset,
+                            squeeze=self.squeeze,
+                            transform=self.transform,
+                            prefetch=self._prefetch_loaders(region[:grid_ndim]))
+        return _getter_task(key, chunk, (slice(None),) * len(region))
+
+    def _prefetch_loaders(self, grid_region):
+        """
+        The loaders of the ``dkist.io.conf.prefetch_files`` files after a region of the file grid, in C order.
+        """
+        nfiles = int(conf.prefetch_files)
+        if nfiles <= 0 or not grid_region:
+            return ()
+        last = int(np.ravel_multi_index(tuple(s.stop - 1 for s in grid_region), self.loader_array.shape))
+        flat = self.loader_array.flat
+        return tuple(flat[i] for i in range(last + 1, min(last + 1 + nfiles, self.loader_array.size)))
+
+    def __contains__(self, key):
+        return self._block_index(key) is not None
+
+    def __getitem__(self, key):
+        index = self._block_index(key)
+        if index is None:
+            raise KeyError(key)
+        return self._task(key, index)
+
+    def __iter__(self):
+        for index in np.ndindex(self.numblocks):
+            yield (self.name, *index)
+
+    def __len__(self):
+        return int(np.prod(self.numblocks))
+
+    def is_materialized(self):
+        return False
+
+    def get_output_keys(self):
+        return set(self)
+
+    def cull(self, keys, all_hlg_keys):
+        tasks = {}
+        for key in keys:
+            index = self._block_index(key)
+            if index is not None:
+                tasks[key] = self._task(key, index)
+        return MaterializedLayer(tasks, annotations=self.annotations), {key: set() for key in tasks}
+
+
+def _getter_task(key, chunk, index):
+    """
+    A task which reads ``chunk[index]`` and which dask can fuse later slices into.
+    """
+    if Task is None:
+        return (getter, chunk, index)
+    # Newer versions of dask only fuse slices into a getter if the array is a graph node
+    return Task(key, getter, DataNode(None, chunk), index)
+
+
+class LoaderChunk:
+    """
+    Present a block of loaders as one chunk of the final array.
+
+    The chunk has the dimensions of the block of loaders, followed by the
+    dimensions of the file (without its first dimension if ``squeeze`` is
+    `True`). The chunk may only cover part of each file, starting at
+    ``file_offset``. Indexing this object translates the index into an index
+    into the block of loaders and an index into each file, so that only the
+    requested files, and the requested data in those files, are read.
+
+    Parameters
+    ----------
+    loaders : `dkist.io.dask.striped_array.LoaderArray`
+        The block of loaders to read from.
+    shape : tuple[int]
+        The shape of the chunk.
+    file_offset : tuple[int], optional
+        The index in the file (excluding the first dimension if ``squeeze``
+        is `True`) of the first element of the chunk. If `None` the chunk
+        covers the whole of each file.
+    squeeze : `bool`
+        If `True` the first dimension of the file is length one and is not
+        part of the chunk.
+    transform : `FileTransform`, optional
+        A function applied to the whole data array of each file before it is
+        indexed, in which case the chunk has the dimensions of its result.
+    prefetch : tuple[`dkist.io.dask.loaders.BaseFITSLoader`], optional
+        The loaders of the files expected to be read after this chunk, which
+        are read ahead by `dkist.io.dask.prefetch.prefetcher` when this
+        chunk is read.
+    """
+    __slots__ = ["file_offset", "loaders", "prefetch", "shape", "squeeze", "transform"]
+
+    def __init__(self, loaders, shape, *, file_offset=None, squeeze=False, transform=None, prefetch=()):
+        self.loaders = loaders
+        self.shape = tuple(shape)
+        self.file_offset = file_offset
+        self.squeeze = squeeze
+        self.transform = transform
+        self.prefetch = tuple(prefetch)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} shape: {self.shape} of {self.loaders.size} files>"
+
+    @property
+    def dtype(self):
+        if self.transform is not None:
+            return self.transform.dtype
+        loader = self.loaders.flat[0]
+        return loader.output_dtype if loader.output_dtype is not None else np.dtype(loader.dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __getitem__(self, item):
+        item = item if isinstance(item, tuple) else (item,)
+        if len(item) > self.ndim or not all(isinstance(i, (slice, Integral)) for i in item):
+            # Anything other than basic indexing is applied to the whole chunk
+            return self[()][item]
+
+        item = item + (slice(None),) * (self.ndim - len(item))
+        n_grid = self.loaders.ndim
+        grid_item, file_item = item[:n_grid], item[n_grid:]
+        if self.file_offset is not None:
+            file_item = tuple(_offset_index(i, start, size)
+                              for i, start, size in zip(file_item, self.file_offset, self.shape[n_grid:]))
+        if self.squeeze:
+            file_item = (0, *file_item)
+
+        # Select the loaders with slices so the result is always an array of
+        # loaders, and drop the dimensions indexed with an integer afterwards.
+        grid_slices, drop = [], []
+        for i, size in zip(grid_item, self.loaders.shape):
+            if isinstance(i, slice):
+                grid_slices.append(i)
+                drop.append(slice(None))
+            else:
+                if not -size <= i < size:
+                    raise IndexError(f"index {i} is out of bounds for axis with size {size}")
+                grid_slices.append(slice(i % size, i % size + 1))
+                drop.append(0)
+        loaders = self.loaders[tuple(grid_slices) or ...]
+
+        if self.prefetch:
+            prefetcher.prefetch(self.prefetch, self._prefetch_item(file_item))
+        data = self._read_all([loaders[index] for index in np.ndindex(loaders.shape)], file_item)
+        if isinstance(data, np.ndarray):
+            data = data.reshape(loaders.shape + data.shape[1:])
+        elif len(data) == 1:
+            # A view of the data of a single file, rather than a copy
+            data = data[0].reshape(loaders.shape + data[0].shape)
+        elif data:
+            data = np.stack(data).reshape(loaders.shape + data[0].shape)
+        else:
+            data = np.empty(loaders.shape + self._file_shape(file_item), dtype=self.dtype)
+        return data[(*drop, ...)]
+
+    def _file_shape(self, item):
+        """
+        The shape of ``item`` of the data of each file.
+        """
+        full_shape = self.transform.shape if self.transform is not None else self.loaders.flat[0].shape
+        return np.broadcast_to(np.empty((), dtype=self.dtype), full_shape)[item].shape
+
+    def _read_all(self, loaders, item):
+        """
+        Read ``item`` of each file, returning a list of arrays, or one array stacking them.
+        """
+        if int(conf.decode_processes) > 0:
+            args = [(loader, item, self.transform) for loader in loaders]
+            if len(loaders) > 1:
+                # The worker processes write straight into one array for the whole chunk
+                data = decode_pool.map_into(_read_file, args, self._file_shape(item), self.dtype)
+            else:
+                data = decode_pool.map(_read_file, args)
+            if self.prefetch:
+                for loader in loaders:
+                    prefetcher.consumed(loader, self._prefetch_item(item))
+            return data
+        return [self._read(loader, item) for loader in loaders]
+
+    def _read(self, loader, item):
+        data = _read_file(loader, item, self.transform)
+        if self.prefetch:
+            prefetcher.consumed(loader, self._prefetch_item(item))
+        return data
+
+    def _prefetch_item(self, item):
+        """
+        The part of each file read for ``item`` of the file, which is all of it if it is transformed.
+        """
+        return None if self.transform is not None else item
+
+
+def _read_file(loader, item, transform=None):
+    """
+    Read ``item`` of the data of one file, applying ``transform`` to the whole file first if given.
+
+    The data is always returned as an array, as loaders return a scalar when
+    every dimension of the file is indexed with an integer.
+    """
+    if transform is None:
+        return np.asarray(file_cache.read(loader, item, _read_shared))
+    return np.asarray(transform(file_cache.read(loader, (slice(None),) * len(loader.shape), _read_shared))[item])
+
+
+def _read_shared(loader, item):
+    """
+    Read from the caches shared with other processes, which are checked after the cache of this process.
+    """
+    return shared_frame_cache.read(loader, item, disk_cache.read)
+
+
+def _offset_index(item, start, size):
+    """
+    Convert an index into a length ``size`` part of a dimension which starts
+    at ``start`` into an index into the whole dimension.
+    """
+    if isinstance(item, slice):
+        first, stop, step = item.indices(size)
+        stop = start + stop
+        # A negative step which includes the first element stops before it
+        return slice(start + first, stop if stop >= 0 else None, step)
+    if not -size <= item < size:
+        raise IndexError(f"index {item} is out of bounds for axis with size {size}")
+    return start + item % size
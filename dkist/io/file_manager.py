@@ -8,12 +8,20 @@ import urllib
 from typing import Any
 from pathlib import Path
 from textwrap import dedent
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import dask.array
+import numpy as np
 from parfive import Downloader, Results
 
+from astropy.table import Table
+
 from dkist import log
+from dkist.io.checksums import ChecksumCache, verify_file
+from dkist.io.dask.offsets import DataOffsetIndex, TarDataOffsetIndex
 from dkist.io.dask.striped_array import FileManager, FileManagerProtocol
-from dkist.io.utils import filemanager_info_str
+from dkist.io.statistics import FileStatistics, file_statistics
+from dkist.io.utils import file_presence, filemanager_info_str, is_url
 from dkist.utils.inventory import humanize_inventory, path_format_inventory
 
 __all__ = ["DKISTFileManager"]
@@ -71,7 +79,44 @@ class DKISTFileManager:
 
     @basepath.setter
     def basepath(self, basepath: str | os.PathLike):
-        self._fm.basepath = Path(basepath)
+        # URLs are read with the "remote" loader, and are not paths
+        self._fm.basepath = basepath if is_url(basepath) else Path(basepath)
+        self._regenerate_data()
+
+    @property
+    def loader(self) -> type:
+        """
+        The class used to read the data from the FITS files.
+
+        This can be set to another `~dkist.io.dask.loaders.BaseFITSLoader`
+        subclass, or the name of one registered in
+        `dkist.io.dask.loaders.fits_loaders` (``"astropy"``, ``"raw"``, ``"tar"``,
+        ``"remote"`` or ``"fitsio"``), which is then used by all arrays reading these files,
+        including the data of the dataset.
+        """
+        return self._fm.loader
+
+    @loader.setter
+    def loader(self, loader: type | str):
+        self._fm.loader = loader
+        self._regenerate_data()
+
+    def _regenerate_data(self):
+        """
+        Replace the data of the dataset with a new array reading the files as they are now configured.
+
+        Arrays which have already been generated read the files from the new
+        ``basepath``, with the new ``loader``, but keep their dask name, which
+        was derived from the old ones. Dask assumes arrays with the same name
+        are the same, so the data of the dataset is replaced with an array
+        named after the files it now reads.
+        """
+        # The file managers of tiled datasets set the basepath and loader of each tile
+        if self._ndcube is None or not isinstance(self._fm, FileManager):
+            return
+        data = self._fm._apply_subslice(self._fm.dask_array)
+        # Single files have no file grid dimensions, which a slice of the dataset may keep
+        self._ndcube._data = data.reshape(self._ndcube.data.shape)
 
     def __getattr__(self, attr):
         # We want to proxy a fixed list of public API:
@@ -81,6 +126,7 @@ class DKISTFileManager:
             "output_shape",
             "filenames",
             "dask_array",
+            "transformed_array",
         ]
 
         if attr in proxy_api:
@@ -140,6 +186,209 @@ class DKISTFileManager:
 
         return self._ndcube.meta["inventory"]
 
+    def presence(self) -> np.ndarray:
+        """
+        Which of the FITS files are present in ``.basepath``.
+
+        The directory containing the files is listed once, rather than
+        checking for each file, so this is fast even for datasets with many
+        files.
+
+        Files which `verify` found to be corrupt, and which have not changed
+        since, are not considered present.
+
+        Returns
+        -------
+        presence: `numpy.ndarray`
+            A boolean array with the shape of ``.fileuri_array``, which is
+            `True` for the files which are present.
+        """
+        presence = file_presence(self.fileuri_array, self.basepath)
+        if self.basepath is not None and Path(self.basepath).is_dir():
+            presence &= ~ChecksumCache(self.basepath).corrupt(self.fileuri_array)
+        return presence
+
+    def verify(self, *, max_workers: int | None = None, use_processes: bool = False) -> np.ndarray:
+        """
+        Verify the ``CHECKSUM`` and ``DATASUM`` keywords of the FITS files present in ``.basepath``.
+
+        The result for each file is saved in a sidecar file in ``.basepath``,
+        along with the size and modification time of the file, so files
+        which have not changed since they were last verified are not read
+        again. Corrupt files are then excluded from `presence`.
+
+        Parameters
+        ----------
+        max_workers
+            The number of files to verify in parallel, defaults to the
+            default of `concurrent.futures.ThreadPoolExecutor` or
+            `concurrent.futures.ProcessPoolExecutor`.
+        use_processes
+            If `True` verify the files in a pool of processes rather than
+            threads.
+
+        Returns
+        -------
+        intact: `numpy.ndarray`
+            A boolean array with the shape of ``.fileuri_array``, which is
+            `True` for the files which are present and either have matching
+            checksums or no checksums.
+        """
+        basepath = Path(self.basepath)
+        if not basepath.is_dir():
+            raise ValueError(f"Can only verify files in a local directory, not {self.basepath}.")
+        fileuris = self.fileuri_array
+        presence = file_presence(fileuris, basepath)
+        cache = ChecksumCache(basepath)
+        intact = np.zeros(fileuris.shape, dtype=bool)
+
+        to_verify = []
+        for index in zip(*np.nonzero(presence)):
+            stat = (basepath / fileuris[index]).stat()
+            found, result = cache.lookup(fileuris[index], stat)
+            if found:
+                intact[index] = result is not False
+            else:
+                to_verify.append((index, stat))
+
+        if to_verify:
+            log.info("Verifying the checksums of %s files in %s", len(to_verify), basepath)
+            executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_cls(max_workers) as executor:
+                paths = [basepath / fileuris[index] for index, _ in to_verify]
+                for (index, stat), result in zip(to_verify, executor.map(verify_file, paths)):
+                    if result is False:
+                        log.warning("The checksums of %s do not match, it may be corrupt.", basepath / fileuris[index])
+                    cache.record(fileuris[index], stat, result)
+                    intact[index] = result is not False
+            cache.save()
+        return intact
+
+    def compute_statistics(self, *, max_workers: int | None = None, use_processes: bool = False) -> Table:
+        """
+        Compute summary statistics of the data in each of the FITS files present in ``.basepath``.
+
+        The minimum, maximum, mean, standard deviation, number of NaN values
+        and a set of percentiles of the data in each file are saved in a
+        sidecar file in ``.basepath`` (which by default is the directory
+        containing the ASDF file), along with the size and modification time
+        of the file, so files which have not changed since are not read
+        again. Plotting then uses the saved statistics to set the colour
+        scale without reading any frames, and `statistics` returns them.
+
+        Parameters
+        ----------
+        max_workers
+            The number of files to read in parallel, defaults to the
+            default of `concurrent.futures.ThreadPoolExecutor` or
+            `concurrent.futures.ProcessPoolExecutor`.
+        use_processes
+            If `True` read the files in a pool of processes rather than
+            threads.
+
+        Returns
+        -------
+        statistics: `astropy.table.Table`
+            The statistics of each file, see `statistics`.
+        """
+        basepath = Path(self.basepath)
+        if not basepath.is_dir():
+            raise ValueError(f"Can only compute statistics of files in a local directory, not {self.basepath}.")
+        fileuris = self.fileuri_array
+        presence = self.presence()
+        saved = FileStatistics(basepath)
+        loaders = self._fm._striped_external_array.loader_array
+
+        to_compute = []
+        for index in zip(*np.nonzero(presence)):
+            stat = (basepath / fileuris[index]).stat()
+            if saved.lookup(fileuris[index], stat) is None:
+                to_compute.append((index, stat))
+
+        if to_compute:
+            log.info("Computing the statistics of %s files in %s", len(to_compute), basepath)
+            executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_cls(max_workers) as executor:
+                file_loaders = [loaders[index] for index, _ in to_compute]
+                for (index, stat), result in zip(to_compute, executor.map(file_statistics, file_loaders)):
+                    saved.record(fileuris[index], stat, result)
+            saved.save()
+        return saved.table(fileuris)
+
+    def statistics(self) -> Table:
+        """
+        The summary statistics of each FITS file saved by `compute_statistics`.
+
+        No files are read, so this can be used to plot or filter a dataset
+        before reading any data.
+
+        Returns
+        -------
+        statistics: `astropy.table.Table`
+            A table with one row for each file, in the order of
+            ``.fileuri_array.flat``, and the columns ``fileuri``, ``min``,
+            ``max``, ``mean``, ``std``, ``nan_count`` and ``percentiles``.
+            The statistics other than ``nan_count`` are of the finite values
+            in each file. Each value in the ``percentiles`` column is an
+            array of the values at the percentiles in
+            ``table.meta["percentiles"]``. The rows of files which are
+            missing, or which have changed since their statistics were
+            computed, are masked.
+        """
+        basepath = self.basepath
+        if basepath is None or is_url(basepath) or not Path(basepath).is_dir():
+            # There is nowhere the statistics can be saved
+            basepath = Path(os.devnull)
+        return FileStatistics(basepath).table(self.fileuri_array)
+
+    def present_dask_array(self) -> dask.array.Array:
+        """
+        A dask array of the data in only the FITS files which are present in ``.basepath``.
+
+        The data of the present files are stacked along the first axis, in
+        the order of ``.fileuri_array``, so computations on a partially
+        downloaded dataset can skip the missing files without reading or
+        allocating anything for them. Use `presence` to find which files are
+        included.
+
+        Returns
+        -------
+        array: `dask.array.Array`
+            An array with one more dimension than the data in each file.
+        """
+        presence = self.presence()
+        file_shape = self.shape[1:] if self.shape[0] == 1 else self.shape
+        if not presence.any():
+            return dask.array.empty((0, *file_shape), dtype=self.dask_array.dtype)
+        array = self._fm.select_files(presence).dask_array
+        # A single file is not stacked by the file manager
+        return array[np.newaxis] if presence.sum() == 1 else array
+
+    def build_offset_index(self) -> DataOffsetIndex:
+        """
+        Record where the data are stored in each FITS file, so they can be read without parsing headers.
+
+        The index is saved in a sidecar file in ``.basepath`` (which by
+        default is the directory containing the ASDF file) and is used by
+        `~dkist.io.dask.RawFITSLoader`. Files which have not been downloaded
+        are skipped, so this can be called again after downloading more files.
+
+        If ``.basepath`` is a tar archive containing the files, the location
+        of each file in the archive is also recorded, in a sidecar file next
+        to the archive, for use by `~dkist.io.dask.TarFITSLoader`.
+
+        Returns
+        -------
+        index: `dkist.io.dask.offsets.DataOffsetIndex`
+            The index, which has been saved to ``index.path``.
+        """
+        if self.basepath is None or is_url(self.basepath):
+            raise ValueError(f"Can only index files in a local directory or tar archive, not {self.basepath}.")
+        index_cls = TarDataOffsetIndex if self.basepath.is_file() else DataOffsetIndex
+        index = index_cls.for_basepath(self.basepath)
+        index.build(self.filenames, self._fm.target)
+        return index
+
     def quality_report(
         self,
         path: str | os.PathLike | None = None,
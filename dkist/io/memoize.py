@@ -0,0 +1,215 @@
+"""
+Save the results of computations on datasets, so they are not computed again.
+
+Reductions of a dataset, such as ``ds[0].data.sum(axis=(0, 2))``, read every
+file they depend on each time they are computed, including in every new
+session. `cached_compute` computes dask collections like `dask.compute`, but
+saves every array it computes in a directory, identified by a token of the
+collection's task graph and of the size and modification time of the files
+it reads. Computing the same thing again, in any session, returns the saved
+result without reading any files, unless the files have changed.
+"""
+from pathlib import Path
+
+import dask
+import numpy as np
+import platformdirs
+from dask.base import tokenize
+from dask.core import flatten
+from dask.utils import parse_bytes
+
+from dkist import log
+from dkist.io import conf
+from dkist.io.utils import is_url
+from dkist.io.dask.ordering import _loader_chunk
+from dkist.io.dask.utils import StripedLoaderLayer
+from dkist.io.dask.disk_cache import DiskChunkCache
+
+__all__ = ["ResultCache", "cached_compute", "result_cache"]
+
+
+class ResultCache:
+    """
+    A persistent, size-bounded cache of the results of computing dask collections.
+
+    Results are saved as ``.npy`` files, and the least recently used results
+    are deleted when the total size of the cache exceeds ``maxsize``.
+
+    Parameters
+    ----------
+    directory : `pathlib.Path`, optional
+        The directory the results are saved in. Defaults to
+        ``dkist.io.conf.result_cache_dir``, or a directory in the user cache
+        directory if that option is empty.
+    maxsize : `int`, optional
+        The maximum total size of the saved results, in bytes. Defaults to
+        ``dkist.io.conf.result_cache_size``, which is read every time the
+        cache is used.
+    """
+
+    def __init__(self, directory=None, maxsize=None):
+        self._directory = directory
+        self._maxsize = maxsize
+        self._store = None
+
+    @property
+    def directory(self):
+        """
+        The directory the results are saved in.
+        """
+        if self._directory is not None:
+            return Path(self._directory)
+        directory = str(conf.result_cache_dir)
+        if directory:
+            return Path(directory).expanduser()
+        return Path(platformdirs.user_cache_dir("dkist")) / "results"
+
+    @property
+    def maxsize(self):
+        """
+        The maximum total size of the saved results, in bytes.
+        """
+        if self._maxsize is not None:
+            return self._maxsize
+        return parse_bytes(str(conf.result_cache_size))
+
+    def _entries(self):
+        """
+        The `~dkist.io.dask.disk_cache.DiskChunkCache` which stores the results.
+        """
+        directory, maxsize = self.directory, self.maxsize
+        if self._store is None or (self._store.directory, self._store.maxsize) != (directory, maxsize):
+            self._store = DiskChunkCache(directory, maxsize)
+        return self._store
+
+    @staticmethod
+    def token(collection):
+        """
+        A deterministic token identifying the result of computing ``collection``.
+
+        The token combines the token of the collection, which dask derives
+        from the operations in its task graph and the files, slices and
+        loaders of the datasets it reads, with the size and modification
+        time of each of those files. Only the files read by the tasks needed
+        to compute the collection are included, so a token of a small part of
+        a large dataset is quick to compute. Changing the ``loader`` or
+        ``basepath`` of a dataset changes how arrays which have already been
+        generated read its files, without changing their dask names, so the
+        loader class, basepath and output dtype in effect are included as
+        well.
+        """
+        graph = collection.__dask_graph__()
+        layers = {name: layer for name, layer in graph.layers.items() if isinstance(layer, StripedLoaderLayer)}
+        if not layers:
+            return tokenize(collection, [])
+        # Culling renames the layers, but not the keys of the tasks in them
+        fileuris = {name: set() for name in layers}
+        for culled in graph.cull(set(flatten(collection.__dask_keys__()))).layers.values():
+            for key in culled:
+                if isinstance(key, tuple) and key[0] in layers:
+                    chunk = _loader_chunk(culled[key])
+                    fileuris[key[0]].update(str(fileuri) for fileuri in chunk.loaders.fileuri_array.flat)
+        fingerprints = [_file_fingerprint(layer.loader_array, sorted(fileuris[name]))
+                        for name, layer in layers.items()]
+        return tokenize(collection, fingerprints)
+
+    def compute(self, *collections, **kwargs):
+        """
+        Compute dask collections, returning saved results where they exist.
+
+        This takes the same arguments as `dask.compute`, which is used to
+        compute the collections which are not in the cache, together. Results
+        which are numpy arrays or scalars are saved. Results from the cache
+        are read only memory mapped arrays, or numpy scalars.
+
+        Returns
+        -------
+        `tuple`
+            The result of computing each collection.
+        """
+        store = self._entries()
+        results = list(collections)
+        tokens = {}
+        for i, collection in enumerate(collections):
+            if not dask.is_dask_collection(collection):
+                continue
+            token = self.token(collection)
+            cached = store.get(token + DiskChunkCache.suffix)
+            if cached is None:
+                tokens[i] = token
+                continue
+            log.debug("Using the saved result of %s", token)
+            results[i] = cached[()] if cached.ndim == 0 else cached
+
+        computed = dask.compute(*(collections[i] for i in tokens), **kwargs)
+        for (i, token), result in zip(tokens.items(), computed):
+            results[i] = result
+            # Subclasses, such as masked arrays, can not be saved without losing information
+            if (type(result) is np.ndarray and result.dtype.kind not in "OV") or isinstance(result, np.generic):
+                store.put(token + DiskChunkCache.suffix, result)
+        return tuple(results)
+
+    def clear(self):
+        """
+        Delete all the saved results.
+        """
+        self._entries().clear()
+
+    def cache_info(self):
+        """
+        Return the number of hits and misses in this process, and the current and maximum size in bytes.
+
+        Returns
+        -------
+        `dkist.io.dask.cache.CacheInfo`
+        """
+        return self._entries().cache_info()
+
+
+def _file_fingerprint(loader_array, fileuris):
+    """
+    The loader of a `~dkist.io.dask.striped_array.LoaderArray` and the size and modification time of some of its files.
+
+    Files on a remote server are only identified by their URLs, which are
+    part of the token of the collection.
+    """
+    spec = loader_array.spec
+    basepath = spec.basepath
+    loading = (spec.loader.__module__, spec.loader.__qualname__, str(basepath), str(loader_array.output_dtype))
+    if is_url(basepath):
+        return loading
+    basepath = Path(basepath) if basepath is not None else Path()
+    if basepath.is_file():
+        # A tar archive changes whenever any file in it changes
+        stat = basepath.stat()
+        return loading, stat.st_size, stat.st_mtime_ns
+
+    fingerprint = []
+    for fileuri in fileuris:
+        try:
+            stat = (basepath / fileuri).stat()
+        except OSError:
+            fingerprint.append((fileuri, None))
+        else:
+            fingerprint.append((fileuri, stat.st_size, stat.st_mtime_ns))
+    return loading, fingerprint
+
+
+result_cache = ResultCache()
+"""
+The `ResultCache` used by `cached_compute`.
+"""
+
+
+def cached_compute(*collections, **kwargs):
+    """
+    Compute dask collections like `dask.compute`, reusing the results of earlier identical computations.
+
+    The results are saved in `result_cache`, see `ResultCache.compute`.
+
+    Examples
+    --------
+    >>> from dkist.io import cached_compute
+    >>> spectrum, = cached_compute(ds[0].data.sum(axis=(0, 2)))  # doctest: +SKIP
+    """
+    return result_cache.compute(*collections, **kwargs)
@@ -0,0 +1,224 @@
+"""
+Summary statistics of the data in each FITS file.
+
+Working out the display limits of a dataset, or finding frames with missing
+data, means reading every frame. The statistics of the data in each file are
+instead computed once and saved in a table in a sidecar file next to the
+FITS files, along with the size and modification time of each file, so they
+can be used without reading any frames until the files change.
+"""
+import os
+import functools
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from astropy.table import MaskedColumn, Table
+
+from dkist import log
+
+__all__ = ["PERCENTILES", "FileStatistics", "data_limits", "file_statistics"]
+
+PERCENTILES = (0, 0.1, 0.5, 1, 2, 5, 10, 25, 50, 75, 90, 95, 98, 99, 99.5, 99.9, 100)
+"""
+The percentiles of the data in each file which are saved as a sketch of its distribution.
+"""
+
+_COLUMNS = ("min", "max", "mean", "std", "nan_count", "percentiles")
+
+
+def file_statistics(loader):
+    """
+    Compute summary statistics of all the data read by a loader.
+
+    The statistics other than the number of NaN values are computed over
+    the finite values in the data.
+
+    Parameters
+    ----------
+    loader : `dkist.io.dask.loaders.BaseFITSLoader`
+        The loader of the file.
+
+    Returns
+    -------
+    `tuple`
+        ``(min, max, mean, std, nan_count, percentiles)``, where
+        ``percentiles`` is a tuple of the values at each of `PERCENTILES`.
+        All but ``nan_count`` are NaN if the file has no finite values.
+    """
+    data = np.asarray(loader[(slice(None),) * len(loader.shape)], dtype=float)
+    nan_count = int(np.isnan(data).sum())
+    finite = data[np.isfinite(data)]
+    if not finite.size:
+        return (np.nan,) * 4 + (nan_count, (np.nan,) * len(PERCENTILES))
+    percentiles = np.percentile(finite, PERCENTILES)
+    return (float(finite.min()), float(finite.max()), float(finite.mean()), float(finite.std()),
+            nan_count, tuple(float(p) for p in percentiles))
+
+
+class FileStatistics:
+    """
+    The summary statistics of the FITS files in a directory.
+
+    Parameters
+    ----------
+    basepath : `pathlib.Path`
+        The directory containing the FITS files, where the statistics are saved.
+    """
+    filename = "dkist_statistics.ecsv"
+
+    def __init__(self, basepath):
+        self.basepath = Path(basepath)
+        self._lock = threading.Lock()
+        self._results = {}
+        self._dirty = False
+        if self.path.exists():
+            self._load()
+
+    @property
+    def path(self):
+        """
+        The path of the sidecar file the statistics are saved to.
+        """
+        return self.basepath / self.filename
+
+    def __len__(self):
+        return len(self._results)
+
+    def _load(self):
+        try:
+            stat = self.path.stat()
+            self._results = dict(_read_sidecar(self.path, stat.st_size, stat.st_mtime_ns))
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Could not read the file statistics %s: %s", self.path, e)
+
+    def save(self):
+        """
+        Write the statistics to their sidecar file, if they have changed.
+        """
+        if not self._dirty:
+            return
+        with self._lock:
+            results = dict(self._results)
+            self._dirty = False
+        rows = list(results.values())
+        table = Table({
+            "fileuri": list(results),
+            "size": [row[0] for row in rows],
+            "mtime_ns": [row[1] for row in rows],
+            **{name: [row[2][i] for row in rows] for i, name in enumerate(_COLUMNS)},
+        }, meta={"percentiles": list(PERCENTILES)})
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        table.write(tmp_path, format="ascii.ecsv", overwrite=True)
+        tmp_path.replace(self.path)
+
+    def lookup(self, fileuri, stat):
+        """
+        Return the statistics of a file, if it has not changed since they were computed.
+
+        Returns
+        -------
+        `tuple` or `None`
+            The return value of `file_statistics`, or `None` if the
+            statistics of the file have not been computed or it has changed
+            since.
+        """
+        cached = self._results.get(str(fileuri))
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return cached[2]
+
+    def record(self, fileuri, stat, statistics):
+        """
+        Record the statistics of a file with the given `os.stat_result`.
+        """
+        with self._lock:
+            self._results[str(fileuri)] = (stat.st_size, stat.st_mtime_ns, statistics)
+            self._dirty = True
+
+    def table(self, fileuri_array):
+        """
+        A table of the statistics of each file, in the order of ``fileuri_array.flat``.
+
+        The rows of files which are missing, or whose statistics have not
+        been computed since they last changed, are masked.
+
+        Returns
+        -------
+        `astropy.table.Table`
+            A table with the columns ``fileuri``, ``min``, ``max``, ``mean``,
+            ``std``, ``nan_count`` and ``percentiles``. The percentiles each
+            value of the ``percentiles`` column is at are listed in
+            ``table.meta["percentiles"]``.
+        """
+        fileuris = [str(fileuri) for fileuri in np.asarray(fileuri_array).flat]
+        values = np.full((len(fileuris), 4), np.nan)
+        nan_counts = np.zeros(len(fileuris), dtype=int)
+        percentiles = np.full((len(fileuris), len(PERCENTILES)), np.nan)
+        mask = np.ones(len(fileuris), dtype=bool)
+        for i, fileuri in enumerate(fileuris):
+            if fileuri not in self._results:
+                continue
+            try:
+                stat = (self.basepath / fileuri).stat()
+            except OSError:
+                continue
+            statistics = self.lookup(fileuri, stat)
+            if statistics is None:
+                continue
+            values[i] = statistics[:4]
+            nan_counts[i] = statistics[4]
+            percentiles[i] = statistics[5]
+            mask[i] = False
+
+        columns = {"fileuri": fileuris}
+        for i, name in enumerate(_COLUMNS[:4]):
+            columns[name] = MaskedColumn(values[:, i], mask=mask)
+        columns["nan_count"] = MaskedColumn(nan_counts, mask=mask)
+        columns["percentiles"] = MaskedColumn(percentiles, mask=np.repeat(mask[:, np.newaxis], len(PERCENTILES), axis=1))
+        return Table(columns, meta={"percentiles": list(PERCENTILES)})
+
+
+@functools.lru_cache(maxsize=4)
+def _read_sidecar(path, size, mtime_ns):
+    """
+    Read a sidecar file, which is cached until it changes as plotting reads it for every tile of a dataset.
+    """
+    table = Table.read(path, format="ascii.ecsv")
+    results = {}
+    for row in table:
+        statistics = (*(float(row[name]) for name in _COLUMNS[:4]),
+                      int(row["nan_count"]), tuple(float(p) for p in row["percentiles"]))
+        results[str(row["fileuri"])] = (int(row["size"]), int(row["mtime_ns"]), statistics)
+    return results
+
+
+def data_limits(file_managers):
+    """
+    The minimum and maximum finite values in the files of some file managers, from their saved statistics.
+
+    Parameters
+    ----------
+    file_managers : iterable[`dkist.io.DKISTFileManager`]
+        The file managers of the datasets.
+
+    Returns
+    -------
+    `tuple` or `None`
+        ``(vmin, vmax)``, or `None` if the statistics of any of the files
+        are not known, or none of the files have any finite values.
+    """
+    vmin, vmax = np.inf, -np.inf
+    for file_manager in file_managers:
+        table = file_manager.statistics()
+        if np.ma.is_masked(table["min"]):
+            return None
+        mins, maxs = np.asarray(table["min"]), np.asarray(table["max"])
+        if not len(table) or np.isnan(mins).all():
+            continue
+        vmin = min(vmin, np.nanmin(mins))
+        vmax = max(vmax, np.nanmax(maxs))
+    if vmin > vmax:
+        return None
+    return float(vmin), float(vmax)
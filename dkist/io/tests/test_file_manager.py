@@ -1,12 +1,21 @@
+import os
 import logging
 from pathlib import Path
 
+import dask.array as da
 import globus_sdk
 import numpy as np
 import pytest
+from numpy.testing import assert_allclose
 from packaging.version import Version
 
-from dkist import net
+from astropy.io import fits
+
+from dkist import load_dataset, net
+from dkist.data.test import rootdir
+from dkist.io import checksums
+from dkist.io.checksums import ChecksumCache
+from dkist.io.statistics import PERCENTILES, FileStatistics
 from dkist.net import conf
 
 
@@ -262,6 +271,30 @@ def test_tiled_file_manager_basepath_setter(simple_tiled_dataset):
     assert (new_basepaths == Path("/some_new_path/")).all()
 
 
+def test_basepath_change_renames_data(tmp_path):
+    ds1 = load_dataset(rootdir / "EIT")
+    ds2 = load_dataset(rootdir / "EIT")
+    sliced = ds2[2:5, 10]
+    assert ds1.data.name == ds2.data.name
+    for fileuri in ds2.files.filenames:
+        with fits.open(rootdir / "EIT" / fileuri) as hdul:
+            hdul[0].data = hdul[0].data + 1
+            hdul.writeto(tmp_path / fileuri)
+
+    # Arrays reading different files must not share a name, or dask uses the tasks of one for both
+    ds2.files.basepath = tmp_path
+    sliced.files.basepath = tmp_path
+    assert ds1.data.name != ds2.data.name
+    stacked = da.stack([ds1.data, ds2.data]).compute()
+    assert_allclose(stacked[1], stacked[0] + 1)
+    assert_allclose(sliced.data.compute(), stacked[1, 2:5, 10])
+
+    name = ds2.data.name
+    ds2.files.loader = "raw"
+    assert ds2.data.name != name
+    assert_allclose(ds2.data.compute(), stacked[1])
+
+
 def test_tiled_file_manager_download(large_tiled_dataset, orchestrate_transfer_mock, mock_inventory_refresh):
     ds = large_tiled_dataset
     base_path = Path(net.conf.dataset_path.format(**ds.meta["inventory"]))
@@ -302,3 +335,175 @@ def test_tiled_dataset_file_manager_repr(large_tiled_dataset):
                 assert (large_tiled_dataset.files.fileuri_array[r, c] == "").all()
             else:
                 assert (tile.files.fileuri_array == large_tiled_dataset.files.fileuri_array[r, c]).all()
+
+
+@pytest.fixture
+def partial_eit_dataset(eit_dataset, tmp_path):
+    eitdir = Path(eit_dataset.files.basepath)
+    for fileuri in eit_dataset.files.filenames[::2]:
+        (tmp_path / fileuri).write_bytes((eitdir / fileuri).read_bytes())
+    expected = eit_dataset.data.compute()
+    eit_dataset.files.basepath = tmp_path
+    return eit_dataset, expected
+
+
+def test_presence(partial_eit_dataset, mocker):
+    ds, _ = partial_eit_dataset
+    scandir = mocker.spy(os, "scandir")
+    presence = ds.files.presence()
+    assert scandir.call_count == 1
+    assert presence.shape == ds.files.fileuri_array.shape
+    assert presence.tolist() == [i % 2 == 0 for i in range(len(ds.files))]
+    assert ds[1:4].files.presence().tolist() == [False, True, False]
+
+
+def test_presence_missing_basepath(eit_dataset, tmp_path):
+    eit_dataset.files.basepath = tmp_path / "missing"
+    assert not eit_dataset.files.presence().any()
+
+
+def test_presence_url(eit_dataset):
+    eit_dataset.files.basepath = "https://example.com/data/"
+    with pytest.raises(ValueError, match="remote server"):
+        eit_dataset.files.presence()
+
+
+def test_present_dask_array(partial_eit_dataset):
+    ds, expected = partial_eit_dataset
+    array = ds.files.present_dask_array()
+    assert array.shape == (6, 128, 128)
+    np.testing.assert_allclose(array.compute(), expected[::2])
+    np.testing.assert_allclose(array.mean(axis=0).compute(), expected[::2].mean(axis=0))
+
+    array = ds[1:4].files.present_dask_array()
+    assert array.shape == (1, 128, 128)
+    np.testing.assert_allclose(array.compute(), expected[2:3])
+
+
+def test_present_dask_array_no_files(eit_dataset, tmp_path):
+    eit_dataset.files.basepath = tmp_path
+    array = eit_dataset.files.present_dask_array()
+    assert array.shape == (0, 128, 128)
+    assert array.dtype == eit_dataset.data.dtype
+
+
+@pytest.fixture
+def checksummed_eit_dataset(eit_dataset, tmp_path):
+    eitdir = Path(eit_dataset.files.basepath)
+    for fileuri in eit_dataset.files.filenames:
+        with fits.open(eitdir / fileuri) as hdul:
+            hdul.writeto(tmp_path / fileuri, checksum=True)
+    eit_dataset.files.basepath = tmp_path
+    return eit_dataset
+
+
+def _corrupt(path):
+    with open(path, "r+b") as fobj:
+        fobj.seek(-100, os.SEEK_END)
+        fobj.write(b"\x01" * 8)
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_verify(checksummed_eit_dataset, tmp_path, use_processes):
+    files = checksummed_eit_dataset.files
+    _corrupt(tmp_path / files.filenames[3])
+    (tmp_path / files.filenames[5]).unlink()
+
+    intact = files.verify(max_workers=2, use_processes=use_processes)
+    expected = [i not in (3, 5) for i in range(len(files))]
+    assert intact.tolist() == expected
+    assert files.presence().tolist() == expected
+    assert (tmp_path / ChecksumCache.filename).exists()
+
+
+def test_verify_cached(checksummed_eit_dataset, tmp_path, mocker):
+    files = checksummed_eit_dataset.files
+    files.verify()
+    verify_file = mocker.patch("dkist.io.file_manager.verify_file", side_effect=checksums.verify_file)
+    assert files.verify().all()
+    assert verify_file.call_count == 0
+
+    # Changed files are verified again
+    _corrupt(tmp_path / files.filenames[0])
+    assert files.verify().tolist() == [i != 0 for i in range(len(files))]
+    assert verify_file.call_count == 1
+    assert not files.presence()[0]
+
+    # And are present again once they have been replaced
+    with fits.open(Path(rootdir) / "EIT" / files.filenames[0]) as hdul:
+        hdul.writeto(tmp_path / files.filenames[0], checksum=True, overwrite=True)
+    assert files.presence().all()
+
+
+def test_verify_file(tmp_path):
+    fits.PrimaryHDU(np.arange(100.)).writeto(tmp_path / "checksum.fits", checksum=True)
+    fits.PrimaryHDU(np.arange(100.)).writeto(tmp_path / "no_checksum.fits")
+    assert checksums.verify_file(tmp_path / "checksum.fits") is True
+    assert checksums.verify_file(tmp_path / "no_checksum.fits") is None
+
+    data = (tmp_path / "checksum.fits").read_bytes()
+    (tmp_path / "truncated.fits").write_bytes(data[:len(data) // 2])
+    assert checksums.verify_file(tmp_path / "truncated.fits") is False
+
+
+def test_verify_url(eit_dataset):
+    eit_dataset.files.basepath = "https://example.com/data/"
+    with pytest.raises(ValueError, match="local directory"):
+        eit_dataset.files.verify()
+
+
+@pytest.fixture
+def local_eit_dataset(eit_dataset, tmp_path):
+    eitdir = Path(eit_dataset.files.basepath)
+    for fileuri in eit_dataset.files.filenames:
+        (tmp_path / fileuri).write_bytes((eitdir / fileuri).read_bytes())
+    eit_dataset.files.basepath = tmp_path
+    return eit_dataset
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_compute_statistics(local_eit_dataset, tmp_path, use_processes):
+    files = local_eit_dataset.files
+    (tmp_path / files.filenames[5]).unlink()
+
+    stats = files.compute_statistics(max_workers=2, use_processes=use_processes)
+    assert (tmp_path / FileStatistics.filename).exists()
+    assert stats["fileuri"].tolist() == files.filenames
+    assert stats["min"].mask.tolist() == [i == 5 for i in range(len(files))]
+
+    data = local_eit_dataset.data[0].compute()
+    assert stats["min"][0] == np.nanmin(data)
+    assert stats["max"][0] == np.nanmax(data)
+    assert np.isclose(stats["mean"][0], np.nanmean(data))
+    assert np.isclose(stats["std"][0], np.nanstd(data))
+    assert stats["nan_count"][0] == np.isnan(data).sum()
+    assert stats.meta["percentiles"] == list(PERCENTILES)
+    assert np.allclose(stats["percentiles"][0], np.nanpercentile(data, PERCENTILES))
+
+
+def test_statistics_saved(local_eit_dataset, tmp_path, mocker):
+    files = local_eit_dataset.files
+    assert files.statistics()["min"].mask.all()
+    expected = files.compute_statistics()
+
+    file_statistics = mocker.patch("dkist.io.file_manager.file_statistics")
+    stats = local_eit_dataset.files.statistics()
+    assert np.all(stats["max"] == expected["max"])
+    assert np.all(files.compute_statistics()["max"] == expected["max"])
+    assert file_statistics.call_count == 0
+
+    # Changed files are read again, and their statistics are not used until they are
+    path = tmp_path / files.filenames[0]
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert files.statistics()["min"].mask.tolist() == [i == 0 for i in range(len(files))]
+
+    # Statistics of a slice of the dataset are of the files in the slice
+    assert local_eit_dataset[3:5].files.statistics()["fileuri"].tolist() == files.filenames[3:5]
+
+
+def test_statistics_url(eit_dataset):
+    eit_dataset.files.basepath = "https://example.com/data/"
+    assert eit_dataset.files.statistics()["min"].mask.all()
+    with pytest.raises(ValueError, match="local directory"):
+        eit_dataset.files.compute_statistics()
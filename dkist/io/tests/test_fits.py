@@ -1,4 +1,8 @@
+import sys
+import shutil
+import tarfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pytest
@@ -6,8 +10,25 @@ from numpy.testing import assert_allclose
 
 import asdf
 
+from astropy.io import fits
+
 from dkist.data.test import rootdir
-from dkist.io.dask.loaders import AstropyFITSLoader
+from dkist.io import conf
+from dkist.io.dask.loaders import (
+    AstropyFITSLoader,
+    FITSFilePool,
+    FileCache,
+    FitsioFITSLoader,
+    RawFITSLoader,
+    RemoteFITSFilePool,
+    RemoteFITSLoader,
+    TarFITSLoader,
+    TileCache,
+    fits_loaders,
+    get_fits_loader,
+    register_fits_loader,
+)
+from dkist.io.dask.offsets import DataOffsetIndex, TarDataOffsetIndex
 from dkist.io.dask.striped_array import FileManager
 
 eitdir = Path(rootdir) / "EIT"
@@ -83,8 +104,576 @@ def test_nan(relative_ac, tmpdir):
     array = relative_ac._generate_array()
     assert_allclose(array[10:20, :], np.nan)
 
+def test_missing_data(relative_ac, relative_ear, tmpdir):
+    fl = AstropyFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, tmpdir)
+    data = fl[10:20]
+    assert data.shape == (10, 128)
+    assert np.isnan(data).all()
+    assert data.flags.writeable
+
+    fl = AstropyFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, tmpdir,
+                           output_dtype="float32")
+    assert fl[10].dtype == np.float32
+    assert np.isnan(fl[10]).all()
+
+    relative_ac.basepath = tmpdir
+    chunk = relative_ac._generate_array()[0].compute()
+    assert np.isnan(chunk).all()
+    assert chunk.flags.writeable
+
+
+@pytest.mark.parametrize("dtype", ["int16", ">i4", "uint8", "bool"])
+def test_integer_output_dtype(relative_ac, relative_ear, dtype):
+    with pytest.raises(ValueError, match="floating point or complex"):
+        AstropyFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target,
+                          None, output_dtype=dtype)
+    with pytest.raises(ValueError, match="floating point or complex"):
+        relative_ac.output_dtype = dtype
+
+
 def test_slicing(absolute_fl):
     aslice = np.s_[10:20, 10:20]
     sarr = absolute_fl[aslice]
 
     assert_allclose(sarr, absolute_fl.data[aslice])
+
+
+@pytest.fixture
+def file_pool(mocker):
+    pool = FITSFilePool(maxsize=2)
+    mocker.patch("dkist.io.dask.loaders.fits_file_pool", pool)
+    mocker.patch("dkist.io.dask.striped_array.fits_file_pool", pool)
+    yield pool
+    pool.invalidate()
+
+
+def test_file_pool_reuse(file_pool, absolute_fl):
+    absolute_fl[0:10]
+    absolute_fl[10:20]
+    info = file_pool.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+    assert info.currsize == 1
+
+
+def test_file_pool_maxsize(file_pool):
+    paths = sorted(eitdir.glob("*.fits"))[:3]
+    for path in paths:
+        with file_pool.open(path) as hdul:
+            hdul[0].section[0]
+
+    assert file_pool.cache_info().currsize == 2
+
+    with file_pool.open(paths[0]) as hdul:
+        pass
+    assert file_pool.cache_info().hits == 0
+
+
+def test_file_pool_zero_size(absolute_ear):
+    pool = FITSFilePool(maxsize=0)
+    with pool.open(absolute_ear.fileuri) as hdul:
+        pass
+    assert hdul._file.closed
+    assert pool.cache_info().currsize == 0
+
+
+def test_file_pool_invalidate_on_basepath(file_pool, relative_ac, relative_fl, tmpdir):
+    relative_fl[0:10]
+    assert file_pool.cache_info().currsize == 1
+
+    relative_ac.basepath = tmpdir
+    assert file_pool.cache_info().currsize == 0
+
+
+def test_file_pool_threads(file_pool, absolute_fl):
+    expected = absolute_fl.data
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda i: absolute_fl[i], range(128)))
+    assert_allclose(np.array(results), expected)
+
+
+@pytest.fixture
+def eit_copy(tmp_path):
+    for path in eitdir.glob("*.fits"):
+        shutil.copy(path, tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def raw_fl(eit_copy, relative_ear):
+    return RawFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, eit_copy)
+
+
+@pytest.mark.parametrize("aslice", [
+    np.s_[:],
+    np.s_[10:20, 10:20],
+    np.s_[5],
+    np.s_[-1, ::2],
+    np.s_[::3],
+    np.s_[..., 5],
+    np.s_[[1, 5, 2]],
+    np.s_[200:300],
+])
+def test_raw_loader(raw_fl, absolute_fl, aslice):
+    assert_allclose(raw_fl[aslice], absolute_fl[aslice])
+
+
+def test_raw_loader_out_of_bounds(raw_fl):
+    with pytest.raises(IndexError):
+        raw_fl[128]
+
+
+def test_raw_loader_missing(raw_fl, tmp_path):
+    raw_fl.basepath = tmp_path / "missing"
+    assert np.isnan(raw_fl.data).all()
+
+
+def test_raw_loader_file_changed(raw_fl, eit_copy):
+    raw_fl.data
+    index = DataOffsetIndex.for_basepath(eit_copy)
+    location = index.lookup(raw_fl.fileuri, 0)
+
+    # Replace the file with one with a longer header so the data moves
+    with fits.open(eit_copy / raw_fl.fileuri) as hdul:
+        for _ in range(100):
+            hdul[0].header.add_comment("padding")
+        hdul[0].data = hdul[0].data + 1
+        hdul.writeto(eit_copy / raw_fl.fileuri, overwrite=True)
+
+    assert index.lookup(raw_fl.fileuri, 0) == location
+    with fits.open(eit_copy / raw_fl.fileuri) as hdul:
+        assert_allclose(raw_fl.data, hdul[0].data)
+    assert index.lookup(raw_fl.fileuri, 0).offset > location.offset
+
+
+def test_offset_index_persisted(eit_dataset, eit_copy):
+    eit_dataset.files.basepath = eit_copy
+    index = eit_dataset.files.build_offset_index()
+    assert index.path == eit_copy / DataOffsetIndex.filename
+    assert index.path.exists()
+    assert len(index) == len(eit_dataset.files)
+
+    new_index = DataOffsetIndex(eit_copy)
+    for fileuri in eit_dataset.files.filenames:
+        location = new_index.lookup(fileuri, 0)
+        assert location == index.lookup(fileuri, 0)
+        assert location.dtype == ">f8"
+        assert location.shape == (128, 128)
+
+
+def test_offset_index_no_basepath(eit_dataset):
+    eit_dataset.files._fm.basepath = None
+    with pytest.raises(ValueError, match="local directory or tar archive"):
+        eit_dataset.files.build_offset_index()
+
+
+@pytest.fixture
+def compressed_data(tmp_path):
+    data = np.arange(100 * 70, dtype=np.int32).reshape(100, 70)
+    hdu = fits.CompImageHDU(data, compression_type="RICE_1", tile_shape=(16, 32))
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(tmp_path / "compressed.fits")
+    return data
+
+
+@pytest.fixture
+def compressed_fl(compressed_data, tmp_path):
+    return AstropyFITSLoader("compressed.fits", compressed_data.shape, "int32", 1, tmp_path)
+
+
+@pytest.fixture
+def tile_cache(mocker):
+    cache = TileCache(maxsize=2**20)
+    mocker.patch("dkist.io.dask.loaders.tile_cache", cache)
+    return cache
+
+
+@pytest.mark.parametrize("aslice", [
+    np.s_[:],
+    np.s_[10:20, 10:40],
+    np.s_[5],
+    np.s_[-1, ::3],
+    np.s_[::-7, 50:2:-5],
+    np.s_[..., 5],
+    np.s_[[1, 5, 2]],
+    np.s_[200:300],
+])
+def test_compressed_loader(tile_cache, compressed_fl, compressed_data, aslice):
+    assert_allclose(compressed_fl[aslice], compressed_data[aslice])
+
+
+def test_compressed_loader_only_decompresses_overlapping_tiles(tile_cache, compressed_fl, compressed_data):
+    assert_allclose(compressed_fl[10:20, 30:40], compressed_data[10:20, 30:40])
+    # Rows 10-19 are in the first and second row of tiles, columns 30-39 in the first and second column
+    info = tile_cache.cache_info()
+    assert info.misses == 4
+    assert info.hits == 0
+    assert info.currsize == 4 * 16 * 32 * 4
+
+    assert_allclose(compressed_fl[0:16, 0:32], compressed_data[0:16, 0:32])
+    info = tile_cache.cache_info()
+    assert info.misses == 4
+    assert info.hits == 1
+
+
+def test_raw_loader_compressed_image(tile_cache, compressed_data, tmp_path):
+    fl = RawFITSLoader("compressed.fits", compressed_data.shape, "int32", 1, tmp_path)
+    assert_allclose(fl[10:20, 30:40], compressed_data[10:20, 30:40])
+    assert DataOffsetIndex.for_basepath(tmp_path).lookup("compressed.fits", 1) is None
+
+
+def test_tile_cache_maxsize(compressed_fl, compressed_data, mocker):
+    cache = TileCache(maxsize=2 * 16 * 32 * 4)
+    mocker.patch("dkist.io.dask.loaders.tile_cache", cache)
+    assert_allclose(compressed_fl.data, compressed_data)
+    assert cache.cache_info().currsize <= cache.maxsize
+    assert 0 < len(cache._tiles) < 7 * 3
+
+
+@pytest.fixture
+def file_cache(mocker):
+    cache = FileCache(maxsize=2**22)
+    mocker.patch("dkist.io.dask.striped_array.file_cache", cache)
+    mocker.patch("dkist.io.dask.utils.file_cache", cache)
+    return cache
+
+
+def test_file_cache(file_cache, absolute_fl, mocker):
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    assert_allclose(file_cache.read(absolute_fl, np.s_[10:20]), absolute_fl[10:20])
+    data = file_cache.read(absolute_fl, np.s_[5])
+    assert_allclose(data, absolute_fl[5])
+    assert not data.flags.writeable
+
+    # The whole file was read once, and then reused
+    assert spy.call_args_list[0].args[1] == (slice(None), slice(None))
+    assert spy.call_count == 3
+    assert file_cache.cache_info() == (1, 1, 2**22, 128 * 128 * 8)
+
+    file_cache.resize(128 * 128 * 8 - 1)
+    assert file_cache.cache_info().currsize == 0
+    file_cache.resize(2**22)
+    file_cache.read(absolute_fl, np.s_[:])
+    file_cache.clear()
+    assert file_cache.cache_info() == (0, 0, 2**22, 0)
+
+
+def test_file_cache_disabled(absolute_fl, mocker):
+    cache = FileCache()
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    cache.read(absolute_fl, np.s_[10:20])
+    assert spy.call_args.args[1] == np.s_[10:20]
+    assert len(cache._files) == 0
+
+
+def test_file_cache_missing_file(file_cache, relative_ear, tmp_path):
+    fl = AstropyFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, tmp_path)
+    assert np.isnan(file_cache.read(fl, np.s_[:])).all()
+    assert len(file_cache._files) == 0
+
+
+def test_file_cache_file_changed(file_cache, raw_fl, eit_copy):
+    before = file_cache.read(raw_fl, np.s_[:]).copy()
+    path = eit_copy / raw_fl.fileuri
+    with fits.open(path, mode="update") as hdul:
+        hdul[0].data[:] = 0
+    assert_allclose(file_cache.read(raw_fl, np.s_[:]), 0)
+    assert not np.allclose(before, 0)
+
+
+def test_file_cache_shared_by_slices(file_cache, eit_dataset, mocker):
+    spy = mocker.spy(AstropyFITSLoader, "__getitem__")
+    expected = eit_dataset.data.compute()
+    assert spy.call_count == len(eit_dataset.files)
+    # Slices of the dataset build new graphs, but read the files from the cache
+    assert_allclose(eit_dataset[2:5, 10:20].data.compute(), expected[2:5, 10:20])
+    assert_allclose(eit_dataset[3].data.compute(), expected[3])
+    assert spy.call_count == len(eit_dataset.files)
+    assert file_cache.cache_info().hits == 4
+
+    eit_dataset.files.basepath = eitdir
+    assert file_cache.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize("loader", [AstropyFITSLoader, RawFITSLoader])
+@pytest.mark.parametrize("output_dtype", ["float64", "float32"])
+def test_loader_output_dtype(eit_copy, relative_ear, absolute_fl, loader, output_dtype):
+    fl = loader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, eit_copy,
+                output_dtype=output_dtype)
+    for aslice in [np.s_[:], np.s_[10:20, ::3], np.s_[5]]:
+        data = fl[aslice]
+        assert data.dtype == np.dtype(output_dtype)
+        assert data.dtype.isnative
+        assert_allclose(data, absolute_fl[aslice], rtol=1e-6)
+
+    fl.basepath = eit_copy / "missing"
+    assert fl.data.dtype == np.dtype(output_dtype)
+    assert np.isnan(fl.data).all()
+
+
+def test_loader_native_byte_order_in_place(raw_fl):
+    raw_fl.output_dtype = np.dtype("float64")
+    data = np.arange(10, dtype=">f8")
+    converted = raw_fl._convert(data)
+    assert converted.dtype == np.dtype("=f8")
+    assert np.shares_memory(converted, data)
+    assert_allclose(converted, np.arange(10))
+
+    # Views of other arrays are copied rather than modified
+    data = np.arange(10, dtype=">f8")
+    converted = raw_fl._convert(data[::2])
+    assert not np.shares_memory(converted, data)
+    assert_allclose(data, np.arange(10))
+
+
+def test_fits_loader_registry():
+    assert fits_loaders["astropy"] is AstropyFITSLoader
+    assert fits_loaders["raw"] is RawFITSLoader
+    assert fits_loaders["fitsio"] is FitsioFITSLoader
+    assert fits_loaders["remote"] is RemoteFITSLoader
+    assert fits_loaders["tar"] is TarFITSLoader
+
+    assert get_fits_loader() is AstropyFITSLoader
+    assert get_fits_loader("raw") is RawFITSLoader
+    assert get_fits_loader(RawFITSLoader) is RawFITSLoader
+    with conf.set_temp("preferred_fits_library", "raw"):
+        assert get_fits_loader() is RawFITSLoader
+    with pytest.raises(ValueError, match="Unknown FITS loader"):
+        get_fits_loader("spam")
+
+
+def test_register_fits_loader(mocker):
+    mocker.patch.dict(fits_loaders)
+
+    @register_fits_loader("custom")
+    class CustomLoader(AstropyFITSLoader):
+        pass
+
+    assert get_fits_loader("custom") is CustomLoader
+
+
+def test_swap_loader(eit_dataset, mocker):
+    data = eit_dataset.data
+    expected = data.compute()
+    spy = mocker.spy(RawFITSLoader, "__getitem__")
+
+    eit_dataset.files.loader = "raw"
+    assert eit_dataset.files.loader is RawFITSLoader
+    assert eit_dataset[0].files.loader is RawFITSLoader
+    # Arrays which have already been created use the new loader
+    assert_allclose(data.compute(), expected)
+    assert spy.call_count == len(eit_dataset.files)
+
+    with pytest.raises(ValueError, match="Unknown FITS loader"):
+        eit_dataset.files.loader = "spam"
+
+
+@pytest.fixture(params=["eit", "scaled", "unsigned"])
+def fitsio_loaders(request, tmp_path):
+    """
+    A fitsio loader and an astropy loader of the same file, which may have scaled integer data.
+    """
+    pytest.importorskip("fitsio")
+    if request.param == "eit":
+        args = ("efz20040301.000010_s.fits", (128, 128), "float64", 0, eitdir)
+    else:
+        data = np.linspace(-500, 500, 300 * 200).reshape(300, 200)
+        if request.param == "scaled":
+            hdu = fits.PrimaryHDU(data)
+            hdu.scale("int16", bscale=0.25, bzero=10)
+        else:
+            hdu = fits.PrimaryHDU((data + 500).astype(np.uint16))
+        hdu.writeto(tmp_path / "scaled.fits")
+        args = ("scaled.fits", (300, 200), "int16", 0, tmp_path)
+    return FitsioFITSLoader(*args), AstropyFITSLoader(*args)
+
+
+@pytest.mark.parametrize("aslice", [
+    np.s_[:],
+    np.s_[10:20, 10:20],
+    np.s_[5],
+    np.s_[-1, ::2],
+    np.s_[::-3, 7],
+    np.s_[..., 5],
+    np.s_[[1, 5, 2]],
+    np.s_[200:300],
+])
+def test_fitsio_loader(fitsio_loaders, aslice):
+    fitsio_fl, astropy_fl = fitsio_loaders
+    data, expected = fitsio_fl[aslice], astropy_fl[aslice]
+    # Both loaders read the data as it is stored, without applying BSCALE and BZERO
+    assert data.dtype.kind == expected.dtype.kind
+    assert_allclose(data, expected)
+
+
+def test_fitsio_loader_url(relative_ear):
+    loader = FitsioFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target,
+                              "https://example.com/data/")
+    with pytest.raises(ValueError, match="use the 'remote' loader"):
+        loader[0]
+
+
+@pytest.fixture
+def remote_pool(mocker):
+    pool = RemoteFITSFilePool(maxsize=2)
+    mocker.patch("dkist.io.dask.loaders.remote_file_pool", pool)
+    mocker.patch("dkist.io.dask.striped_array.remote_file_pool", pool)
+    yield pool
+    pool.invalidate()
+
+
+@pytest.fixture
+def remote_fl(eit_server, remote_pool, relative_ear):
+    return RemoteFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target,
+                            eit_server.url_for("/"))
+
+
+def test_remote_loader_without_fsspec(mocker, remote_pool, relative_ear):
+    mocker.patch.dict(sys.modules, {"fsspec": None})
+    loader = RemoteFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target,
+                              "https://example.com/data/")
+    with pytest.raises(ImportError, match=r"pip install 'dkist\[remote\]'"):
+        loader[0]
+
+
+def test_remote_loader_absolute_uri(remote_fl, eit_server):
+    assert remote_fl.absolute_uri == eit_server.url_for("/efz20040301.000010_s.fits")
+    assert remote_fl.byte_range() is None
+
+
+@pytest.mark.parametrize("aslice", [
+    np.s_[:],
+    np.s_[10:20, 10:20],
+    np.s_[5],
+    np.s_[::-3, 7],
+    np.s_[[1, 5, 2]],
+])
+def test_remote_loader(remote_fl, absolute_fl, aslice):
+    assert_allclose(remote_fl[aslice], absolute_fl[aslice])
+
+
+def test_remote_loader_reads_blocks(remote_fl, absolute_fl, eit_server):
+    with conf.set_temp("remote_block_size", "4 KiB"):
+        assert_allclose(remote_fl[0, 0:10], absolute_fl[0, 0:10])
+    # Only the blocks containing the header and the first row are downloaded
+    gets = [request for request, _ in eit_server.log if request.method == "GET"]
+    assert all(request.headers.get("Range") for request in gets)
+    assert len(gets) < (eitdir / remote_fl.fileuri).stat().st_size // 4096
+
+
+def test_remote_loader_missing(remote_fl):
+    remote_fl.fileuri = "missing.fits"
+    data = remote_fl[0:10]
+    assert data.shape == (10, 128)
+    assert np.isnan(data).all()
+
+
+def test_remote_pool_reuse(remote_fl, remote_pool):
+    remote_fl[0:10]
+    remote_fl[10:20]
+    info = remote_pool.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
+def test_remote_dataset(eit_dataset, eit_server, remote_pool):
+    expected = eit_dataset.data.compute()
+    eit_dataset.files.basepath = eit_server.url_for("/")
+    eit_dataset.files.loader = "remote"
+    assert eit_dataset.files.basepath == eit_server.url_for("/")
+    assert_allclose(eit_dataset.data.compute(), expected)
+    assert remote_pool.cache_info().currsize == 2
+
+    eit_dataset.files.basepath = eitdir
+    assert remote_pool.cache_info().currsize == 0
+
+
+@pytest.fixture
+def eit_tar(tmp_path):
+    path = tmp_path / "EIT.tar"
+    with tarfile.open(path, "w") as tar:
+        for fits_path in sorted(eitdir.glob("*.fits")):
+            tar.add(fits_path, arcname=f"EIT/{fits_path.name}")
+    return path
+
+
+@pytest.fixture
+def tar_fl(eit_tar, relative_ear):
+    return TarFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, eit_tar)
+
+
+@pytest.mark.parametrize("aslice", [
+    np.s_[:],
+    np.s_[10:20, 10:20],
+    np.s_[5],
+    np.s_[::3],
+    np.s_[[1, 5, 2]],
+])
+def test_tar_loader(tar_fl, absolute_fl, aslice):
+    assert_allclose(tar_fl[aslice], absolute_fl[aslice])
+
+
+def test_tar_loader_member_names(eit_tar, tar_fl):
+    index = TarDataOffsetIndex.for_basepath(eit_tar)
+    assert index.member(tar_fl.fileuri) == index.member(f"EIT/{tar_fl.fileuri}")
+    assert index.member("missing.fits") is None
+    assert tar_fl.byte_range() == (eit_tar, *index.member(tar_fl.fileuri))
+
+
+def test_tar_loader_missing(tar_fl, tmp_path):
+    tar_fl.fileuri = "missing.fits"
+    assert np.isnan(tar_fl.data).all()
+
+    tar_fl.basepath = tmp_path / "missing.tar"
+    assert np.isnan(tar_fl.data).all()
+
+
+def test_tar_loader_compressed_archive(relative_ear, tmp_path):
+    path = tmp_path / "EIT.tar.gz"
+    with tarfile.open(path, "w:gz") as tar:
+        tar.add(eitdir / relative_ear.fileuri, arcname=relative_ear.fileuri)
+    fl = TarFITSLoader(relative_ear.fileuri, relative_ear.shape, relative_ear.dtype, relative_ear.target, path)
+    with pytest.raises(ValueError, match="not an uncompressed tar archive"):
+        fl.data
+
+
+def test_tar_loader_compressed_image(tile_cache, compressed_data, tmp_path):
+    path = tmp_path / "compressed.tar"
+    with tarfile.open(path, "w") as tar:
+        tar.add(tmp_path / "compressed.fits", arcname="compressed.fits")
+    fl = TarFITSLoader("compressed.fits", compressed_data.shape, "int32", 1, path)
+    assert_allclose(fl[10:20, 30:40], compressed_data[10:20, 30:40])
+    assert TarDataOffsetIndex.for_basepath(path).lookup("compressed.fits", 1) is None
+
+
+def test_tar_offset_index(eit_dataset, eit_tar, mocker):
+    expected = eit_dataset.data.compute()
+    eit_dataset.files.basepath = eit_tar
+    eit_dataset.files.loader = "tar"
+    index = eit_dataset.files.build_offset_index()
+    assert isinstance(index, TarDataOffsetIndex)
+    assert index.path == eit_tar.parent / f"EIT.tar.{DataOffsetIndex.filename}"
+    assert index.path.exists()
+    assert len(index) == len(eit_dataset.files)
+    assert_allclose(eit_dataset.data.compute(), expected)
+
+    # A new index reads the members and data locations from disk
+    spy = mocker.spy(tarfile, "open")
+    new_index = TarDataOffsetIndex(eit_tar)
+    for fileuri in eit_dataset.files.filenames:
+        assert new_index.member(fileuri) == index.member(fileuri)
+        assert new_index.lookup(fileuri, 0) == index.lookup(fileuri, 0)
+    assert spy.call_count == 0
+
+
+def test_tar_offset_index_archive_changed(tar_fl, eit_tar, absolute_fl):
+    assert_allclose(tar_fl.data, absolute_fl.data)
+    index = TarDataOffsetIndex.for_basepath(eit_tar)
+    member = index.member(tar_fl.fileuri)
+
+    # Rewrite the archive with the files in a different order
+    with tarfile.open(eit_tar, "w") as tar:
+        for fits_path in sorted(eitdir.glob("*.fits"), reverse=True):
+            tar.add(fits_path, arcname=f"EIT/{fits_path.name}")
+
+    assert_allclose(tar_fl.data, absolute_fl.data)
+    assert index.member(tar_fl.fileuri) != member
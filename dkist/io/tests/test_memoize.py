@@ -0,0 +1,125 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from dkist.io import conf
+from dkist.io.dask.loaders import AstropyFITSLoader
+from dkist.io.memoize import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "results", maxsize=2**20)
+
+
+@pytest.fixture
+def read(mocker):
+    return mocker.spy(AstropyFITSLoader, "__getitem__")
+
+
+@pytest.fixture
+def local_dataset(eit_dataset, tmp_path):
+    shutil.copytree(eit_dataset.files.basepath, tmp_path / "EIT")
+    eit_dataset.files.basepath = tmp_path / "EIT"
+    return eit_dataset
+
+
+def test_cached_compute(cache, eit_dataset, read):
+    total = eit_dataset.data.sum(axis=(1, 2))
+    expected = total.compute()
+    read.reset_mock()
+
+    result, = cache.compute(total)
+    assert_allclose(result, expected)
+    assert read.call_count == len(eit_dataset.files)
+
+    # A new graph for the same computation, in a new cache using the same directory
+    result, = ResultCache(cache.directory, cache.maxsize).compute(eit_dataset.data.sum(axis=(1, 2)))
+    assert isinstance(result, np.memmap)
+    assert_allclose(result, expected)
+    assert read.call_count == len(eit_dataset.files)
+
+
+def test_cached_compute_scalar(cache, eit_dataset, read):
+    expected = eit_dataset.data.max().compute()
+    cache.compute(eit_dataset.data.max())
+    read.reset_mock()
+    result, = cache.compute(eit_dataset.data.max())
+    assert isinstance(result, np.generic)
+    assert result == expected
+    assert read.call_count == 0
+
+
+def test_cached_compute_different(cache, eit_dataset, read):
+    cache.compute(eit_dataset.data.sum(axis=0))
+    read.reset_mock()
+    # A different slice, and a different operation, are computed again
+    assert_allclose(cache.compute(eit_dataset[:2].data.sum(axis=0))[0], eit_dataset[:2].data.sum(axis=0).compute())
+    assert_allclose(cache.compute(eit_dataset.data.mean(axis=0))[0], eit_dataset.data.mean(axis=0).compute())
+    assert read.call_count == 2 * 2 + 2 * len(eit_dataset.files)
+
+
+def test_cached_compute_modified_file(cache, local_dataset, read):
+    cache.compute(local_dataset.data.sum(axis=0))
+    path = local_dataset.files.basepath / local_dataset.files.filenames[0]
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    read.reset_mock()
+    cache.compute(local_dataset.data.sum(axis=0))
+    assert read.call_count == len(local_dataset.files)
+
+
+def test_token_follows_loader(cache, eit_dataset):
+    total = eit_dataset.data.sum(axis=0)
+    token = cache.token(total)
+    # The existing array now reads the files with another loader, under the same name
+    eit_dataset.files.loader = "raw"
+    assert cache.token(total) != token
+
+
+def test_token_only_stats_files_read(cache, local_dataset, mocker):
+    # Read each file as a separate chunk
+    with conf.set_temp("chunk_size", "0"):
+        data = local_dataset.files.dask_array
+    stat = mocker.spy(Path, "stat")
+    total = data[1].sum()
+    token = cache.token(total)
+    basepath = local_dataset.files.basepath
+    statted = {call.args[0] for call in stat.call_args_list if call.args[0].suffix == ".fits"}
+    assert statted == {basepath / local_dataset.files.filenames[1]}
+
+    # Changing a file which is not read does not change the token
+    first = data[0].sum()
+    first_token = cache.token(first)
+    path = basepath / local_dataset.files.filenames[0]
+    file_stat = path.stat()
+    os.utime(path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10**9))
+    assert cache.token(total) == token
+    assert cache.token(first) != first_token
+
+
+def test_cached_compute_mixed(cache, eit_dataset):
+    cache.compute(eit_dataset.data.sum(axis=0))
+    total, maximum, value = cache.compute(eit_dataset.data.sum(axis=0), eit_dataset.data.max(), 1)
+    assert isinstance(total, np.memmap)
+    assert not isinstance(maximum, np.memmap)
+    assert value == 1
+
+
+def test_cached_compute_maxsize(tmp_path, eit_dataset):
+    # Room for one sum over the spatial axes, 11 float64 values
+    cache = ResultCache(tmp_path / "results", maxsize=300)
+    cache.compute(eit_dataset.data.sum(axis=(1, 2)))
+    cache.compute(eit_dataset.data.max(axis=(1, 2)))
+    assert len(list(cache.directory.glob("*.npy"))) == 1
+    assert cache.cache_info().currsize <= 300
+    # Results larger than the cache are not saved
+    cache.compute(eit_dataset.data.sum(axis=0))
+    assert len(list(cache.directory.glob("*.npy"))) == 1
+
+    cache.clear()
+    assert not list(cache.directory.glob("*.npy"))
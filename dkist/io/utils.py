@@ -1,11 +1,132 @@
+import os
+import posixpath
 from pathlib import Path
 from textwrap import dedent
+from urllib.parse import urlparse
+
+import numpy as np
 
 import asdf
 
 __all__ = ["filemanager_info_str", "save_dataset"]
 
 
+def is_url(path):
+    """
+    Return `True` if ``path`` is a URL to a remote file system, such as ``https://``.
+
+    Local paths, including ``file://`` URLs and Windows paths with a drive
+    letter, are not considered URLs.
+    """
+    if not isinstance(path, str):
+        return False
+    scheme = urlparse(path).scheme
+    return len(scheme) > 1 and scheme != "file"
+
+
+def join_url(base, name):
+    """
+    Join a relative file name onto a base URL.
+    """
+    return f"{base.rstrip('/')}/{name}"
+
+
+def file_presence(fileuri_array, basepath):
+    """
+    Return a boolean array which is `True` for each file in ``fileuri_array`` which exists.
+
+    Each directory containing the files is listed once with `os.scandir`,
+    rather than checking each file separately. If ``basepath`` is a tar
+    archive, the files are looked up in the archive instead.
+
+    Parameters
+    ----------
+    fileuri_array : `numpy.ndarray`
+        The file uris, relative to ``basepath``.
+    basepath : `pathlib.Path`
+        The directory (or tar archive) containing the files.
+    """
+    fileuris = np.asarray(fileuri_array)
+    if is_url(basepath):
+        raise ValueError(f"Can not check which files are present on the remote server {basepath}.")
+    basepath = Path(basepath) if basepath is not None else Path()
+    if basepath.is_file():
+        from dkist.io.dask.offsets import TarDataOffsetIndex  # noqa: PLC0415
+
+        index = TarDataOffsetIndex.for_basepath(basepath)
+        present = (index.member(fileuri) is not None for fileuri in fileuris.flat)
+        return np.fromiter(present, dtype=bool, count=fileuris.size).reshape(fileuris.shape)
+
+    entries = _directory_entries(fileuris, basepath)
+    present = (posixpath.basename(fileuri) in entries[posixpath.dirname(fileuri)] for fileuri in fileuris.flat)
+    return np.fromiter(present, dtype=bool, count=fileuris.size).reshape(fileuris.shape)
+
+
+def physical_order(fileuri_array, basepath):
+    """
+    Return the rank of each file in ``fileuri_array`` in the order its data is laid out on disk.
+
+    Reading files in this order turns a scan of a whole dataset into close to
+    sequential reads, which matters on spinning disks and network file
+    systems. Files in a tar archive are ordered by the offset of their data
+    in the archive. Files in a directory are ordered by their inode number,
+    which most file systems allocate in the order the files were written,
+    and each directory is listed once with `os.scandir`. Missing files, and
+    files on a remote server, keep the order of ``fileuri_array`` after any
+    files which were found.
+
+    Parameters
+    ----------
+    fileuri_array : `numpy.ndarray`
+        The file uris, relative to ``basepath``.
+    basepath : `pathlib.Path`
+        The directory (or tar archive) containing the files.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        An integer array with the shape of ``fileuri_array``, where the file
+        to read first is 0.
+    """
+    fileuris = np.asarray(fileuri_array)
+    # Files which can not be found sort after all the others
+    missing = np.iinfo(np.int64).max
+    if is_url(basepath):
+        positions = np.full(fileuris.size, missing, dtype=np.int64)
+    elif basepath is not None and Path(basepath).is_file():
+        from dkist.io.dask.offsets import TarDataOffsetIndex  # noqa: PLC0415
+
+        index = TarDataOffsetIndex.for_basepath(Path(basepath))
+        members = (index.member(fileuri) for fileuri in fileuris.flat)
+        positions = np.fromiter((missing if m is None else m[0] for m in members), dtype=np.int64, count=fileuris.size)
+    else:
+        entries = _directory_entries(fileuris, Path(basepath) if basepath is not None else Path())
+
+        def inode(fileuri):
+            entry = entries[posixpath.dirname(fileuri)].get(posixpath.basename(fileuri))
+            return missing if entry is None else entry.inode()
+
+        positions = np.fromiter((inode(fileuri) for fileuri in fileuris.flat), dtype=np.int64, count=fileuris.size)
+    ranks = np.empty(fileuris.size, dtype=np.int64)
+    # A stable sort keeps files with the same position in their original order
+    ranks[np.argsort(positions, kind="stable")] = np.arange(fileuris.size)
+    return ranks.reshape(fileuris.shape)
+
+
+def _directory_entries(fileuris, basepath):
+    """
+    List each directory containing ``fileuris`` once, returning the `os.DirEntry` of each file by name.
+    """
+    entries = {}
+    for directory in {posixpath.dirname(fileuri) for fileuri in fileuris.flat}:
+        try:
+            with os.scandir(basepath / directory) as listing:
+                entries[directory] = {entry.name: entry for entry in listing if entry.is_file()}
+        except (FileNotFoundError, NotADirectoryError):
+            entries[directory] = {}
+    return entries
+
+
 def filemanager_info_str(filemanager):
     return dedent(f"""\
         {type(filemanager).__name__} containing {len(filemanager)} files.
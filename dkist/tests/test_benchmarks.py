@@ -1,3 +1,6 @@
+import tarfile
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pytest
@@ -7,6 +10,8 @@ import astropy.units as u
 from astropy.modeling.models import Tabular1D
 
 from dkist import load_dataset, save_dataset
+from dkist.data.test import rootdir
+from dkist.io.dask.loaders import fits_loaders
 from dkist.wcs.models import (Ravel, generate_celestial_transform,
                               update_celestial_transform_parameters)
 
@@ -86,6 +91,32 @@ def test_dataset_compute_data_partial_files(benchmark):
     assert not np.isnan(ds.data.compute()).any()
 
 
+@pytest.mark.benchmark
+@pytest.mark.walltime
+@pytest.mark.parametrize("loader", sorted(fits_loaders))
+@pytest.mark.parametrize("aslice", [
+    pytest.param(np.s_[:], id="full"),
+    pytest.param(np.s_[:, 10:20, 10:20], id="partial"),
+])
+def test_compute_data_loaders(benchmark, loader, aslice, tmp_path):
+    """
+    Compare the FITS loader backends reading the same dataset, run this on
+    the target storage to choose ``dkist.io.conf.preferred_fits_library``.
+    """
+    if loader == "fitsio":
+        pytest.importorskip("fitsio")
+    ds = load_dataset(Path(rootdir) / "EIT" / "eit_test_dataset.asdf", loader=loader)
+    if loader == "tar":
+        with tarfile.open(tmp_path / "EIT.tar", "w") as tar:
+            for fileuri in ds.files.filenames:
+                tar.add(ds.files.basepath / fileuri, arcname=fileuri)
+        ds.files.basepath = tmp_path / "EIT.tar"
+    data = ds.data[aslice]
+    benchmark(data.compute)
+
+    assert not np.isnan(data.compute()).any()
+
+
 @pytest.mark.benchmark
 def test_generate_celestial(benchmark):
     benchmark(generate_celestial_transform,